@@ -1,52 +1,248 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel, ValidationError
+from typing import Any, Dict, List, Literal, Optional
+from types import SimpleNamespace
+import numpy as np
 import uvicorn
+import asyncio
+import glob
+import logging
 import math
+import os
+import time
 
-# Model Coefficients (extracted from trained Ridge model in the notebook)
-MODEL_COEFFICIENTS = {
-    'intercept': 14.853360488798305,
-    'unit_price': -0.28587598812465354,
-    'product_score': 0.5438133598425678,
-    'customers': 7.723945321787855,
-    'comp_1': -1.288367484270411,
-    'comp_2': 0.49889132632829736,
-    'comp_3': 0.5629239228716054,
-    'price_ratio_1': -0.3809751653771346,
-    'price_diff_1': 0.7088265708288127,
-    'price_ratio_2': -0.5421674135298935,
-    'price_diff_2': -0.7577806489555758,
-    'price_ratio_3': -0.18554514689308288,
-    'price_diff_3': -0.8602668746696169,
-    # Category dummies (note: bed_bath_table was the dropped baseline)
-    'cat_bed_bath_table': 0.0,
-    'cat_computers_accessories': 0.1993419622795043,
-    'cat_consoles_games': 0.3669261150230482,
-    'cat_cool_stuff': -2.0803094819519266,
-    'cat_furniture_decor': 1.5619133127902447,
-    'cat_garden_tools': -2.4678555653046086,
-    'cat_health_beauty': -1.3583504702650084,
-    'cat_perfumery': -0.2515015610223594,
-    'cat_watches_gifts': -2.906045082275523,
-}
+from capture import CaptureWriter
+from coalescer import Coalescer
+from columnar import (
+    BINARY_CONTENT_TYPES, batch_from_payload, negotiate, numeric_column, read as read_payload, write as write_payload,
+)
+from compute_pool import ComputePool, Overloaded
+from demand_models import RidgeDemand, load_all as load_demand_models
+from dynamic import solve as solve_dynamic_path
+from engine import (
+    MIN_QTY, SEARCH_BUDGET, SEARCH_TOLERANCE, ItemBatch, batch_from_columns, ensemble_summary, linear_demand,
+    linear_demand_by_category, make_batch, optimize, price_bounds, profit_curve,
+)
+from feature_store import FeatureStore
+from metrics import CONTENT_TYPE, MetricsMiddleware, Registry, mark
+from model_registry import ModelRegistry
+from model_store import ModelStore
+from portfolio import PortfolioConstraints, solve as solve_portfolio_prices
+from result_cache import ResultCache
+from scenarios import COMPETITOR_FIELDS, SCENARIO_FIELDS, grid_values, sample_values, scenario_batch, summarize, sweep
+from shared_model import SHARED_MODEL_ENV, SharedModelStore
+from stream import TICK_FIELDS, PriceHub, Subscriber
+
+logger = logging.getLogger(__name__)
+
+# Versioned model artifact written by the training step (see model_store.py)
+MODEL_PATH = os.getenv(
+    "MODEL_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "demand_model.json")
+)
+# Seconds between checks for a new artifact version (0 disables hot reload)
+MODEL_RELOAD_INTERVAL = float(os.getenv("MODEL_RELOAD_INTERVAL", "5"))
+
+# Latest features per product for POST /optimize_price/by_product: a CSV
+# export like retail_price.csv, optionally compiled to a memory-mapped
+# snapshot file, re-read when it changes (0 disables the watcher)
+FEATURES_PATH = os.getenv(
+    "FEATURES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "retail_price.csv")
+)
+FEATURES_SNAPSHOT = os.getenv("FEATURES_SNAPSHOT") or None
+FEATURES_RELOAD_INTERVAL = float(os.getenv("FEATURES_RELOAD_INTERVAL", "30"))
+feature_store = FeatureStore(FEATURES_PATH, FEATURES_SNAPSHOT)
+
+# Non-linear demand models selectable with ?demand_model= (see demand_models.py):
+# comma-separated model files, by default every models/demand_*.joblib
+DEMAND_MODEL_PATHS = [
+    path for path in os.getenv(
+        "DEMAND_MODELS",
+        ",".join(sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(MODEL_PATH)), "demand_*.joblib")))),
+    ).split(",") if path
+]
+demand_models = {}
+
+# Capture of POST /optimize_price traffic for replay.py: rotating JSONL files
+# in CAPTURE_DIR (unset disables), CAPTURE_MAX_MB each, gzip with CAPTURE_COMPRESS=1
+CAPTURE_DIR = os.getenv("CAPTURE_DIR") or None
+capture = CaptureWriter(
+    CAPTURE_DIR,
+    max_bytes=int(float(os.getenv("CAPTURE_MAX_MB", "64")) * (1 << 20)),
+    compress=os.getenv("CAPTURE_COMPRESS", "0").lower() in ("1", "true", "yes"),
+) if CAPTURE_DIR else None
+
+# Workers started by serve.py share one model published in shared memory
+if os.getenv(SHARED_MODEL_ENV):
+    model_store = SharedModelStore(os.environ[SHARED_MODEL_ENV])
+else:
+    model_store = ModelStore(MODEL_PATH)
+
+# Per-category models (see model_registry.py): artifacts in CATEGORY_MODELS_DIR
+# (empty disables) loaded on first use, at most CATEGORY_MODELS_MAX_MB resident
+CATEGORY_MODELS_DIR = os.getenv(
+    "CATEGORY_MODELS_DIR", os.path.join(os.path.dirname(os.path.abspath(MODEL_PATH)), "categories")
+)
+category_models = ModelRegistry(
+    CATEGORY_MODELS_DIR or None,
+    max_bytes=int(float(os.getenv("CATEGORY_MODELS_MAX_MB", "256")) * (1 << 20)),
+    refresh_interval=max(MODEL_RELOAD_INTERVAL, 1.0),
+)
+
+# Result cache for POST /optimize_price: entry limit (0 disables), TTL in
+# seconds (0 = no expiry) and float input quantum (0 = exact matches only)
+result_cache = ResultCache(
+    max_size=int(os.getenv("RESULT_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("RESULT_CACHE_TTL", "300")),
+    quantum=float(os.getenv("RESULT_CACHE_QUANTUM", "0")),
+)
+model_store.add_listener(lambda model: result_cache.clear())
+
+# CPU-bound optimizations run in a thread pool so the event loop stays free.
+# Jobs beyond COMPUTE_WORKERS running + COMPUTE_QUEUE waiting get a 503.
+compute_pool = ComputePool(
+    workers=int(os.getenv("COMPUTE_WORKERS", str(min(4, os.cpu_count() or 1)))),
+    queue_size=int(os.getenv("COMPUTE_QUEUE", "64")),
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Watch the model artifact and feature source for changes while the API is running"""
+    model_store.start_watching(MODEL_RELOAD_INTERVAL)
+    demand_models.update(load_demand_models(DEMAND_MODEL_PATHS))
+    if capture is not None:
+        capture.start()
+    if feature_store.enabled:
+        try:
+            feature_store.refresh()
+        except Exception:
+            logger.exception("Failed to load product features from %s", FEATURES_PATH)
+        feature_store.start_watching(FEATURES_RELOAD_INTERVAL)
+    price_hub.start()
+    yield
+    await price_hub.stop()
+    model_store.stop_watching()
+    feature_store.stop_watching()
+    if capture is not None:
+        capture.stop()
+
+
+app = FastAPI(title="Fashionista Price Optimization API", lifespan=lifespan)
+
+# Prometheus metrics served at GET /metrics
+registry = Registry()
+request_count = registry.counter(
+    "fpo_http_requests_total", "HTTP requests by method, route and status", ("method", "route", "status")
+)
+request_latency = registry.histogram(
+    "fpo_http_request_duration_seconds", "HTTP request latency by method and route", ("method", "route")
+)
+stage_latency = registry.histogram(
+    "fpo_stage_duration_seconds",
+    "Time per optimization stage (validation, batch_validation, features, search, ensemble, serialization)",
+    ("stage",),
+)
+points_evaluated = registry.counter(
+    "fpo_price_points_evaluated_total", "Candidate prices evaluated by the solvers", ("solver",)
+)
+points_skipped = registry.counter(
+    "fpo_price_points_skipped_total", "Candidate prices skipped for non-finite demand or profit", ("solver",)
+)
+registry.callback("fpo_cache_entries", "Entries in the result cache", lambda: result_cache.stats()["size"])
+registry.callback(
+    "fpo_cache_events_total", "Result cache hits, misses, evictions, expirations and invalidations",
+    lambda: [((event,), result_cache.stats()[event])
+             for event in ("hits", "misses", "evictions", "expirations", "invalidations")],
+    ("event",), kind="counter",
+)
+registry.callback("fpo_compute_running", "Optimizations running in the compute pool",
+                  lambda: compute_pool.running)
+registry.callback("fpo_compute_queued", "Optimizations waiting for the compute pool",
+                  lambda: compute_pool.queued)
+registry.callback("fpo_compute_rejected_total", "Optimizations rejected with 503",
+                  lambda: compute_pool.rejected, kind="counter")
+registry.callback("fpo_model_info", "Active demand model version",
+                  lambda: [((model_store.get().version,), 1)], ("version",))
+category_load_latency = registry.histogram(
+    "fpo_category_model_load_seconds", "Time to load and compile a per-category model on first use"
+)
+category_models.on_load = category_load_latency.observe
+registry.callback("fpo_category_models_resident", "Per-category models loaded in memory",
+                  lambda: category_models.stats()["resident"])
+registry.callback("fpo_category_models_bytes", "Estimated memory of the resident per-category models",
+                  lambda: category_models.stats()["resident_bytes"])
+registry.callback(
+    "fpo_category_model_events_total", "Per-category model hits, misses, loads, evictions, failures and fallbacks",
+    lambda: [((event,), category_models.stats()[event])
+             for event in ("hits", "misses", "loads", "evictions", "failures", "fallbacks")],
+    ("event",), kind="counter",
+)
+coalesce_batch_size = registry.histogram(
+    "fpo_coalesce_batch_size", "Single-item requests optimized together by the coalescer",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024),
+)
+coalesce_delay = registry.histogram(
+    "fpo_coalesce_queue_delay_seconds", "Time a single-item request waited for its batch to start"
+)
+registry.callback("fpo_coalesce_waiting", "Single-item requests waiting for a batch",
+                  lambda: coalescer.stats()["waiting"])
+stream_latency = registry.histogram(
+    "fpo_stream_push_latency_seconds", "Time from a competitor tick to the push of the re-optimized price"
+)
+registry.callback(
+    "fpo_stream_events_total", "Streaming ticks received, SKUs recomputed and prices pushed",
+    lambda: [((event,), price_hub.stats()[event]) for event in ("ticks", "recomputed", "pushes")],
+    ("event",), kind="counter",
+)
+registry.callback("fpo_stream_skus", "SKUs followed by WebSocket subscribers", lambda: price_hub.stats()["skus"])
+app.add_middleware(MetricsMiddleware, requests=request_count, latency=request_latency, stages=stage_latency)
 
-# Scaler Parameters (means and stds extracted from the training scaler)
-SCALER_PARAMS = {
-    'unit_price': {'mean': 99.44523713731162, 'std': 62.97369568592211},
-    'product_score': {'mean': 4.080448065173115, 'std': 0.22488875469238448},
-    'customers': {'mean': 80.27494908350306, 'std': 63.53323747857187},
-    'comp_1': {'mean': 82.0746224177393, 'std': 45.07783534917797},
-    'comp_2': {'mean': 94.22953593456212, 'std': 47.74317009020924},
-    'comp_3': {'mean': 87.62979113309574, 'std': 50.83361087506544},
-    'price_ratio_1': {'mean': 1.5230047207087019, 'std': 1.760434580900736},
-    'price_diff_1': {'mean': 17.370614719572302, 'std': 56.53590242567708},
-    'price_ratio_2': {'mean': 1.1384233344948709, 'std': 0.6379685588869871},
-    'price_diff_2': {'mean': 5.215701202749489, 'std': 55.18921733767781},
-    'price_ratio_3': {'mean': 1.2823692803405475, 'std': 0.879648952164473},
-    'price_diff_3': {'mean': 11.815446004215886, 'std': 54.19030361420513},
-}
 
-app = FastAPI(title="Fashionista Price Optimization API")
+def observe_batch(size: int, delays: list):
+    """Record a coalesced batch's size and the queueing delay of its items"""
+    coalesce_batch_size.observe(size)
+    for delay in delays:
+        coalesce_delay.observe(delay)
+
+
+async def run_coalesced(key: tuple, entries: list) -> list:
+    """Optimize a coalesced batch of ``(model, demand, item)`` entries sharing ``key``"""
+    model, demand, _ = entries[0]
+    options = dict(key[3:])
+    return await compute_pool.run(optimize_many, model, [item for _, _, item in entries], key[1], demand, **options)
+
+
+# Opt-in micro-batching of POST /optimize_price: concurrent requests arriving
+# within COALESCE_WINDOW_MS (0 disables) or until COALESCE_MAX_BATCH are
+# waiting are optimized in one vectorized engine call
+coalescer = Coalescer(
+    run_coalesced,
+    window=float(os.getenv("COALESCE_WINDOW_MS", "0")) / 1000,
+    max_batch=int(os.getenv("COALESCE_MAX_BATCH", "256")),
+    on_batch=observe_batch,
+)
+
+# Live re-optimization for WebSocket /stream/prices: ticks arriving within
+# STREAM_WINDOW_MS of each other are recomputed in one batch
+price_hub = PriceHub(
+    solve=lambda batch: compute_pool.run(optimize, model_store.get().compiled, batch, "exact"),
+    window=float(os.getenv("STREAM_WINDOW_MS", "5")) / 1000,
+    on_latency=stream_latency.observe,
+)
+model_store.add_listener(lambda model: price_hub.refresh_all())
+
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    """Shed load quickly instead of queueing without bound"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server is busy, please retry shortly."},
+        headers={"Retry-After": "1"},
+    )
 
 
 class PriceOptimizationInput(BaseModel):
@@ -61,9 +257,151 @@ class PriceOptimizationInput(BaseModel):
     customers: float
 
 
-def normalize_feature(value: float, feature_name: str) -> float:
+class BatchOptimizationInput(BaseModel):
+    """
+    Input model for batch price optimization.
+
+    Send either ``items`` (a list of PriceOptimizationInput objects) or
+    ``columns`` (one list per PriceOptimizationInput field, all the same
+    length). Items are validated individually so one bad row does not fail
+    the whole batch.
+    """
+    items: Optional[List[Any]] = None
+    columns: Optional[Dict[str, List[Any]]] = None
+
+
+class ProductOptimizationInput(BaseModel):
+    """
+    Input model for optimization by product id.
+
+    Features come from the latest snapshot of each product; ``overrides``
+    optionally replaces fields with one list per field aligned with
+    ``product_ids`` (null keeps the stored value). The sales export has no
+    costs, so ``cogs`` usually has to be sent here.
+    """
+    product_ids: List[str]
+    overrides: Optional[Dict[str, List[Any]]] = None
+
+
+class ScenarioRange(BaseModel):
+    """Evenly spaced values from ``min`` to ``max`` (a grid axis)"""
+    min: float
+    max: float
+    steps: int = 11
+
+
+class ScenarioDistribution(BaseModel):
+    """
+    Monte Carlo distribution of one input.
+
+    "uniform" needs ``low`` and ``high``, "normal" ``mean`` and ``std``,
+    "triangular" ``low``, ``mode`` and ``high``.
+    """
+    distribution: Literal["uniform", "normal", "triangular"]
+    low: Optional[float] = None
+    high: Optional[float] = None
+    mean: Optional[float] = None
+    std: Optional[float] = None
+    mode: Optional[float] = None
+
+
+class ScenarioInput(BaseModel):
+    """
+    Input model for a what-if sweep around ``base``.
+
+    Give either ``grid`` (ranges whose Cartesian product is evaluated) or
+    ``monte_carlo`` (distributions sampled ``samples`` times) over any of
+    comp1, comp2, comp3, score and customers.
+    """
+    base: PriceOptimizationInput
+    grid: Optional[Dict[str, ScenarioRange]] = None
+    monte_carlo: Optional[Dict[str, ScenarioDistribution]] = None
+    samples: int = 1000
+    seed: Optional[int] = None
+
+
+class IndexBounds(BaseModel):
+    """Allowed range of a category's average price index (either side optional)"""
+    min: Optional[float] = None
+    max: Optional[float] = None
+
+
+class PortfolioInput(BaseModel):
+    """
+    Input model for constrained portfolio pricing.
+
+    ``columns`` holds one list per PriceOptimizationInput field plus the
+    optional ``current_price``, ``floor`` and ``ceiling`` columns (null
+    entries mean no value). ``index_bounds`` maps category names, or "*"
+    for all others, to bounds on the mean of ``price / comp`` over the
+    category's items; ``max_changes`` caps how many items move from
+    ``current_price`` and ``max_price_change`` caps each move relative to it.
+    """
+    columns: Dict[str, List[Any]]
+    index_bounds: Optional[Dict[str, IndexBounds]] = None
+    max_changes: Optional[int] = None
+    max_price_change: Optional[float] = None
+
+
+class PeriodForecast(BaseModel):
+    """Expected inputs of one period; unset fields keep the base value"""
+    comp1: Optional[float] = None
+    comp2: Optional[float] = None
+    comp3: Optional[float] = None
+    score: Optional[float] = None
+    customers: Optional[float] = None
+    freight: Optional[float] = None
+
+
+class DynamicPricingInput(BaseModel):
+    """
+    Input model for multi-period pricing with limited stock.
+
+    ``periods`` holds one forecast per period of the horizon on top of
+    ``base``; ``inventory`` units are on hand at the start, nothing is
+    restocked, and units left at the end are worth ``salvage_value`` each.
+    ``inventory_levels`` sets how finely remaining stock is discretized.
+    """
+    base: PriceOptimizationInput
+    periods: List[PeriodForecast]
+    inventory: float
+    inventory_levels: int = 1000
+    salvage_value: float = 0.0
+
+
+# Largest number of scenarios one sweep may evaluate
+MAX_SCENARIOS = int(os.getenv("MAX_SCENARIOS", "100000"))
+
+# Largest number of items one portfolio request may price
+MAX_PORTFOLIO_ITEMS = int(os.getenv("MAX_PORTFOLIO_ITEMS", "200000"))
+PORTFOLIO_OPTIONAL_COLUMNS = ("current_price", "floor", "ceiling")
+
+# Longest horizon and finest inventory discretization of a dynamic pricing request
+MAX_HORIZON = int(os.getenv("MAX_HORIZON", "120"))
+MAX_INVENTORY_LEVELS = int(os.getenv("MAX_INVENTORY_LEVELS", "20000"))
+PERIOD_FIELDS = tuple(PeriodForecast.model_fields)
+
+DISTRIBUTION_PARAMETERS = {
+    "uniform": ("low", "high"),
+    "normal": ("mean", "std"),
+    "triangular": ("low", "mode", "high"),
+}
+
+# Price search used when a request does not pick one ("grid", "exact" or "search")
+DEFAULT_SOLVER = os.getenv("PRICE_SOLVER", "grid")
+
+# Upper limit for the curve_points query parameter of POST /optimize_price
+MAX_CURVE_POINTS = 2000
+
+# Upper limit for the budget query parameter (evaluations per item of the "search" solver)
+MAX_SEARCH_BUDGET = 5000
+
+NO_VALID_PRICE_ERROR = "Unable to compute optimal price (no valid price points)."
+
+
+def normalize_feature(value: float, feature_name: str, scaler_params: dict) -> float:
     """Normalize a feature using the scaler parameters"""
-    params = SCALER_PARAMS[feature_name]
+    params = scaler_params[feature_name]
     return (value - params['mean']) / params['std']
 
 
@@ -71,120 +409,137 @@ def predict_demand(price: float, input_values: PriceOptimizationInput) -> float:
     """
     Predict demand (quantity) using the Ridge Regression model.
     
+    Scalar reference implementation of the active model; the endpoints use
+    the vectorized engine, which must agree with it.
+
     This function:
     1. Performs feature engineering (ratios and differences)
     2. Normalizes features using scaler parameters
     3. Calculates the prediction using model coefficients
     4. Clamps the result at a minimum of 0.1
     """
+    model = model_store.get()
+    coefficients = model.coefficients
+
     # Feature engineering: Calculate ratios and differences
-    price_ratio_1 = price / input_values.comp1 if input_values.comp1 > 0 else 1.0
-    price_diff_1 = price - input_values.comp1
-    
-    price_ratio_2 = price / input_values.comp2 if input_values.comp2 > 0 else 1.0
-    price_diff_2 = price - input_values.comp2
-    
-    price_ratio_3 = price / input_values.comp3 if input_values.comp3 > 0 else 1.0
-    price_diff_3 = price - input_values.comp3
-    
-    # Normalize features
-    normalized_price = normalize_feature(price, 'unit_price')
-    normalized_score = normalize_feature(input_values.score, 'product_score')
-    normalized_customers = normalize_feature(input_values.customers, 'customers')
-    normalized_comp1 = normalize_feature(input_values.comp1, 'comp_1')
-    normalized_comp2 = normalize_feature(input_values.comp2, 'comp_2')
-    normalized_comp3 = normalize_feature(input_values.comp3, 'comp_3')
-    normalized_price_ratio_1 = normalize_feature(price_ratio_1, 'price_ratio_1')
-    normalized_price_diff_1 = normalize_feature(price_diff_1, 'price_diff_1')
-    normalized_price_ratio_2 = normalize_feature(price_ratio_2, 'price_ratio_2')
-    normalized_price_diff_2 = normalize_feature(price_diff_2, 'price_diff_2')
-    normalized_price_ratio_3 = normalize_feature(price_ratio_3, 'price_ratio_3')
-    normalized_price_diff_3 = normalize_feature(price_diff_3, 'price_diff_3')
-    
-    # Calculate category one-hot encoding
-    cat_bed_bath_table = 1.0 if (
-        input_values.category.lower() == 'bed_bath_table'
-    ) else 0.0
-    cat_computers_accessories = 1.0 if (
-        input_values.category.lower() == 'computers_accessories'
-    ) else 0.0
-    cat_consoles_games = 1.0 if (
-        input_values.category.lower() == 'consoles_games'
-    ) else 0.0
-    cat_cool_stuff = 1.0 if (
-        input_values.category.lower() == 'cool_stuff'
-    ) else 0.0
-    cat_furniture_decor = 1.0 if (
-        input_values.category.lower() == 'furniture_decor'
-    ) else 0.0
-    cat_garden_tools = 1.0 if (
-        input_values.category.lower() == 'garden_tools'
-    ) else 0.0
-    cat_health_beauty = 1.0 if (
-        input_values.category.lower() == 'health_beauty'
-    ) else 0.0
-    cat_perfumery = 1.0 if (
-        input_values.category.lower() == 'perfumery'
-    ) else 0.0
-    cat_watches_gifts = 1.0 if (
-        input_values.category.lower() == 'watches_gifts'
-    ) else 0.0
-    
-    # Model prediction using Ridge Regression coefficients
-    prediction = (
-        MODEL_COEFFICIENTS['intercept'] +
-        MODEL_COEFFICIENTS['unit_price'] * normalized_price +
-        MODEL_COEFFICIENTS['product_score'] * normalized_score +
-        MODEL_COEFFICIENTS['customers'] * normalized_customers +
-        MODEL_COEFFICIENTS['comp_1'] * normalized_comp1 +
-        MODEL_COEFFICIENTS['comp_2'] * normalized_comp2 +
-        MODEL_COEFFICIENTS['comp_3'] * normalized_comp3 +
-        MODEL_COEFFICIENTS['price_ratio_1'] * normalized_price_ratio_1 +
-        MODEL_COEFFICIENTS['price_diff_1'] * normalized_price_diff_1 +
-        MODEL_COEFFICIENTS['price_ratio_2'] * normalized_price_ratio_2 +
-        MODEL_COEFFICIENTS['price_diff_2'] * normalized_price_diff_2 +
-        MODEL_COEFFICIENTS['price_ratio_3'] * normalized_price_ratio_3 +
-        MODEL_COEFFICIENTS['price_diff_3'] * normalized_price_diff_3 +
-        MODEL_COEFFICIENTS['cat_bed_bath_table'] * (
-            cat_bed_bath_table
-        ) +
-        MODEL_COEFFICIENTS['cat_computers_accessories'] * (
-            cat_computers_accessories
-        ) +
-        MODEL_COEFFICIENTS['cat_consoles_games'] * (
-            cat_consoles_games
-        ) +
-        MODEL_COEFFICIENTS['cat_cool_stuff'] * cat_cool_stuff +
-        MODEL_COEFFICIENTS['cat_furniture_decor'] * (
-            cat_furniture_decor
-        ) +
-        MODEL_COEFFICIENTS['cat_garden_tools'] * cat_garden_tools +
-        MODEL_COEFFICIENTS['cat_health_beauty'] * cat_health_beauty +
-        MODEL_COEFFICIENTS['cat_perfumery'] * cat_perfumery +
-        MODEL_COEFFICIENTS['cat_watches_gifts'] * cat_watches_gifts
-    )
-    
+    features = {
+        'unit_price': price,
+        'product_score': input_values.score,
+        'customers': input_values.customers,
+    }
+    for k, comp in enumerate((input_values.comp1, input_values.comp2, input_values.comp3), start=1):
+        features[f'comp_{k}'] = comp
+        features[f'price_ratio_{k}'] = price / comp if comp > 0 else 1.0
+        features[f'price_diff_{k}'] = price - comp
+
+    # Model prediction using normalized features and the category dummy
+    prediction = coefficients['intercept']
+    for name in model.artifact['features']:
+        prediction += coefficients[name] * normalize_feature(features[name], name, model.scaler_params)
+    prediction += coefficients.get(f'cat_{input_values.category.lower()}', 0.0)
+
     # Clamp at minimum of 0.1
     qty = max(0.1, prediction)
     
     return qty
 
 
+def format_result(optimal_price: float, max_profit: float, predicted_qty: float) -> dict:
+    """Round an optimization result the way the API reports it"""
+    return {
+        "optimal_price": round(float(optimal_price), 2),
+        "max_profit": round(float(max_profit), 2),
+        "predicted_qty": round(float(predicted_qty), 2)
+    }
+
+
 @app.get("/")
 async def root():
     """Welcome endpoint with API information"""
+    model = model_store.get()
     return {
         "message": "Fashionista Price Optimization API",
         "description": "Ridge Regression Demand Model for price optimization",
-        "r_squared": 0.9425,
+        "model_version": model.version,
+        "r_squared": model.artifact["metrics"].get("r_squared"),
+        "load": compute_pool.stats(),
+        "category_models": category_models.stats() if category_models.enabled else None,
+        "coalescer": coalescer.stats() if coalescer.enabled else None,
+        "capture": capture.stats() if capture is not None else None,
         "endpoints": {
             "POST /optimize_price": "Calculate optimal price to maximize profit",
+            "POST /optimize_price/batch": "Optimize prices for many items in one call",
+            "POST /optimize_price/by_product": "Optimize prices by product id from stored features",
+            "POST /optimize_price/scenarios": "What-if sweep over competitor prices, score and customers",
+            "POST /optimize_price/portfolio": "Jointly price many items under category and change constraints",
+            "POST /optimize_price/dynamic": "Price path over several periods with limited inventory",
             "GET /optimize_price": "Get API documentation",
+            "GET /model": "Active demand model artifact",
+            "POST /model/reload": "Load a new model artifact now",
+            "GET /model/categories": "Per-category models: availability, residency and load latency",
+            "GET /features": "Product feature snapshot",
+            "POST /features/reload": "Reload product features now",
+            "WS /stream/prices": "Live optimal prices re-computed on competitor price ticks",
+            "GET /stream": "Streaming statistics",
+            "GET /cache": "Result cache statistics",
+            "DELETE /cache": "Clear the result cache",
+            "GET /metrics": "Prometheus metrics",
             "GET /": "This endpoint"
         }
     }
 
 
+@app.get("/model")
+async def model_info():
+    """Describe the active demand model artifact"""
+    model = model_store.get()
+    artifact = model.artifact
+    ensemble = model.compiled.ensemble
+    return {
+        "version": artifact["version"],
+        "created_at": artifact.get("created_at"),
+        "model": artifact["model"],
+        "features": artifact["features"],
+        "categories": artifact["categories"],
+        "metrics": artifact["metrics"],
+        "ensemble_members": 0 if ensemble is None else len(ensemble.bias),
+        "path": model_store.path,
+        "demand_models": {
+            name: {"version": demand.version, "metrics": demand.metrics} for name, demand in demand_models.items()
+        },
+    }
+
+
+@app.post("/model/reload")
+async def reload_model():
+    """Load the model artifact from disk now instead of waiting for the watcher"""
+    try:
+        changed = model_store.reload()
+    except (OSError, ValueError, KeyError) as e:
+        raise HTTPException(status_code=500, detail=f"Failed to load model artifact: {e}")
+    category_models.refresh(force=True)
+    return {"reloaded": changed, "version": model_store.get().version}
+
+
+@app.get("/model/categories")
+async def category_model_info():
+    """Per-category models: how many exist, which are resident, hit and cold-load figures"""
+    return category_models.stats(detail=True)
+
+
+@app.get("/cache")
+async def cache_stats():
+    """Hit/miss/eviction counters of the optimize_price result cache"""
+    return result_cache.stats()
+
+
+@app.delete("/cache")
+async def clear_cache():
+    """Drop every cached optimization result"""
+    result_cache.clear()
+    return result_cache.stats()
+
+
 @app.get("/optimize_price")
 async def optimize_price_info():
     """Get information about the optimize_price endpoint"""
@@ -202,6 +557,15 @@ async def optimize_price_info():
             "score": "Product score/rating (float)",
             "customers": "Number of customers (integer)"
         },
+        "query_parameters": {
+            "solver": "'grid' (0.50 price steps), 'exact' (closed-form optimum to the cent) or 'search' (coarse-to-fine)",
+            "demand_model": "'ridge' (default) or a loaded non-linear model, e.g. 'tree' or 'spline' (grid and search solvers)",
+            "tolerance": "Price precision of the search solver (default 0.01)",
+            "budget": "Most demand evaluations per item for the search solver (default 200)",
+            "curve_points": "Also return up to this many (price, qty, profit) points of the searched grid (default 0 = none)",
+            "include_demand": "Also return the linear demand form qty = max(min_qty, intercept + slope * price)",
+            "confidence": "Also return bootstrap-ensemble intervals at this level (e.g. 0.9) and a risk-adjusted price"
+        },
         "example": {
             "category": "apparel",
             "cogs": 45.0,
@@ -216,59 +580,1026 @@ async def optimize_price_info():
 
 
 @app.post("/optimize_price")
-async def optimize_price(input_data: PriceOptimizationInput):
+async def optimize_price(
+    input_data: PriceOptimizationInput,
+    solver: Literal["grid", "exact", "search"] = Query(DEFAULT_SOLVER),
+    curve_points: int = Query(0, ge=0, le=MAX_CURVE_POINTS),
+    include_demand: bool = Query(False),
+    confidence: float = Query(0.0, ge=0.0, lt=1.0),
+    demand_model: str = Query("ridge"),
+    tolerance: float = Query(SEARCH_TOLERANCE, gt=0.0),
+    budget: int = Query(SEARCH_BUDGET, ge=3, le=MAX_SEARCH_BUDGET),
+):
     """
     Optimize price to maximize profit.
     
-    Iterates through a price range and calculates profit for each price point.
-    Returns the optimal price that maximizes profit.
+    The "grid" solver evaluates profit over the 0.50-step price grid in one
+    vectorized pass. The "exact" solver finds the optimum to the cent in
+    closed form. The "search" solver narrows the price range coarse to fine
+    until it is within ``tolerance``, spending at most ``budget`` demand
+    evaluations. Returns the optimal price that maximizes profit.
+
+    ``demand_model`` picks a loaded non-linear model (see demand_models.py)
+    instead of the Ridge artifact; those support the grid and search
+    solvers but not the curve, demand line or confidence options.
+
+    With ``curve_points`` the response also carries the sampled profit curve,
+    and with ``include_demand`` the model folded to a line in price, so a
+    client can chart and re-evaluate what-if prices without calling again.
+
+    With ``confidence`` (e.g. 0.9) every bootstrap ensemble member of the
+    model is evaluated as well, and the response carries central intervals
+    of predicted_qty and max_profit at the optimal price plus the price that
+    maximizes the lower end of the profit interval.
+
+    Results are cached per model version and solver; with a cache quantum
+    configured, inputs are snapped to it before optimizing. Cache misses are
+    computed in the bounded compute pool (503 when it is full), together
+    with concurrent requests when the coalescer is enabled.
     """
-    # Calculate price range
-    min_price = input_data.cogs + input_data.freight + 10
-    max_price = max(input_data.comp1, input_data.comp2, input_data.comp3) * 2
-    step = 0.50
-    
-    optimal_price = min_price
-    max_profit = -float('inf')
-    optimal_qty = 0.0
-    
-    # Optimization loop
-    price = min_price
-    while price <= max_price:
-        # Predict demand for this price
-        try:
-            qty = predict_demand(price, input_data)
-        except Exception:
-            # skip this price if prediction fails
-            price += step
-            continue
+    mark("handler_start")
+    started = time.perf_counter()
+    model = await model_for(input_data.category, need_ensemble=bool(confidence))
+    if confidence and model.compiled.ensemble is None:
+        raise HTTPException(
+            status_code=400,
+            detail="The active model has no bootstrap ensemble; retrain with 'python train.py --bootstrap 200'.",
+        )
+    demand = None
+    if demand_model != "ridge":
+        demand = find_demand_model(demand_model)
+        if solver == "exact" or curve_points or include_demand or confidence:
+            raise HTTPException(
+                status_code=400,
+                detail="Non-linear demand models support the grid and search solvers without curve, demand or confidence.",
+            )
+    detail = (curve_points, include_demand, confidence, demand)
+    options = {"tolerance": tolerance, "budget": budget} if solver == "search" else {}
+    if not result_cache.enabled:
+        response = await compute_single(model, input_data, solver, detail, options)
+    else:
+        values = result_cache.normalize(input_data)
+        variant = "ridge" if demand is None else demand.version
+        key = result_cache.key(model.version, solver, values, *detail[:3], variant, *options.values())
+        response = result_cache.get(key)
+        if response is None:
+            response = await compute_single(model, SimpleNamespace(**values), solver, detail, options)
+            result_cache.put(key, response)
+    mark("handler_end")
+    if capture is not None:
+        query = {"solver": solver, "curve_points": curve_points, "include_demand": include_demand,
+                 "confidence": confidence, "demand_model": demand_model, "tolerance": tolerance, "budget": budget}
+        capture.record("/optimize_price", query, input_data, response, 200, model.version,
+                       time.perf_counter() - started)
+    return response
 
-        # Calculate profit
-        profit = (price * qty) - (input_data.cogs * qty) - (input_data.freight * qty)
 
-        # Skip if values are not finite (avoid JSON serialization errors)
-        if not (math.isfinite(qty) and math.isfinite(profit)):
-            price += step
-            continue
+async def model_for(category: str, need_ensemble: bool = False):
+    """
+    The category's own model if it has one (loaded in the compute pool on
+    first use), else the global model. Without a bootstrap ensemble of its
+    own, confidence requests use the global model.
+    """
+    model = model_store.get()
+    if not category_models.enabled:
+        return model
+    available, own = category_models.lookup(category)
+    if available and own is None:
+        own = await compute_pool.run(category_models.get, category)
+    if own is None or (need_ensemble and own.compiled.ensemble is None):
+        return model
+    return own
 
-        # Update optimal values if this is better
-        if profit > max_profit:
-            max_profit = profit
-            optimal_price = price
-            optimal_qty = qty
 
-        price += step
-    
+def search_categories(model, batch: ItemBatch, solver: str):
+    """
+    ``search`` with every category's own model where it has one.
+
+    The models a batch needs are prefetched together before solving, and
+    the demand lines of all categories are built in one pass (categories
+    without a model of their own use ``model``) and solved in one call.
+    """
+    if not category_models.enabled or not batch.size:
+        return search(model, batch, solver)
+    names, inverse = np.unique(np.char.lower(batch.category.astype(str)), return_inverse=True)
+    owned = category_models.prefetch(names.tolist())
+    if not any(owned.values()):
+        return search(model, batch, solver)
+
+    started = time.perf_counter()
+    models = [(owned[name] or model).compiled for name in names.tolist()]
+    lines = linear_demand_by_category(batch, models, names, inverse.reshape(-1))
+    stage_latency.observe(time.perf_counter() - started, "features")
+    return search(model, batch, solver, lines=lines)
+
+
+def find_demand_model(name: str):
+    """Loaded non-linear demand model ``name`` (422 when there is none)"""
+    demand = demand_models.get(name)
+    if demand is None:
+        available = ", ".join(["ridge", *sorted(demand_models)])
+        raise HTTPException(status_code=422, detail=f"Unknown demand model '{name}'; available: {available}")
+    return demand
+
+
+async def compute_single(model, item, solver: str, detail: tuple, options: dict) -> dict:
+    """Optimize one item in the compute pool, batched with concurrent requests when coalescing"""
+    curve_points, include_demand, confidence, demand = detail
+    if coalescer.enabled and not (curve_points or include_demand or confidence):
+        key = (model.version, solver, None if demand is None else demand.version, *options.items())
+        return await coalescer.submit(key, (model, demand, item))
+    return await compute_pool.run(optimize_single, model, item, solver, *detail, **options)
+
+
+def search(model, batch, solver: str, demand=None, lines: tuple = None, **options):
+    """
+    Run the engine and record its stage timings and point counters.
+
+    ``demand`` replaces the Ridge model with a non-linear one, ``lines``
+    are precomputed Ridge demand lines; ``options`` go to the solver.
+    """
+    if demand is None:
+        timings = {}
+        result = optimize(model.compiled, batch, solver, timings, lines, **options)
+        if lines is None:
+            stage_latency.observe(timings["features"], "features")
+        stage_latency.observe(timings["search"], "search")
+    else:
+        started = time.perf_counter()
+        result = demand.optimize(batch, solver, **options)
+        stage_latency.observe(time.perf_counter() - started, "search")
+    points_evaluated.inc(int(result.points_evaluated.sum()), solver)
+    points_skipped.inc(int(result.points_skipped.sum()), solver)
+    return result
+
+
+def optimize_single(model, item, solver: str, curve_points: int = 0, include_demand: bool = False,
+                    confidence: float = 0.0, demand=None, **options) -> dict:
+    """Optimize one item and build the endpoint response"""
+    batch = make_batch([item])
+    result = search(model, batch, solver, demand, **options)
+
     # Ensure returned values are finite and JSON serializable
-    if not math.isfinite(max_profit):
-        return {"error": "Unable to compute optimal price (no valid price points)."}
+    if not math.isfinite(result.max_profit[0]):
+        return {"error": NO_VALID_PRICE_ERROR}
+
+    response = format_result(result.optimal_price[0], result.max_profit[0], result.predicted_qty[0])
+    if curve_points:
+        prices, qty, profit = profit_curve(model.compiled, batch, curve_points)
+        response["curve"] = {"price": prices.tolist(), "qty": qty.tolist(), "profit": profit.tolist()}
+    if include_demand:
+        response["demand"] = demand_line(model, batch)
+    if confidence:
+        started = time.perf_counter()
+        summary = ensemble_summary(model.compiled, batch, result.optimal_price[0], confidence)
+        stage_latency.observe(time.perf_counter() - started, "ensemble")
+        response["confidence"] = format_confidence(summary, confidence)
+    return response
+
+
+def optimize_many(model, items: list, solver: str, demand=None, **options) -> list:
+    """Optimize coalesced single-item requests in one engine call; one response per item"""
+    result = search(model, make_batch(items), solver, demand, **options)
+    return [
+        format_result(price, profit, qty) if math.isfinite(profit) else {"error": NO_VALID_PRICE_ERROR}
+        for price, profit, qty in zip(
+            result.optimal_price.tolist(), result.max_profit.tolist(), result.predicted_qty.tolist()
+        )
+    ]
+
+
+def format_confidence(summary, level: float) -> dict:
+    """Round ensemble intervals the way the API reports them"""
+    def rounded(value: float):
+        return round(value, 2) if math.isfinite(value) else None
 
     return {
-        "optimal_price": float(round(optimal_price, 2)),
-        "max_profit": float(round(max_profit, 2)),
-        "predicted_qty": float(round(optimal_qty, 2))
+        "level": level,
+        "members": summary.members,
+        "predicted_qty": [rounded(summary.qty_low), rounded(summary.qty_high)],
+        "max_profit": [rounded(summary.profit_low), rounded(summary.profit_high)],
+        "risk_adjusted_price": rounded(summary.risk_price),
+        "risk_adjusted_profit": rounded(summary.risk_profit),
     }
 
 
+def demand_line(model, batch: ItemBatch) -> dict:
+    """
+    The model for one item as a line in price.
+
+    qty = max(min_qty, intercept + slope * price) and
+    profit = (price - cogs - freight) * qty for min_price <= price <= max_price.
+    """
+    intercept, slope = linear_demand(model.compiled, batch)
+    min_price, max_price = price_bounds(batch)
+    return {
+        "intercept": float(intercept[0]),
+        "slope": float(slope[0]),
+        "min_qty": MIN_QTY,
+        "cogs": float(batch.cogs[0]),
+        "freight": float(batch.freight[0]),
+        "min_price": float(min_price[0]),
+        "max_price": float(max_price[0]),
+    }
+
+
+def media_type(header: Optional[str]) -> str:
+    """Media type of a Content-Type header without its parameters"""
+    return (header or "application/json").split(";")[0].strip().lower()
+
+
+def parse_body(model, body):
+    """Validate a JSON body (or decoded dict) against ``model``, failing like FastAPI's own body parsing"""
+    try:
+        if isinstance(body, dict):
+            return model.model_validate(body)
+        return model.model_validate_json(body)
+    except ValidationError as e:
+        # Like FastAPI, do not echo an unparseable body (it may not even be UTF-8)
+        raise RequestValidationError([
+            {**error, "loc": ("body", *error["loc"]), **({"input": {}} if error["type"] == "json_invalid" else {})}
+            for error in e.errors(include_url=False)
+        ])
+
+
+def request_body(model) -> dict:
+    """OpenAPI request body of an endpoint taking ``model`` as JSON or binary columns"""
+    schema = model.model_json_schema()
+    definitions = schema.pop("$defs", {})
+
+    def inline(node):
+        if isinstance(node, dict):
+            if "$ref" in node:
+                return inline(definitions[node["$ref"].rsplit("/", 1)[-1]])
+            return {key: inline(value) for key, value in node.items()}
+        if isinstance(node, list):
+            return [inline(value) for value in node]
+        return node
+
+    binary = {"schema": {"type": "string", "format": "binary"}}
+    content = {"application/json": {"schema": inline(schema)}}
+    content.update({content_type: binary for content_type in BINARY_CONTENT_TYPES})
+    return {"requestBody": {"required": True, "content": content}}
+
+
+@app.post("/optimize_price/batch", openapi_extra=request_body(BatchOptimizationInput))
+async def optimize_price_batch(
+    request: Request,
+    solver: Literal["grid", "exact", "search"] = Query(DEFAULT_SOLVER),
+):
+    """
+    Optimize prices for many items in one broadcasted grid evaluation.
+
+    Results match POST /optimize_price item by item for the same solver.
+    Row input returns a ``results`` list (an ``error`` object for failed
+    items); columnar input returns one list per output field with ``null``
+    for failed items. Both forms list failures under ``errors`` with their
+    row index.
+
+    Columns may also be sent as a binary payload (Content-Type
+    ``application/x-fpo-columns`` or ``application/vnd.apache.arrow.stream``,
+    see columnar.py), and the same two types in Accept return the results
+    as binary columns with NaN for failed items.
+    """
+    body = await request.body()
+    content_type = media_type(request.headers.get("content-type"))
+    binary = negotiate(request.headers.get("accept"))
+    if content_type in BINARY_CONTENT_TYPES:
+        mark("handler_start")
+        try:
+            return await compute_pool.run(solve_batch_payload, model_store.get(), body, content_type, solver, binary)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+
+    input_data = parse_body(BatchOptimizationInput, body)
+    mark("handler_start")
+    if (input_data.items is None) == (input_data.columns is None):
+        raise HTTPException(status_code=422, detail="Provide exactly one of 'items' or 'columns'.")
+
+    if input_data.items is not None:
+        items = input_data.items
+        size = len(items)
+        columns = {
+            field: [item.get(field) if isinstance(item, dict) else None for item in items]
+            for field in ItemBatch._fields
+        }
+    else:
+        columns = input_data.columns
+        missing = [field for field in ItemBatch._fields if field not in columns]
+        if missing:
+            raise HTTPException(status_code=422, detail=f"Missing columns: {', '.join(missing)}")
+        sizes = {len(columns[field]) for field in ItemBatch._fields}
+        if len(sizes) > 1:
+            raise HTTPException(status_code=422, detail="All columns must have the same length.")
+        size = sizes.pop()
+
+    # Validation, optimization and encoding all run off the event loop
+    return await compute_pool.run(
+        solve_batch, model_store.get(), columns, size, solver, input_data.items is not None, binary
+    )
+
+
+def solve_batch(model, columns: dict, size: int, solver: str, as_rows: bool,
+                binary: Optional[str] = None) -> Response:
+    """Validate, optimize and encode a JSON batch request"""
+    started = time.perf_counter()
+    batch, errors = batch_from_columns(columns, size)
+    stage_latency.observe(time.perf_counter() - started, "batch_validation")
+    return batch_response(model, batch, errors, size, solver, as_rows, binary)
+
+
+def solve_batch_payload(model, body: bytes, content_type: str, solver: str, binary: Optional[str]) -> Response:
+    """Decode, validate, optimize and encode a binary batch request"""
+    started = time.perf_counter()
+    batch, errors = batch_from_payload(read_payload(body, content_type))
+    stage_latency.observe(time.perf_counter() - started, "batch_validation")
+    return batch_response(model, batch, errors, batch.size, solver, False, binary)
+
+
+def batch_response(model, batch: ItemBatch, errors: dict, size: int, solver: str, as_rows: bool,
+                   binary: Optional[str], extra: Optional[dict] = None) -> Response:
+    """
+    Optimize a validated batch and encode it as JSON rows, JSON columns or
+    binary columns. ``extra`` fields are added to the JSON body (or meta).
+    Categories with a model of their own are solved with it.
+    """
+    result = search_categories(model, batch, solver)
+
+    found = np.isfinite(result.max_profit)
+    for i in np.flatnonzero(~found):
+        errors.setdefault(int(i), NO_VALID_PRICE_ERROR)
+    error_list = [{"index": i, "error": errors[i]} for i in sorted(errors)]
+
+    started = time.perf_counter()
+    if binary:
+        failed = ~found
+        failed[list(errors)] = True
+        columns = {
+            "optimal_price": np.where(failed, np.nan, np.round(result.optimal_price, 2)),
+            "max_profit": np.where(failed, np.nan, np.round(result.max_profit, 2)),
+            "predicted_qty": np.where(failed, np.nan, np.round(result.predicted_qty, 2)),
+        }
+        meta = {"count": size, **(extra or {}), "errors": error_list}
+        response = Response(write_payload(columns, meta, binary), media_type=binary)
+        stage_latency.observe(time.perf_counter() - started, "serialization")
+        return response
+
+    prices = result.optimal_price.tolist()
+    profits = result.max_profit.tolist()
+    quantities = result.predicted_qty.tolist()
+    if as_rows:
+        results = [
+            {"error": errors[i]} if i in errors else format_result(prices[i], profits[i], quantities[i])
+            for i in range(size)
+        ]
+        response = JSONResponse({"count": size, **(extra or {}), "results": results, "errors": error_list})
+    else:
+        formatted = [
+            None if i in errors else format_result(prices[i], profits[i], quantities[i])
+            for i in range(size)
+        ]
+        response = JSONResponse({
+            "count": size,
+            **(extra or {}),
+            "optimal_price": [row and row["optimal_price"] for row in formatted],
+            "max_profit": [row and row["max_profit"] for row in formatted],
+            "predicted_qty": [row and row["predicted_qty"] for row in formatted],
+            "errors": error_list,
+        })
+    stage_latency.observe(time.perf_counter() - started, "serialization")
+    return response
+
+
+@app.post("/optimize_price/by_product")
+async def optimize_price_by_product(
+    input_data: ProductOptimizationInput,
+    request: Request,
+    solver: Literal["grid", "exact", "search"] = Query(DEFAULT_SOLVER),
+):
+    """
+    Optimize prices for products by id using the server-side feature store.
+
+    Returns the same columnar output as POST /optimize_price/batch plus the
+    feature snapshot version, the month each product's features are from
+    and its latest observed price. Unknown ids and products still missing a
+    field after the overrides are listed under ``errors``. A binary Accept
+    type returns binary columns.
+    """
+    mark("handler_start")
+    if not feature_store.enabled:
+        raise HTTPException(status_code=503, detail=f"No product features available at {FEATURES_PATH}.")
+    overrides = input_data.overrides or {}
+    unknown = [field for field in overrides if field not in ItemBatch._fields]
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown override fields: {', '.join(unknown)}")
+    size = len(input_data.product_ids)
+    if any(len(values) != size for values in overrides.values()):
+        raise HTTPException(status_code=422, detail="Every override list must have one entry per product id.")
+
+    binary = negotiate(request.headers.get("accept"))
+    return await compute_pool.run(
+        solve_by_product, model_store.get(), feature_store.get(), input_data.product_ids, overrides, solver, binary
+    )
+
+
+def solve_by_product(model, snapshot, product_ids: list, overrides: dict, solver: str,
+                     binary: Optional[str]) -> Response:
+    """Look up, override, validate, optimize and encode a by-product request"""
+    started = time.perf_counter()
+    size = len(product_ids)
+    rows = snapshot.lookup(product_ids)
+    features = snapshot.take(rows)
+    errors = {int(i): f"product_id: Unknown product {product_ids[i]!r}" for i in np.flatnonzero(rows < 0)}
+
+    columns = []
+    for field, values in zip(ItemBatch._fields, features):
+        given = overrides.get(field)
+        if given is None:
+            columns.append(values)
+        elif field == "category":
+            for i, value in enumerate(given):
+                if value is not None and not isinstance(value, str):
+                    errors.setdefault(i, "category: Input should be a valid string")
+            columns.append(np.array([
+                value if isinstance(value, str) else stored for value, stored in zip(given, values)
+            ], dtype=object))
+        else:
+            column = optional_column(field, given, errors)
+            columns.append(np.where(np.isnan(column), values, column))
+    batch = ItemBatch(*columns)
+    for field in ItemBatch._fields[1:]:
+        for i in np.flatnonzero(np.isnan(getattr(batch, field))):
+            errors.setdefault(int(i), f"{field}: Field required")
+    stage_latency.observe(time.perf_counter() - started, "batch_validation")
+
+    known = rows >= 0
+    if len(snapshot.ids):
+        safe = np.where(known, rows, 0)
+        months = snapshot.month[safe].astype(str)
+        prices = np.where(known, snapshot.price[safe], np.nan)
+    else:
+        months, prices = np.full(size, ""), np.full(size, np.nan)
+    extra = {
+        "features_version": snapshot.version,
+        "feature_month": [month if ok else None for month, ok in zip(months.tolist(), known.tolist())],
+        "current_price": json_array(prices, 2),
+    }
+    return batch_response(model, batch, errors, size, solver, False, binary, extra)
+
+
+@app.get("/features")
+async def feature_stats():
+    """Active product feature snapshot"""
+    if not feature_store.enabled:
+        return {"loaded": False, "source": FEATURES_PATH}
+    return feature_store.stats()
+
+
+@app.post("/features/reload")
+async def reload_features():
+    """Rebuild the product feature snapshot from its source now"""
+    if not feature_store.enabled:
+        raise HTTPException(status_code=503, detail=f"No product features available at {FEATURES_PATH}.")
+    try:
+        changed = await compute_pool.run(feature_store.refresh)
+    except (OSError, ValueError, KeyError) as e:
+        raise HTTPException(status_code=500, detail=f"Failed to load product features: {e}")
+    return {"reloaded": changed, **feature_store.stats()}
+
+
+@app.post("/optimize_price/scenarios")
+async def optimize_price_scenarios(
+    input_data: ScenarioInput,
+    solver: Literal["grid", "exact"] = Query("exact"),
+):
+    """
+    Optimize price across many what-if scenarios in one broadcasted pass.
+
+    Returns the optimal price, profit and quantity of every scenario (as
+    surfaces shaped like the grid, or per sample), the elasticity of the
+    optimal profit with respect to each competitor price, summaries, and
+    the base input's own result and elasticities. Elasticities always come
+    from the exact solver, which is continuous in the competitor prices.
+    """
+    mark("handler_start")
+    if (input_data.grid is None) == (input_data.monte_carlo is None):
+        raise HTTPException(status_code=422, detail="Provide exactly one of 'grid' or 'monte_carlo'.")
+    varied = input_data.grid if input_data.grid is not None else input_data.monte_carlo
+    unknown = [field for field in varied if field not in SCENARIO_FIELDS]
+    if unknown or not varied:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Scenarios can vary {', '.join(SCENARIO_FIELDS)}; got {', '.join(unknown) or 'nothing'}.",
+        )
+
+    if input_data.grid is not None:
+        if any(axis.steps < 1 for axis in input_data.grid.values()):
+            raise HTTPException(status_code=422, detail="Every grid axis needs at least 1 step.")
+        for field, axis in input_data.grid.items():
+            if not (math.isfinite(axis.min) and math.isfinite(axis.max)):
+                raise HTTPException(status_code=422, detail=f"{field}: min and max must be finite numbers.")
+        count = math.prod(axis.steps for axis in input_data.grid.values())
+        ranges = {field: (axis.min, axis.max, axis.steps) for field, axis in input_data.grid.items()}
+        request = ("grid", ranges)
+    else:
+        count = input_data.samples
+        distributions = {}
+        for field, spec in input_data.monte_carlo.items():
+            names = DISTRIBUTION_PARAMETERS[spec.distribution]
+            params = [getattr(spec, name) for name in names]
+            if any(value is None for value in params):
+                raise HTTPException(
+                    status_code=422,
+                    detail=f"{field}: a {spec.distribution} distribution needs {', '.join(names)}.",
+                )
+            problem = distribution_problem(spec.distribution, params)
+            if problem:
+                raise HTTPException(status_code=422, detail=f"{field}: {problem}.")
+            distributions[field] = (spec.distribution, *params)
+        request = ("monte_carlo", distributions)
+    if not 1 <= count <= MAX_SCENARIOS:
+        raise HTTPException(status_code=422, detail=f"A sweep must have between 1 and {MAX_SCENARIOS} scenarios.")
+
+    return await compute_pool.run(
+        solve_scenarios, model_store.get(), input_data.base, request, count, input_data.seed, solver
+    )
+
+
+def distribution_problem(kind: str, params: list) -> Optional[str]:
+    """Why a Monte Carlo distribution's parameters cannot be sampled, if they cannot"""
+    if not all(math.isfinite(value) for value in params):
+        return f"{', '.join(DISTRIBUTION_PARAMETERS[kind])} must be finite numbers"
+    if kind == "uniform" and params[0] > params[1]:
+        return "low must not be above high"
+    if kind == "normal" and params[1] < 0:
+        return "std must not be negative"
+    if kind == "triangular" and not (params[0] <= params[1] <= params[2] and params[0] < params[2]):
+        return "a triangular distribution needs low <= mode <= high and low < high"
+    return None
+
+
+def json_array(values, digits: int, shape=None) -> list:
+    """Rounded nested list of ``values`` with null for non-finite entries"""
+    values = np.asarray(values, dtype=float)
+    with np.errstate(over='ignore', invalid='ignore'):
+        rounded = np.round(values, digits)
+    # Rounding can overflow values near the float limit
+    finite = np.isfinite(rounded)
+    rounded = np.array(rounded, dtype=object)
+    rounded[~finite] = None
+    return rounded.reshape(shape if shape is not None else values.shape).tolist()
+
+
+def solve_scenarios(model, base, request: tuple, count: int, seed: Optional[int], solver: str) -> JSONResponse:
+    """Build, solve and encode a scenario sweep (the base input is solved alongside)"""
+    mode, spec = request
+    if mode == "grid":
+        axes, values = grid_values(spec)
+        shape = [len(axis) for axis in axes.values()]
+    else:
+        values = sample_values(spec, count, seed)
+        shape = None
+    # The base input rides along as the last scenario
+    values = {field: np.append(column, getattr(base, field)) for field, column in values.items()}
+    batch = scenario_batch(base, values, count + 1)
+
+    timings = {}
+    swept = sweep(model.compiled, batch, solver, timings=timings)
+    stage_latency.observe(timings["features"], "features")
+    stage_latency.observe(timings["search"], "search")
+    result = swept.result
+    points_evaluated.inc(int(result.points_evaluated.sum()), solver)
+    points_skipped.inc(int(result.points_skipped.sum()), solver)
+
+    started = time.perf_counter()
+    scenarios = slice(0, count)
+    if math.isfinite(result.max_profit[count]):
+        base_result = {
+            "optimal_price": json_array(result.optimal_price[count], 2),
+            "max_profit": json_array(result.max_profit[count], 2),
+            "predicted_qty": json_array(result.predicted_qty[count], 2),
+        }
+    else:
+        base_result = {"error": NO_VALID_PRICE_ERROR}
+    base_result["profit_elasticity"] = {
+        field: json_array(swept.profit_elasticity[field][count], 4) for field in COMPETITOR_FIELDS
+    }
+    base_result["price_elasticity"] = {
+        field: json_array(swept.price_elasticity[field][count], 4) for field in COMPETITOR_FIELDS
+    }
+
+    found = np.isfinite(result.max_profit[scenarios])
+    prices = np.where(found, result.optimal_price[scenarios], np.nan)
+    profits = np.where(found, result.max_profit[scenarios], np.nan)
+    quantities = np.where(found, result.predicted_qty[scenarios], np.nan)
+    response = {"mode": mode, "solver": solver, "count": count, "base": base_result}
+    if mode == "grid":
+        response["shape"] = shape
+        response["axes"] = {field: json_array(axis, 4) for field, axis in axes.items()}
+    else:
+        response["inputs"] = {field: json_array(column[scenarios], 4) for field, column in values.items()}
+    response.update({
+        "optimal_price": json_array(prices, 2, shape),
+        "max_profit": json_array(profits, 2, shape),
+        "predicted_qty": json_array(quantities, 2, shape),
+        "profit_elasticity": {
+            field: json_array(swept.profit_elasticity[field][scenarios], 4, shape) for field in COMPETITOR_FIELDS
+        },
+        "summary": {
+            "optimal_price": summarize(prices),
+            "max_profit": summarize(profits),
+            "predicted_qty": summarize(quantities),
+            "profit_elasticity": {
+                field: summarize(swept.profit_elasticity[field][scenarios], 4) for field in COMPETITOR_FIELDS
+            },
+        },
+    })
+    json_response = JSONResponse(response)
+    stage_latency.observe(time.perf_counter() - started, "serialization")
+    return json_response
+
+
+@app.post("/optimize_price/portfolio", openapi_extra=request_body(PortfolioInput))
+async def optimize_price_portfolio(request: Request):
+    """
+    Jointly optimize the prices of many items under global constraints.
+
+    Returns one list per output field (null for failed items), whether
+    each item's price changed, the achieved index and constraint status
+    per category, and the total profit next to the profit without the
+    constraints. Rows that fail validation are excluded and listed under
+    ``errors``.
+
+    Binary payloads (see POST /optimize_price/batch) carry the constraints
+    in their ``meta``; a binary Accept type returns the per-item columns
+    binary (``changed`` as int8, -1 for failed items) with the rest in meta.
+    """
+    body = await request.body()
+    content_type = media_type(request.headers.get("content-type"))
+    binary = negotiate(request.headers.get("accept"))
+    if content_type in BINARY_CONTENT_TYPES:
+        mark("handler_start")
+        try:
+            return await compute_pool.run(solve_portfolio_payload, model_store.get(), body, content_type, binary)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+
+    input_data = parse_body(PortfolioInput, body)
+    mark("handler_start")
+    columns = input_data.columns
+    missing = [field for field in ItemBatch._fields if field not in columns]
+    if missing:
+        raise HTTPException(status_code=422, detail=f"Missing columns: {', '.join(missing)}")
+    present = [field for field in (*ItemBatch._fields, *PORTFOLIO_OPTIONAL_COLUMNS) if field in columns]
+    sizes = {len(columns[field]) for field in present}
+    if len(sizes) > 1:
+        raise HTTPException(status_code=422, detail="All columns must have the same length.")
+    size = sizes.pop()
+    constraints = portfolio_constraints(input_data, size, columns)
+    return await compute_pool.run(solve_portfolio, model_store.get(), columns, size, constraints, binary)
+
+
+def portfolio_constraints(input_data: PortfolioInput, size: int, columns) -> PortfolioConstraints:
+    """Check the portfolio size and rules against the columns sent"""
+    if not 1 <= size <= MAX_PORTFOLIO_ITEMS:
+        raise HTTPException(status_code=422, detail=f"A portfolio must have between 1 and {MAX_PORTFOLIO_ITEMS} items.")
+    if input_data.max_changes is not None:
+        if input_data.max_changes < 0:
+            raise HTTPException(status_code=422, detail="max_changes must not be negative.")
+        if "current_price" not in columns:
+            raise HTTPException(status_code=422, detail="max_changes needs a current_price column.")
+    if input_data.max_price_change is not None:
+        if input_data.max_price_change < 0:
+            raise HTTPException(status_code=422, detail="max_price_change must not be negative.")
+        if "current_price" not in columns:
+            raise HTTPException(status_code=422, detail="max_price_change needs a current_price column.")
+
+    index_bounds = {
+        name.lower() if name != "*" else name: (bounds.min, bounds.max)
+        for name, bounds in (input_data.index_bounds or {}).items()
+    }
+    return PortfolioConstraints(index_bounds, input_data.max_changes, input_data.max_price_change)
+
+
+def optional_column(name: str, values, errors: dict) -> np.ndarray:
+    """Float column where null entries become NaN (no value)"""
+    column = np.full(len(values), np.nan)
+    for i, value in enumerate(values):
+        if value is None:
+            continue
+        try:
+            column[i] = float(value)
+        except (TypeError, ValueError, OverflowError):
+            errors.setdefault(i, f"{name}: Input should be a valid number")
+    return column
+
+
+def solve_portfolio(model, columns: dict, size: int, constraints: PortfolioConstraints,
+                    binary: Optional[str] = None) -> Response:
+    """Validate, solve and encode a JSON portfolio request"""
+    started = time.perf_counter()
+    batch, errors = batch_from_columns(columns, size)
+    extra = {
+        name: optional_column(name, columns[name], errors) if name in columns else None
+        for name in PORTFOLIO_OPTIONAL_COLUMNS
+    }
+    stage_latency.observe(time.perf_counter() - started, "batch_validation")
+    return portfolio_response(model, batch, errors, extra, constraints, binary)
+
+
+def solve_portfolio_payload(model, body: bytes, content_type: str, binary: Optional[str]) -> Response:
+    """Decode, validate, solve and encode a binary portfolio request"""
+    started = time.perf_counter()
+    payload = read_payload(body, content_type)
+    constraints = portfolio_constraints(
+        parse_body(PortfolioInput, {**payload.meta, "columns": {}}), payload.count, payload.columns
+    )
+    batch, errors = batch_from_payload(payload)
+    extra = {
+        name: numeric_column(name, payload.columns[name], errors, required=False) if name in payload.columns else None
+        for name in PORTFOLIO_OPTIONAL_COLUMNS
+    }
+    stage_latency.observe(time.perf_counter() - started, "batch_validation")
+    return portfolio_response(model, batch, errors, extra, constraints, binary)
+
+
+def portfolio_response(model, batch: ItemBatch, errors: dict, extra: dict, constraints: PortfolioConstraints,
+                       binary: Optional[str]) -> Response:
+    """Solve the valid rows of a portfolio jointly and encode the result"""
+    size = batch.size
+    valid = np.ones(size, dtype=bool)
+    valid[list(errors)] = False
+    rows = np.flatnonzero(valid)
+    subset = ItemBatch(*(values[rows] for values in batch))
+    extra = {name: None if values is None else values[rows] for name, values in extra.items()}
+
+    started = time.perf_counter()
+    try:
+        result = solve_portfolio_prices(
+            model.compiled, subset, constraints, extra["current_price"], extra["floor"], extra["ceiling"]
+        )
+    except ValueError as e:
+        # max_changes below the number of items that must move
+        raise HTTPException(status_code=422, detail=str(e))
+    stage_latency.observe(time.perf_counter() - started, "search")
+
+    started = time.perf_counter()
+    found = np.isfinite(result.profit)
+    for i in rows[~found]:
+        errors[int(i)] = NO_VALID_PRICE_ERROR
+    prices = np.full(size, np.nan)
+    profits = np.full(size, np.nan)
+    quantities = np.full(size, np.nan)
+    changed = np.full(size, -1, dtype=np.int8)
+    prices[rows] = np.where(found, result.price, np.nan)
+    profits[rows] = np.where(found, result.profit, np.nan)
+    quantities[rows] = np.where(found, result.qty, np.nan)
+    changed[rows] = np.where(found, result.changed, -1)
+
+    default = constraints.index_bounds.get("*", (None, None))
+    names, counts = np.unique(np.char.lower(subset.category[found].astype(str)), return_counts=True)
+    items = dict(zip(names.tolist(), counts.tolist()))
+    categories = {}
+    for k, name in enumerate(result.categories):
+        lower, upper = constraints.index_bounds.get(name, default)
+        categories[name] = {
+            "items": items.get(name, 0),
+            "price_index": json_array(result.category_index[k], 4),
+            "min_index": lower,
+            "max_index": upper,
+            "feasible": bool(result.feasible[k]),
+            "multiplier": json_array(result.multipliers[k], 6),
+        }
+    total = float(result.profit[found].sum())
+    meta = {
+        "count": size,
+        "categories": categories,
+        "summary": {
+            "total_profit": round(total, 2),
+            "unconstrained_profit": round(result.unconstrained_profit, 2),
+            "constraint_cost": round(result.unconstrained_profit - total, 2),
+            "changes": int(result.changed.sum()),
+            "max_changes": constraints.max_changes,
+        },
+        "errors": [{"index": i, "error": errors[i]} for i in sorted(errors)],
+    }
+    if binary:
+        columns = {
+            "optimal_price": np.round(prices, 2),
+            "max_profit": np.round(profits, 2),
+            "predicted_qty": np.round(quantities, 2),
+            "changed": changed,
+        }
+        response = Response(write_payload(columns, meta, binary), media_type=binary)
+    else:
+        response = JSONResponse({
+            "count": size,
+            "optimal_price": json_array(prices, 2),
+            "max_profit": json_array(profits, 2),
+            "predicted_qty": json_array(quantities, 2),
+            "changed": [None if flag < 0 else bool(flag) for flag in changed.tolist()],
+            **{key: meta[key] for key in ("categories", "summary", "errors")},
+        })
+    stage_latency.observe(time.perf_counter() - started, "serialization")
+    return response
+
+
+@app.post("/optimize_price/dynamic")
+async def optimize_price_dynamic(
+    input_data: DynamicPricingInput,
+    demand_model: str = Query("ridge"),
+):
+    """
+    Optimize a price path over several periods with limited inventory.
+
+    A dynamic program over (period, remaining inventory) finds the prices
+    that maximize total profit when stock is scarce: selling a unit now
+    gives up what it could earn later. The response carries the path
+    (price, expected demand, sales, stock and profit per period; null
+    prices once sold out), the single-period optimizer's path against the
+    same stock for comparison, and the value of one more unit of stock.
+    """
+    mark("handler_start")
+    horizon = len(input_data.periods)
+    if not 1 <= horizon <= MAX_HORIZON:
+        raise HTTPException(status_code=422, detail=f"A horizon must have between 1 and {MAX_HORIZON} periods.")
+    if not (math.isfinite(input_data.inventory) and input_data.inventory > 0):
+        raise HTTPException(status_code=422, detail="inventory must be a positive number of units.")
+    if not (math.isfinite(input_data.salvage_value) and math.isfinite(input_data.salvage_value * input_data.inventory)):
+        raise HTTPException(status_code=422, detail="salvage_value must be a finite amount per unit.")
+    if not 1 <= input_data.inventory_levels <= MAX_INVENTORY_LEVELS:
+        raise HTTPException(
+            status_code=422, detail=f"inventory_levels must be between 1 and {MAX_INVENTORY_LEVELS}."
+        )
+    demand = None if demand_model == "ridge" else find_demand_model(demand_model)
+    return await compute_pool.run(solve_dynamic, model_store.get(), demand, input_data)
+
+
+def solve_dynamic(model, demand, input_data: DynamicPricingInput) -> JSONResponse:
+    """Build the period inputs, solve the price path and encode it"""
+    base = input_data.base
+    values = {
+        field: [getattr(base, field) if getattr(period, field) is None else getattr(period, field)
+                for period in input_data.periods]
+        for field in PERIOD_FIELDS
+    }
+    periods = scenario_batch(base, values, len(input_data.periods))
+    predict = (demand or RidgeDemand(model.compiled)).predict
+
+    started = time.perf_counter()
+    try:
+        solved = solve_dynamic_path(
+            predict, periods, input_data.inventory, input_data.inventory_levels, input_data.salvage_value
+        )
+    except ValueError as e:
+        # A period without any valid price
+        raise HTTPException(status_code=422, detail=str(e))
+    stage_latency.observe(time.perf_counter() - started, "search")
+
+    started = time.perf_counter()
+
+    def encode(path) -> dict:
+        return {
+            "price": json_array(path.price, 2),
+            "predicted_qty": json_array(path.demand, 2),
+            "sales": json_array(path.sales, 2),
+            "inventory": json_array(path.inventory, 2),
+            "profit": json_array(path.profit, 2),
+            "total_profit": json_array(path.total_profit, 2),
+            "leftover": json_array(path.leftover, 2),
+        }
+
+    spacing = solved.levels[1]
+    response = JSONResponse({
+        "periods": periods.size,
+        "inventory": input_data.inventory,
+        "inventory_levels": input_data.inventory_levels,
+        "demand_model": "ridge" if demand is None else demand.name,
+        "model_version": model.version if demand is None else demand.version,
+        "path": encode(solved.path),
+        "myopic": encode(solved.myopic),
+        "uplift": json_array(solved.path.total_profit - solved.myopic.total_profit, 2),
+        "marginal_unit_value": json_array((solved.value[-1] - solved.value[-2]) / spacing, 4),
+    })
+    stage_latency.observe(time.perf_counter() - started, "serialization")
+    return response
+
+
+def stream_items(entries: list) -> tuple:
+    """
+    Inputs per SKU of a subscribe message, plus ``{sku: error}``.
+
+    A SKU that is a known product id starts from its stored features, so
+    only the missing fields (usually ``cogs``) have to be sent.
+    """
+    snapshot = feature_store.get() if feature_store.enabled else None
+    items, errors = {}, {}
+    for entry in entries:
+        if not isinstance(entry, dict) or not isinstance(entry.get("sku"), str):
+            errors[str(entry.get("sku") if isinstance(entry, dict) else entry)] = "sku: Field required"
+            continue
+        sku = entry["sku"]
+        fields = {}
+        if snapshot is not None:
+            row = int(snapshot.lookup([sku])[0])
+            if row >= 0:
+                for field, values in zip(ItemBatch._fields, snapshot.features):
+                    value = values[row]
+                    if field == "category" or not math.isnan(value):
+                        fields[field] = value if field == "category" else float(value)
+        fields.update({key: value for key, value in entry.items() if key in ItemBatch._fields})
+        try:
+            item = PriceOptimizationInput.model_validate(fields)
+        except ValidationError as e:
+            error = e.errors()[0]
+            errors[sku] = f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+            continue
+        items[sku] = [getattr(item, field) for field in ItemBatch._fields]
+    return items, errors
+
+
+def tick_fields(message: dict) -> dict:
+    """Competitor prices of a tick; ValueError unless each is a finite number"""
+    fields = {}
+    for field in TICK_FIELDS:
+        if field in message:
+            value = message[field]
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+                raise ValueError(f"{field}: Input should be a finite number")
+            fields[field] = float(value)
+    if not fields:
+        raise ValueError(f"A tick needs at least one of {', '.join(TICK_FIELDS)}")
+    return fields
+
+
+@app.websocket("/stream/prices")
+async def stream_prices(websocket: WebSocket):
+    """
+    Push optimal prices as competitor prices change.
+
+    Client messages (JSON):
+
+    - ``{"type": "subscribe", "items": [{"sku": ..., <PriceOptimizationInput fields>}]}``;
+      SKUs that are product ids may omit fields stored in the feature store
+    - ``{"type": "unsubscribe", "skus": [...]}`` (all SKUs when omitted)
+    - ``{"type": "tick", "sku": ..., "comp1": ..., "id": ...}`` with any of
+      comp1, comp2, comp3, or ``{"type": "ticks", "ticks": [...]}``
+
+    The server sends ``{"type": "prices", "prices": [...]}`` with the latest
+    optimum of every SKU whose optimum changed, echoing the ``id`` of the
+    newest tick it includes as ``tick_id``, and ``{"type": "error", ...}``
+    for rejected messages.
+    """
+    await websocket.accept()
+    subscriber = Subscriber(websocket.send_json)
+    pump = asyncio.create_task(subscriber.pump())
+    try:
+        while True:
+            try:
+                message = await websocket.receive_json()
+            except ValueError:
+                await websocket.send_json({"type": "error", "detail": "Messages must be JSON."})
+                continue
+            kind = message.get("type") if isinstance(message, dict) else None
+            if kind == "subscribe":
+                items, errors = stream_items(message.get("items") or [])
+                price_hub.subscribe(subscriber, items)
+                await websocket.send_json({"type": "subscribed", "skus": list(items), "errors": errors})
+            elif kind == "unsubscribe":
+                price_hub.unsubscribe(subscriber, message.get("skus"))
+            elif kind in ("tick", "ticks"):
+                ticks = (message.get("ticks") or []) if kind == "ticks" else [message]
+                for tick in ticks:
+                    sku = tick.get("sku") if isinstance(tick, dict) else None
+                    try:
+                        if not isinstance(sku, str):
+                            raise ValueError("sku: Field required")
+                        fields = tick_fields(tick)
+                    except ValueError as e:
+                        await websocket.send_json({"type": "error", "sku": sku, "detail": str(e)})
+                        continue
+                    if not price_hub.tick(sku, fields, tick.get("id")):
+                        await websocket.send_json({"type": "error", "sku": sku, "detail": "Not subscribed"})
+            else:
+                await websocket.send_json({"type": "error", "detail": f"Unknown message type {kind!r}"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        pump.cancel()
+        price_hub.unsubscribe(subscriber)
+
+
+@app.get("/stream")
+async def stream_stats():
+    """Live re-optimization statistics"""
+    return price_hub.stats()
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Request, stage, cache, compute pool and model metrics in Prometheus format"""
+    return Response(registry.render(), media_type=CONTENT_TYPE)
+
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="127.0.0.1", port=8000)
+    uvicorn.run(app, host="127.0.0.1", port=8001)
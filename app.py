@@ -1,6 +1,8 @@
 import streamlit as st
+import pandas as pd
 import requests
 import json
+import os
 from datetime import datetime
 
 # Page configuration
@@ -52,22 +54,69 @@ with col2:
 
 st.markdown("---")
 
-# API endpoint (updated to match running API on port 8001)
-API_URL = "http://127.0.0.1:8001/optimize_price"
+# API endpoint (the API listens on port 8001; override with API_URL)
+API_BASE = os.getenv("API_URL", "http://127.0.0.1:8001").rstrip("/")
+API_URL = f"{API_BASE}/optimize_price"
+
+# Points of the profit curve requested with each optimization
+CURVE_POINTS = 200
+
+
+@st.cache_resource
+def get_session() -> requests.Session:
+    """One pooled HTTP session shared by every rerun and browser session"""
+    return requests.Session()
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def fetch_api_info():
+    """API root info, re-checked at most every 30 seconds (None when unreachable)"""
+    try:
+        response = get_session().get(f"{API_BASE}/", timeout=2)
+        response.raise_for_status()
+        return response.json()
+    except requests.exceptions.RequestException:
+        return None
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def fetch_optimization(payload_items: tuple) -> dict:
+    """
+    Optimize one product, including its profit curve and demand line.
+
+    Cached per input set, so reruns and what-if changes reuse the answer;
+    failed requests raise and are not cached.
+    """
+    response = get_session().post(
+        API_URL,
+        params={"curve_points": CURVE_POINTS, "include_demand": "true"},
+        json=dict(payload_items),
+        timeout=10,
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def evaluate_price(demand: dict, price: float) -> tuple:
+    """Quantity and profit at ``price`` from the API's demand line"""
+    qty = max(demand["min_qty"], demand["intercept"] + demand["slope"] * price)
+    profit = (price * qty) - (demand["cogs"] * qty) - (demand["freight"] * qty)
+    return qty, profit
+
 
 # Sidebar for API status and info
 with st.sidebar:
     st.markdown("### 📊 API Information")
     
     # Check API status
-    try:
-        response = requests.get("http://127.0.0.1:8000/", timeout=2)
+    api_info = fetch_api_info()
+    if api_info is not None:
         st.success("✅ API Status: Connected")
-        api_info = response.json()
-        st.markdown(f"**Model R² Score:** {api_info.get('r_squared', 'N/A')}")
-    except:
+        r_squared = api_info.get('r_squared')
+        st.markdown(f"**Model R² Score:** {'N/A' if r_squared is None else r_squared}")
+    else:
         st.error("❌ API Status: Disconnected")
-        st.warning("Make sure the API server is running on http://127.0.0.1:8000")
+        st.warning(f"Make sure the API server is running on {API_BASE}")
     
     st.markdown("---")
     st.markdown("### 💡 How It Works")
@@ -215,136 +264,167 @@ with col_btn2:
         type="primary"
     )
 
-# Display results
+# Prepare request payload
+payload = {
+    "category": category,
+    "cogs": cogs,
+    "freight": freight,
+    "comp1": comp1,
+    "comp2": comp2,
+    "comp3": comp3,
+    "score": score,
+    "customers": customers
+}
+
 if optimize_button:
     with st.spinner("🔄 Analyzing demand patterns and market conditions..."):
         try:
-            # Prepare request payload
-            payload = {
-                "category": category,
-                "cogs": cogs,
-                "freight": freight,
-                "comp1": comp1,
-                "comp2": comp2,
-                "comp3": comp3,
-                "score": score,
-                "customers": customers
-            }
-            
-            # Make API request
-            response = requests.post(API_URL, json=payload, timeout=10)
-            
-            if response.status_code == 200:
-                result = response.json()
-                
-                # Check for error response from API
-                if 'error' in result:
-                    st.error(f"❌ API Error: {result['error']}")
-                else:
-                    try:
-                        # Display results in attractive format
-                        st.success("✅ Optimization Complete!")
-                        
-                        # Main results cards
-                        col_r1, col_r2, col_r3 = st.columns(3)
-                        
-                        with col_r1:
-                            st.markdown("""
-                            <div class="metric-card">
-                                <h3 style="color: #FF1493; margin-top: 0;">💰 Optimal Price</h3>
-                                <h2 style="color: #000; margin: 0;">${:.2f}</h2>
-                            </div>
-                            """.format(result['optimal_price']), unsafe_allow_html=True)
-                        
-                        with col_r2:
-                            st.markdown("""
-                            <div class="metric-card">
-                                <h3 style="color: #FF1493; margin-top: 0;">📈 Max Profit</h3>
-                                <h2 style="color: #000; margin: 0;">${:.2f}</h2>
-                            </div>
-                            """.format(result['max_profit']), unsafe_allow_html=True)
-                        
-                        with col_r3:
-                            st.markdown("""
-                            <div class="metric-card">
-                                <h3 style="color: #FF1493; margin-top: 0;">📦 Predicted Qty</h3>
-                                <h2 style="color: #000; margin: 0;">{:.2f} units</h2>
-                            </div>
-                            """.format(result['predicted_qty']), unsafe_allow_html=True)
-                        
-                        # Additional insights
-                        st.markdown("---")
-                        st.markdown("### 📊 Additional Insights")
-                        
-                        col_i1, col_i2, col_i3, col_i4 = st.columns(4)
-                        
-                        with col_i1:
-                            cost_base = cogs + freight
-                            markup = ((result['optimal_price'] - cost_base) / cost_base * 100) if cost_base > 0 else 0
-                            st.metric("Markup %", f"{markup:.1f}%")
-                        
-                        with col_i2:
-                            price_vs_avg = ((result['optimal_price'] / avg_comp) - 1) * 100
-                            st.metric("vs Avg Competitor", f"{price_vs_avg:+.1f}%")
-                        
-                        with col_i3:
-                            total_revenue = result['optimal_price'] * result['predicted_qty']
-                            st.metric("Total Revenue", f"${total_revenue:.2f}")
-                        
-                        with col_i4:
-                            profit_margin = (result['max_profit'] / total_revenue * 100) if total_revenue > 0 else 0
-                            st.metric("Profit Margin", f"{profit_margin:.1f}%")
-                        
-                        # Recommendation box
-                        st.markdown("---")
-                        st.markdown("""
-                        <div class="result-box">
-                            <h3>✨ Recommendation</h3>
-                            <p style="font-size: 1.1em;">
-                            Set your product price at <strong style="color: #FF1493; font-size: 1.3em;">${:.2f}</strong> 
-                            to maximize profit at <strong style="color: #FF1493;">${:.2f}</strong> with an estimated 
-                            demand of <strong>{:.2f} units</strong>.
-                            </p>
-                        </div>
-                        """.format(result['optimal_price'], result['max_profit'], result['predicted_qty']), 
-                        unsafe_allow_html=True)
-                    
-                    except Exception as e:
-                        st.error(f"❌ Error displaying results: {str(e)}")
-                
-                # Input summary
-                with st.expander("📝 Summary of Inputs"):
-                    summary = f"""
-                    **Product Details:**
-                    - Category: {category.capitalize()}
-                    - COGS: ${cogs:.2f}
-                    - Freight: ${freight:.2f}
-                    
-                    **Competitor Prices:**
-                    - Competitor 1: ${comp1:.2f}
-                    - Competitor 2: ${comp2:.2f}
-                    - Competitor 3: ${comp3:.2f}
-                    
-                    **Product Metrics:**
-                    - Rating: {score:.1f}/5.0
-                    - Customer Count: {customers}
-                    
-                    **Analysis Timestamp:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-                    """
-                    st.markdown(summary)
-            
-            else:
-                st.error(f"API Error: {response.status_code}")
-                st.error(f"Details: {response.text}")
+            # Cached per payload, so pressing again with the same inputs is free
+            st.session_state["optimization"] = (payload, fetch_optimization(tuple(sorted(payload.items()))))
+            st.session_state["analysis_time"] = datetime.now()
         
         except requests.exceptions.ConnectionError:
             st.error("❌ Cannot connect to API server")
-            st.error("Please ensure the API is running on http://127.0.0.1:8000")
-            st.info("Start the API with: `python api.py`")
+            st.error(f"Please ensure the API is running on {API_BASE}")
+            st.info("Start the API with: `python serve.py`")
+        
+        except requests.exceptions.HTTPError as e:
+            st.error(f"API Error: {e.response.status_code}")
+            st.error(f"Details: {e.response.text}")
         
         except Exception as e:
             st.error(f"❌ Error: {str(e)}")
 
+# Display results (kept across reruns until the inputs change)
+optimization = st.session_state.get("optimization")
+if optimization is not None and optimization[0] != payload:
+    st.info("Inputs changed — press **Optimize Price Now** to update the recommendation.")
+elif optimization is not None:
+    result = optimization[1]
+    
+    # Check for error response from API
+    if 'error' in result:
+        st.error(f"❌ API Error: {result['error']}")
+    else:
+        try:
+            # Display results in attractive format
+            st.success("✅ Optimization Complete!")
+            
+            # Main results cards
+            col_r1, col_r2, col_r3 = st.columns(3)
+            
+            with col_r1:
+                st.markdown("""
+                <div class="metric-card">
+                    <h3 style="color: #FF1493; margin-top: 0;">💰 Optimal Price</h3>
+                    <h2 style="color: #000; margin: 0;">${:.2f}</h2>
+                </div>
+                """.format(result['optimal_price']), unsafe_allow_html=True)
+            
+            with col_r2:
+                st.markdown("""
+                <div class="metric-card">
+                    <h3 style="color: #FF1493; margin-top: 0;">📈 Max Profit</h3>
+                    <h2 style="color: #000; margin: 0;">${:.2f}</h2>
+                </div>
+                """.format(result['max_profit']), unsafe_allow_html=True)
+            
+            with col_r3:
+                st.markdown("""
+                <div class="metric-card">
+                    <h3 style="color: #FF1493; margin-top: 0;">📦 Predicted Qty</h3>
+                    <h2 style="color: #000; margin: 0;">{:.2f} units</h2>
+                </div>
+                """.format(result['predicted_qty']), unsafe_allow_html=True)
+            
+            # Additional insights
+            st.markdown("---")
+            st.markdown("### 📊 Additional Insights")
+            
+            col_i1, col_i2, col_i3, col_i4 = st.columns(4)
+            
+            with col_i1:
+                cost_base = cogs + freight
+                markup = ((result['optimal_price'] - cost_base) / cost_base * 100) if cost_base > 0 else 0
+                st.metric("Markup %", f"{markup:.1f}%")
+            
+            with col_i2:
+                price_vs_avg = ((result['optimal_price'] / avg_comp) - 1) * 100
+                st.metric("vs Avg Competitor", f"{price_vs_avg:+.1f}%")
+            
+            with col_i3:
+                total_revenue = result['optimal_price'] * result['predicted_qty']
+                st.metric("Total Revenue", f"${total_revenue:.2f}")
+            
+            with col_i4:
+                profit_margin = (result['max_profit'] / total_revenue * 100) if total_revenue > 0 else 0
+                st.metric("Profit Margin", f"{profit_margin:.1f}%")
+            
+            # What-if analysis, evaluated locally from the returned curve and demand line
+            st.markdown("---")
+            st.markdown("### 🔍 What-If Pricing")
+            
+            demand = result['demand']
+            what_if_price = st.slider(
+                "Try a price ($)",
+                min_value=float(demand['min_price']),
+                max_value=float(demand['max_price']),
+                value=float(result['optimal_price']),
+                step=0.5,
+                help="Profit and demand at this price are computed in the dashboard, without calling the API"
+            )
+            what_if_qty, what_if_profit = evaluate_price(demand, what_if_price)
+            
+            col_w1, col_w2, col_w3 = st.columns(3)
+            with col_w1:
+                st.metric("Predicted Qty", f"{what_if_qty:.2f} units")
+            with col_w2:
+                st.metric("Profit", f"${what_if_profit:.2f}",
+                          delta=f"{what_if_profit - result['max_profit']:+.2f} vs optimal")
+            with col_w3:
+                st.metric("Revenue", f"${what_if_price * what_if_qty:.2f}")
+            
+            curve = pd.DataFrame(result['curve']).set_index('price')
+            st.line_chart(curve[['profit']], x_label="Price ($)", y_label="Profit ($)")
+            
+            # Recommendation box
+            st.markdown("---")
+            st.markdown("""
+            <div class="result-box">
+                <h3>✨ Recommendation</h3>
+                <p style="font-size: 1.1em;">
+                Set your product price at <strong style="color: #FF1493; font-size: 1.3em;">${:.2f}</strong> 
+                to maximize profit at <strong style="color: #FF1493;">${:.2f}</strong> with an estimated 
+                demand of <strong>{:.2f} units</strong>.
+                </p>
+            </div>
+            """.format(result['optimal_price'], result['max_profit'], result['predicted_qty']), 
+            unsafe_allow_html=True)
+        
+        except Exception as e:
+            st.error(f"❌ Error displaying results: {str(e)}")
+    
+    # Input summary
+    with st.expander("📝 Summary of Inputs"):
+        summary = f"""
+        **Product Details:**
+        - Category: {category.capitalize()}
+        - COGS: ${cogs:.2f}
+        - Freight: ${freight:.2f}
+        
+        **Competitor Prices:**
+        - Competitor 1: ${comp1:.2f}
+        - Competitor 2: ${comp2:.2f}
+        - Competitor 3: ${comp3:.2f}
+        
+        **Product Metrics:**
+        - Rating: {score:.1f}/5.0
+        - Customer Count: {customers}
+        
+        **Analysis Timestamp:** {st.session_state["analysis_time"].strftime('%Y-%m-%d %H:%M:%S')}
+        """
+        st.markdown(summary)
+
 # Footer
 st.markdown("---")
 st.markdown("""
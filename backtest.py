@@ -0,0 +1,238 @@
+"""
+Historical backtest of the price optimizer.
+
+Walks the sales history month by month. For every month the demand model
+is refitted on the months before it only, from the per-month sufficient
+statistics that train.py and tune.py use (merged incrementally, and cached
+like tune.py's), and then every product sold that month is evaluated in
+vectorized passes with that month's model:
+
+- forecast accuracy: demand predicted at the realized unit price against
+  the realized quantity (WAPE and bias);
+- profit: realized profit against the profit the model expected at the
+  realized price;
+- recommendation: the price ``optimize_price`` would have set and the
+  model's expected profit there, i.e. the uplift the optimizer claimed.
+
+The CSV has no cost of goods; unless it has a ``cogs`` column, cost is
+assumed to be ``--cogs-ratio`` of the realized unit price. Evaluation reads
+the file in chunks and only keeps per-month, per-category sums, so memory
+does not grow with the number of rows.
+
+    python backtest.py --min-train-months 6 --output-dir backtest_results
+"""
+from typing import Dict, Optional
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from engine import FEATURE_NAMES, MIN_QTY, CompiledModel, ItemBatch, compile_model, linear_demand, optimize
+from train import (
+    CATEGORY_COLUMN, DATE_COLUMN, DEFAULT_DATA_PATH, RAW_DTYPES, TARGET, Moments, RidgeFit, TrainingStats,
+    fit_ridge, month_index,
+)
+from tune import DEFAULT_CACHE_DIR, cached_stats
+
+DEFAULT_OUTPUT_DIR = "backtest_results"
+COST_COLUMN = 'cogs'
+
+# Source columns of the engine inputs
+INPUT_COLUMNS = {
+    'freight': 'freight_price',
+    'comp1': 'comp_1',
+    'comp2': 'comp_2',
+    'comp3': 'comp_3',
+    'score': 'product_score',
+    'customers': 'customers',
+}
+
+# Per-row figures summed per month and category
+SUM_COLUMNS = (
+    'rows', 'solved', 'qty', 'predicted_qty', 'abs_qty_error', 'revenue', 'profit', 'predicted_profit',
+    'price', 'recommended_price', 'recommended_profit', 'raised',
+)
+
+
+def compiled_fit(fit: RidgeFit, stats: TrainingStats, version: str = '') -> CompiledModel:
+    """Serving form of a Ridge fit on the serving feature set (like train.write_model + activate)"""
+    n_features = len(FEATURE_NAMES)
+    if stats.columns[:n_features] != tuple(FEATURE_NAMES) or stats.scaled[n_features:].any():
+        raise ValueError("Backtests need the serving feature set with unscaled category dummies")
+    coefficients = {'intercept': fit.intercept}
+    scaler_params = {}
+    for k, name in enumerate(FEATURE_NAMES):
+        coefficients[name] = fit.coefficients[k]
+        scaler_params[name] = {'mean': fit.means[k], 'std': fit.scales[k]}
+    for name, coef in zip(stats.categories, [0.0, *fit.coefficients[n_features:]]):
+        coefficients[f'cat_{name}'] = coef
+    return compile_model(coefficients, scaler_params, version)
+
+
+def monthly_models(stats: TrainingStats, alpha: float = 20.0, min_train_months: int = 6,
+                   window: Optional[int] = None) -> Dict[np.datetime64, CompiledModel]:
+    """
+    Model for every month that has ``min_train_months`` months before it.
+
+    Each is fitted on all earlier months (or the last ``window`` of them),
+    adding one month's statistics per step.
+    """
+    months = list(stats.months)
+    size = len(stats.columns)
+    models = {}
+    running = Moments(size)
+    for k, month in enumerate(months):
+        if k >= min_train_months:
+            if window is None:
+                moments = running
+            else:
+                moments = Moments.combine([stats.months[m] for m in months[max(0, k - window):k]], size)
+            fit = fit_ridge(moments, alpha, stats.scaled)
+            models[month] = compiled_fit(fit, stats, f"backtest-{month}")
+        running.merge(stats.months[month])
+    return models
+
+
+def evaluate(model: CompiledModel, batch: ItemBatch, price: np.ndarray, qty: np.ndarray,
+             solver: str = 'exact') -> dict:
+    """Per-row figures of one month's rows (see SUM_COLUMNS)"""
+    intercept, slope = linear_demand(model, batch)
+    predicted_qty = np.maximum(MIN_QTY, intercept + slope * price)
+    unit_cost = batch.cogs + batch.freight
+    result = optimize(model, batch, solver)
+    solved = np.isfinite(result.max_profit)
+    return {
+        'rows': np.ones(batch.size),
+        'solved': solved.astype(float),
+        'qty': qty,
+        'predicted_qty': predicted_qty,
+        'abs_qty_error': np.abs(predicted_qty - qty),
+        'revenue': price * qty,
+        'profit': (price - unit_cost) * qty,
+        'predicted_profit': (price - unit_cost) * predicted_qty,
+        'price': price,
+        # Rows without a valid price keep their realized price and profit
+        'recommended_price': np.where(solved, result.optimal_price, price),
+        'recommended_profit': np.where(solved, result.max_profit, (price - unit_cost) * predicted_qty),
+        'raised': (solved & (result.optimal_price > price)).astype(float),
+    }
+
+
+def read_history(path: str, chunksize: int):
+    """Chunks of the columns a backtest needs (``cogs`` only if the file has it)"""
+    header = pd.read_csv(path, nrows=0).columns
+    columns = [CATEGORY_COLUMN, DATE_COLUMN, TARGET, 'unit_price', *INPUT_COLUMNS.values()]
+    dtypes = {name: RAW_DTYPES[name] for name in columns}
+    if COST_COLUMN in header:
+        columns.append(COST_COLUMN)
+        dtypes[COST_COLUMN] = 'float64'
+    return pd.read_csv(path, usecols=columns, dtype=dtypes, chunksize=chunksize)
+
+
+def backtest(path: str, models: Dict[np.datetime64, CompiledModel], cogs_ratio: float = 0.5,
+             solver: str = 'exact', chunksize: int = 200_000) -> tuple:
+    """
+    Evaluate every row of a month that has a model.
+
+    Returns ``(sums, skipped)``: a frame of SUM_COLUMNS per month and
+    category, and the number of rows left out for missing inputs.
+    """
+    parts = []
+    skipped = 0
+    for chunk in read_history(path, chunksize):
+        month = month_index(chunk)
+        price = chunk['unit_price'].to_numpy(np.float64)
+        qty = chunk[TARGET].to_numpy(np.float64)
+        inputs = {field: chunk[column].to_numpy(np.float64) for field, column in INPUT_COLUMNS.items()}
+        if COST_COLUMN in chunk:
+            cogs = chunk[COST_COLUMN].to_numpy(np.float64)
+            cogs = np.where(np.isnan(cogs), price * cogs_ratio, cogs)
+        else:
+            cogs = price * cogs_ratio
+        category = chunk[CATEGORY_COLUMN].astype(str).to_numpy(dtype=object)
+        complete = ~np.isnan(np.column_stack([price, qty, cogs, *inputs.values()])).any(axis=1)
+        complete &= chunk[CATEGORY_COLUMN].notna().to_numpy()
+        skipped += int((~complete).sum())
+        wanted = complete & np.isin(month, np.array(list(models), dtype='datetime64[M]'))
+
+        rows = np.flatnonzero(wanted)
+        rows = rows[np.argsort(month[rows], kind='stable')]
+        keys, starts = np.unique(month[rows], return_index=True)
+        for key, group in zip(keys, np.split(rows, starts[1:])):
+            batch = ItemBatch(category[group], cogs[group], *(values[group] for values in inputs.values()))
+            figures = evaluate(models[key], batch, price[group], qty[group], solver)
+            frame = pd.DataFrame({'month': str(key), 'category': category[group], **figures})
+            parts.append(frame.groupby(['month', 'category'], sort=False).sum())
+    if not parts:
+        return pd.DataFrame(columns=SUM_COLUMNS), skipped
+    return pd.concat(parts).groupby(level=['month', 'category']).sum(), skipped
+
+
+def summary(sums: pd.DataFrame, by: Optional[str] = None) -> pd.DataFrame:
+    """
+    Backtest figures per ``by`` level ('month' or 'category'; None = total).
+
+    WAPE is the summed absolute quantity error over the realized quantity;
+    the bias and profit columns compare totals, and ``claimed_uplift`` is
+    the model's expected profit at the recommended prices over its
+    expectation at the realized ones.
+    """
+    grouped = sums.groupby(level=by).sum() if by else sums.sum().to_frame('total').T
+    table = pd.DataFrame(index=grouped.index)
+    table['rows'] = grouped['rows'].astype(int)
+    table['qty'] = grouped['qty']
+    table['predicted_qty'] = grouped['predicted_qty']
+    table['wape'] = grouped['abs_qty_error'] / grouped['qty']
+    table['qty_bias'] = grouped['predicted_qty'] / grouped['qty'] - 1
+    table['profit'] = grouped['profit']
+    table['predicted_profit'] = grouped['predicted_profit']
+    table['profit_error'] = grouped['predicted_profit'] / grouped['profit'] - 1
+    table['recommended_profit'] = grouped['recommended_profit']
+    table['claimed_uplift'] = grouped['recommended_profit'] / grouped['predicted_profit'].abs() - 1
+    table['price_change'] = grouped['recommended_price'] / grouped['price'] - 1
+    table['raised_share'] = grouped['raised'] / grouped['solved']
+    table['unsolved'] = (grouped['rows'] - grouped['solved']).astype(int)
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest the price optimizer month by month")
+    parser.add_argument("--data", default=DEFAULT_DATA_PATH)
+    parser.add_argument("--alpha", type=float, default=20.0)
+    parser.add_argument("--min-train-months", type=int, default=6, help="months before the first backtested one")
+    parser.add_argument("--window", type=int, help="train on only this many preceding months (default: all)")
+    parser.add_argument("--cogs-ratio", type=float, default=0.5,
+                        help="cost as a share of the realized unit price, for rows without cogs")
+    parser.add_argument("--solver", choices=("grid", "exact"), default="exact")
+    parser.add_argument("--chunksize", type=int, default=200_000, help="CSV rows per chunk")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="where collected statistics are cached")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR,
+                        help="where months.csv, categories.csv and total.csv are written")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    stats = cached_stats(args.data, args.cache_dir, features=FEATURE_NAMES)
+    models = monthly_models(stats, args.alpha, args.min_train_months, args.window)
+    if not models:
+        parser.error(f"{len(stats.months)} months of data leave none to backtest after "
+                     f"{args.min_train_months} training months")
+    fitted = time.perf_counter()
+    sums, skipped = backtest(args.data, models, args.cogs_ratio, args.solver, args.chunksize)
+    done = time.perf_counter()
+
+    tables = {"months": summary(sums, "month"), "categories": summary(sums, "category"), "total": summary(sums)}
+    with pd.option_context("display.width", 200, "display.max_columns", None, "display.float_format", "{:.4f}".format):
+        print(tables["months"].drop(columns=["qty", "predicted_qty"]))
+        print()
+        print(tables["total"].drop(columns=["qty", "predicted_qty"]))
+    os.makedirs(args.output_dir, exist_ok=True)
+    for name, table in tables.items():
+        table.to_csv(os.path.join(args.output_dir, f"{name}.csv"))
+    print(f"\n{int(sums['rows'].sum())} rows in {len(models)} months ({skipped} incomplete rows skipped); "
+          f"models {fitted - start:.2f}s, evaluation {done - fitted:.2f}s; tables in {args.output_dir}/")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,495 @@
+"""
+Load-testing and latency benchmark for the price optimization API.
+
+Request mixes are sampled from retail_price.csv (per category, with jitter),
+so they look like real traffic; synthetic catalogs of any size are generated
+from the same distributions. Targets:
+
+    python bench.py run                           # in-process ASGI app
+    python bench.py run --target engine           # engine only, no HTTP
+    python bench.py run --target http://127.0.0.1:8001 --concurrency 32
+    python bench.py catalog --rows 1000000 --out catalog.csv
+    python bench.py smoke                         # one request, readable output
+    python bench.py feed --rate 2000              # competitor ticks over WebSocket /stream/prices
+
+Each run reports p50/p95/p99 latency, requests/sec and per-item cost for the
+single, cached and batch paths and can be saved and compared against an
+earlier run to catch regressions. ``feed`` simulates a competitor price
+feed (random walks with bursts) against the streaming endpoint and reports
+the time from each tick to the push of a price reflecting it.
+"""
+from datetime import datetime
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATA = os.path.join(HERE, "retail_price.csv")
+RESULTS_DIR = os.path.join(HERE, "bench_results")
+
+# Columns sampled from retail_price.csv and the request field each feeds
+PROFILE_COLUMNS = {
+    "comp_1": "comp1",
+    "comp_2": "comp2",
+    "comp_3": "comp3",
+    "product_score": "score",
+    "customers": "customers",
+    "freight_price": "freight",
+}
+
+# The data has no cost of goods; it is drawn as this share of unit_price
+COGS_SHARE = (0.3, 0.6)
+
+SCENARIOS = ("single", "cached", "batch")
+
+
+def load_profile(path: str = DEFAULT_DATA) -> dict:
+    """Empirical rows of retail_price.csv as arrays, used as sampling pool"""
+    import pandas as pd
+
+    columns = ["product_category_name", "unit_price", *PROFILE_COLUMNS]
+    df = pd.read_csv(path, usecols=columns)
+    profile = {column: df[column].to_numpy(dtype=float) for column in columns[1:]}
+    profile["product_category_name"] = df["product_category_name"].to_numpy(dtype=str)
+    return profile
+
+
+def sample_requests(profile: dict, n: int, seed: int = 0, jitter: float = 0.05) -> dict:
+    """
+    Draw ``n`` request inputs as columns.
+
+    Rows are resampled from the profile and every numeric field gets a
+    multiplicative jitter, so categories and price levels stay correlated
+    the way they are in the data.
+    """
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, profile["unit_price"].size, n)
+    noise = lambda: rng.uniform(1 - jitter, 1 + jitter, n)
+
+    columns = {"category": profile["product_category_name"][rows]}
+    for source, field in PROFILE_COLUMNS.items():
+        columns[field] = profile[source][rows] * noise()
+    columns["score"] = np.clip(columns["score"], 1.0, 5.0)
+    columns["cogs"] = profile["unit_price"][rows] * rng.uniform(*COGS_SHARE, n)
+    return columns
+
+
+def column_slice(columns: dict, start: int, stop: int) -> dict:
+    """JSON-ready columnar payload for rows ``start:stop``"""
+    return {field: values[start:stop].tolist() for field, values in columns.items()}
+
+
+def row_payload(columns: dict, i: int) -> dict:
+    """JSON-ready single request for row ``i``"""
+    return {field: values[i].item() for field, values in columns.items()}
+
+
+def write_catalog(path: str, rows: int, profile: dict, seed: int = 0, chunk_size: int = 250_000):
+    """Write a synthetic product snapshot in the retail_price.csv layout"""
+    import pandas as pd
+
+    month = datetime.now().strftime("01/%m/%Y")
+    for start in range(0, rows, chunk_size):
+        n = min(chunk_size, rows - start)
+        columns = sample_requests(profile, n, seed + start)
+        pd.DataFrame({
+            "product_id": [f"sku{start + i}" for i in range(n)],
+            "product_category_name": columns["category"],
+            "month_year": month,
+            "freight_price": columns["freight"].round(2),
+            "unit_price": (columns["cogs"] * 2).round(2),
+            "product_score": columns["score"].round(1),
+            "customers": columns["customers"].round(0),
+            "comp_1": columns["comp1"].round(2),
+            "comp_2": columns["comp2"].round(2),
+            "comp_3": columns["comp3"].round(2),
+            "cogs": columns["cogs"].round(2),
+        }).to_csv(path, mode="w" if start == 0 else "a", header=start == 0, index=False)
+
+
+def summarize(latencies, elapsed: float, items_per_request: int, failures: int) -> dict:
+    """Latency percentiles (ms), throughput and per-item cost (us)"""
+    latencies = np.asarray(latencies) * 1000
+    requests = latencies.size
+    return {
+        "requests": requests,
+        "failures": failures,
+        "items_per_request": items_per_request,
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+        "mean_ms": round(float(latencies.mean()), 3),
+        "requests_per_sec": round(requests / elapsed, 1),
+        "items_per_sec": round(requests * items_per_request / elapsed, 1),
+        "us_per_item": round(elapsed * 1e6 / (requests * items_per_request), 2),
+    }
+
+
+async def drive(client, payloads, concurrency: int) -> tuple:
+    """Send ``(path, body)`` payloads with ``concurrency`` closed-loop workers"""
+    latencies = []
+    failures = 0
+    queue = iter(payloads)
+
+    async def worker():
+        nonlocal failures
+        for path, body in queue:
+            start = time.perf_counter()
+            response = await client.post(path, json=body)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200 or "error" in response.json():
+                failures += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - start, failures
+
+
+def scenario_payloads(columns: dict, scenario: str, requests: int, batch_size: int, solver: str) -> list:
+    """Request list for a scenario (cached replays a small pool of inputs)"""
+    query = f"?solver={solver}"
+    if scenario == "single":
+        return [("/optimize_price" + query, row_payload(columns, i)) for i in range(requests)]
+    if scenario == "cached":
+        pool = max(1, requests // 50)
+        return [("/optimize_price" + query, row_payload(columns, i % pool)) for i in range(requests)]
+    return [
+        ("/optimize_price/batch" + query, {"columns": column_slice(columns, i * batch_size, (i + 1) * batch_size)})
+        for i in range(requests)
+    ]
+
+
+async def run_http(target: str, columns: dict, args) -> dict:
+    """Benchmark the API in-process (ASGI) or over HTTP"""
+    import httpx
+
+    if target == "asgi":
+        from api import app
+        transport = httpx.ASGITransport(app=app)
+        client = httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120)
+    else:
+        limits = httpx.Limits(max_connections=args.concurrency)
+        client = httpx.AsyncClient(base_url=target, timeout=120, limits=limits)
+
+    results = {}
+    async with client:
+        for scenario in args.scenarios:
+            batch_size = args.batch_size if scenario == "batch" else 1
+            count = max(1, args.requests // batch_size) if scenario == "batch" else args.requests
+            payloads = scenario_payloads(columns, scenario, count, batch_size, args.solver)
+            # Warm up connections and the code path before measuring
+            await drive(client, payloads[:args.concurrency], args.concurrency)
+            if scenario != "cached":
+                await client.delete("/cache")
+            latencies, elapsed, failures = await drive(client, payloads, args.concurrency)
+            results[scenario] = summarize(latencies, elapsed, batch_size, failures)
+    return results
+
+
+def run_engine(columns: dict, args) -> dict:
+    """Benchmark the pricing engine directly, without HTTP or validation"""
+    from api import model_store
+    from engine import ItemBatch, NUMERIC_FIELDS, optimize
+
+    model = model_store.get().compiled
+    batch = ItemBatch(columns["category"].astype(object), *(columns[field] for field in NUMERIC_FIELDS))
+
+    results = {}
+    for scenario in args.scenarios:
+        if scenario == "cached":
+            continue  # the cache lives in the API layer
+        size = args.batch_size if scenario == "batch" else 1
+        count = max(1, args.requests // size) if scenario == "batch" else args.requests
+        latencies = []
+        start = time.perf_counter()
+        for i in range(count):
+            lo = (i * size) % batch.size
+            part = ItemBatch(*(values[lo:lo + size] for values in batch))
+            t0 = time.perf_counter()
+            optimize(model, part, args.solver)
+            latencies.append(time.perf_counter() - t0)
+        results[scenario] = summarize(latencies, time.perf_counter() - start, size, 0)
+    return results
+
+
+def environment() -> dict:
+    """Machine and code identity saved with each result"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True, text=True
+        ).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "cpus": os.cpu_count(),
+        "platform": platform.platform(),
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> bool:
+    """Print p50/p99/throughput deltas; return True if anything regressed"""
+    regressed = False
+    print(f"\n{'scenario':<10}{'metric':<18}{'baseline':>12}{'current':>12}{'change':>10}")
+    for scenario, stats in current["results"].items():
+        before = baseline["results"].get(scenario)
+        if not before:
+            continue
+        for metric, higher_is_better in (("p50_ms", False), ("p99_ms", False), ("items_per_sec", True)):
+            old, new = before[metric], stats[metric]
+            change = (new - old) / old if old else 0.0
+            worse = -change if higher_is_better else change
+            flag = "  REGRESSED" if worse > threshold else ""
+            regressed |= bool(flag)
+            print(f"{scenario:<10}{metric:<18}{old:>12.3f}{new:>12.3f}{change:>+10.1%}{flag}")
+    return regressed
+
+
+def print_results(results: dict):
+    print(f"\n{'scenario':<10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>11}{'items/s':>12}{'us/item':>10}")
+    for scenario, stats in results.items():
+        print(
+            f"{scenario:<10}{stats['p50_ms']:>10.3f}{stats['p95_ms']:>10.3f}{stats['p99_ms']:>10.3f}"
+            f"{stats['requests_per_sec']:>11.1f}{stats['items_per_sec']:>12.1f}{stats['us_per_item']:>10.2f}"
+        )
+
+
+def command_run(args):
+    profile = load_profile(args.data)
+    needed = max(args.requests, args.batch_size * max(1, args.requests // args.batch_size))
+    columns = sample_requests(profile, needed, args.seed)
+
+    if args.target == "engine":
+        results = run_engine(columns, args)
+    else:
+        results = asyncio.run(run_http(args.target, columns, args))
+    print_results(results)
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "target": args.target,
+        "settings": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "batch_size": args.batch_size,
+            "solver": args.solver,
+            "seed": args.seed,
+        },
+        "environment": environment(),
+        "results": results,
+    }
+    if args.save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}.json")
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved results to {path}")
+    if args.compare:
+        with open(args.compare) as f:
+            if compare(report, json.load(f), args.threshold):
+                sys.exit(1)
+
+
+def command_catalog(args):
+    write_catalog(args.out, args.rows, load_profile(args.data), args.seed)
+    print(f"Wrote {args.rows} synthetic products to {args.out}")
+
+
+def command_smoke(args):
+    """Send the example request and print the result (old test_api.py)"""
+    import requests
+
+    test_data = {
+        "category": "bed_bath_table",
+        "cogs": 45.0,
+        "freight": 15.0,
+        "comp1": 120.0,
+        "comp2": 150.0,
+        "comp3": 100.0,
+        "score": 4.2,
+        "customers": 50
+    }
+    try:
+        response = requests.post(f"{args.url}/optimize_price", json=test_data, timeout=10)
+    except requests.exceptions.ConnectionError:
+        print("Error: Could not connect to the API.")
+        print(f"Make sure the API server is running on {args.url}")
+        sys.exit(1)
+
+    if response.status_code != 200:
+        print(f"Error: API returned status code {response.status_code}")
+        print(f"Response: {response.text}")
+        sys.exit(1)
+
+    result = response.json()
+    print("\n" + "=" * 50)
+    print("FASHIONISTA PRICE OPTIMIZATION RESULTS")
+    print("=" * 50)
+    print(f"Optimal Price:    ${result['optimal_price']:.2f}")
+    print(f"Max Profit:       ${result['max_profit']:.2f}")
+    print(f"Predicted Qty:    {result['predicted_qty']:.2f} units")
+    print("=" * 50 + "\n")
+
+
+def start_local_server() -> tuple:
+    """Serve the API from a background thread on a free port; returns ``(url, server)``"""
+    import uvicorn
+
+    from api import app
+
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(app, log_level="warning"))
+    threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return f"ws://127.0.0.1:{sock.getsockname()[1]}/stream/prices", server
+
+
+async def run_feed(url: str, columns: dict, args) -> dict:
+    """
+    Subscribe to ``args.skus`` SKUs and send random-walk competitor ticks.
+
+    Ticks go out at ``args.rate`` per second; every ``args.burst_every``
+    ticks one SKU gets ``args.burst`` ticks back to back. A tick's latency
+    ends with the first push whose ``tick_id`` is at least its own.
+    """
+    import websockets
+
+    rng = np.random.default_rng(args.seed)
+    skus = [f"sku-{i}" for i in range(args.skus)]
+    comps = np.stack([columns[field][:args.skus] for field in ("comp1", "comp2", "comp3")], axis=1)
+    sent, pending, latencies = {}, {sku: [] for sku in skus}, []
+    done = asyncio.Event()
+
+    async with websockets.connect(url, max_size=None) as ws:
+        items = [{"sku": sku, **row_payload(columns, i)} for i, sku in enumerate(skus)]
+        await ws.send(json.dumps({"type": "subscribe", "items": items}))
+        initial = 0
+        while initial < args.skus:
+            message = json.loads(await ws.recv())
+            if message["type"] == "prices":
+                initial += len(message["prices"])
+
+        async def receive():
+            async for raw in ws:
+                now = time.perf_counter()
+                message = json.loads(raw)
+                for price in message.get("prices", ()):
+                    tick_id, waiting = price["tick_id"], pending[price["sku"]]
+                    if tick_id is None:
+                        continue
+                    while waiting and waiting[0] <= tick_id:
+                        latencies.append(now - sent.pop(waiting.pop(0)))
+                if not sent and done.is_set():
+                    return
+
+        receiver = asyncio.create_task(receive())
+        start = time.perf_counter()
+        tick_id = 0
+        while tick_id < args.ticks:
+            k = int(rng.integers(args.skus))
+            count = args.burst if args.burst_every and tick_id % args.burst_every == 0 else 1
+            batch = []
+            for _ in range(min(count, args.ticks - tick_id)):
+                comps[k] *= np.exp(rng.normal(0, 0.01, 3))
+                batch.append({"sku": skus[k], "id": tick_id, "comp1": round(float(comps[k, 0]), 2),
+                              "comp2": round(float(comps[k, 1]), 2), "comp3": round(float(comps[k, 2]), 2)})
+                sent[tick_id] = time.perf_counter()
+                pending[skus[k]].append(tick_id)
+                tick_id += 1
+            await ws.send(json.dumps({"type": "ticks", "ticks": batch}))
+            delay = start + tick_id / args.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        elapsed = time.perf_counter() - start
+        done.set()
+        try:
+            await asyncio.wait_for(receiver, timeout=2)
+        except asyncio.TimeoutError:
+            receiver.cancel()
+
+    stats = summarize(latencies, elapsed, 1, len(sent)) if latencies else {"requests": 0, "failures": len(sent)}
+    return {"ticks": args.ticks, "ticks_per_sec": round(args.ticks / elapsed, 1),
+            "pushed": len(latencies), "unanswered": len(sent), **stats}
+
+
+def command_feed(args):
+    columns = sample_requests(load_profile(args.data), args.skus, args.seed)
+    server = None
+    url = args.target
+    if url == "local":
+        url, server = start_local_server()
+    try:
+        results = asyncio.run(run_feed(url, columns, args))
+    finally:
+        if server is not None:
+            from api import price_hub
+
+            print(f"Server: {price_hub.stats()}")
+            server.should_exit = True
+    print(f"\n{'ticks':>8}{'ticks/s':>10}{'pushed':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    print(f"{results['ticks']:>8}{results['ticks_per_sec']:>10.1f}{results['pushed']:>9}"
+          f"{results.get('p50_ms', float('nan')):>10.3f}{results.get('p95_ms', float('nan')):>10.3f}"
+          f"{results.get('p99_ms', float('nan')):>10.3f}")
+    if results["unanswered"]:
+        print(f"{results['unanswered']} ticks got no push (their SKU's optimum did not change)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Fashionista price optimization API")
+    parser.add_argument("--data", default=DEFAULT_DATA, help="CSV to sample request distributions from")
+    parser.add_argument("--seed", type=int, default=0)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="measure latency and throughput")
+    run.add_argument("--target", default="asgi",
+                     help="'asgi' (in-process app), 'engine' (no HTTP) or a base URL")
+    run.add_argument("--scenarios", type=lambda value: value.split(","), default=list(SCENARIOS),
+                     help="comma-separated subset of: " + ", ".join(SCENARIOS))
+    run.add_argument("--requests", type=int, default=2000, help="requests (items for batch) per scenario")
+    run.add_argument("--concurrency", type=int, default=16)
+    run.add_argument("--batch-size", type=int, default=500)
+    run.add_argument("--solver", choices=("grid", "exact"), default="grid")
+    run.add_argument("--save", action="store_true", help=f"write results to {RESULTS_DIR}")
+    run.add_argument("--compare", metavar="RESULT_JSON", help="compare with a saved run")
+    run.add_argument("--threshold", type=float, default=0.10,
+                     help="relative slowdown reported as a regression (exit code 1)")
+    run.set_defaults(func=command_run)
+
+    catalog = commands.add_parser("catalog", help="write a synthetic product snapshot CSV")
+    catalog.add_argument("--rows", type=int, default=1_000_000)
+    catalog.add_argument("--out", default="synthetic_catalog.csv")
+    catalog.set_defaults(func=command_catalog)
+
+    smoke = commands.add_parser("smoke", help="send one example request")
+    smoke.add_argument("--url", default="http://127.0.0.1:8001")
+    smoke.set_defaults(func=command_smoke)
+
+    feed = commands.add_parser("feed", help="simulate a competitor price feed over WebSocket")
+    feed.add_argument("--target", default="local",
+                      help="'local' (server in a background thread) or a ws:// URL of /stream/prices")
+    feed.add_argument("--skus", type=int, default=1000, help="SKUs subscribed to")
+    feed.add_argument("--ticks", type=int, default=20000)
+    feed.add_argument("--rate", type=float, default=2000, help="ticks per second")
+    feed.add_argument("--burst", type=int, default=20, help="ticks in one burst for a single SKU")
+    feed.add_argument("--burst-every", type=int, default=500, help="ticks between bursts (0 disables them)")
+    feed.set_defaults(func=command_feed)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
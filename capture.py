@@ -0,0 +1,190 @@
+"""
+Request capture for replaying real traffic.
+
+With capture enabled, the API hands every ``POST /optimize_price`` request,
+its response, the model version and its timing to ``CaptureWriter.record``,
+which only appends to a bounded in-memory queue: it never blocks and never
+does I/O on the request path. A background thread serializes the records
+as JSON lines into files in the capture directory, optionally gzip
+compressed, starting a new file once one reaches ``max_bytes``. When the
+queue is full (the disk cannot keep up), records are dropped and counted
+rather than slowing requests down.
+
+Each line holds ``ts`` (Unix time), ``endpoint``, ``query``, ``request``,
+``response``, ``status``, ``model_version`` and ``duration_ms``.
+replay.py feeds the files back to an API and diffs the responses.
+"""
+from datetime import datetime, timezone
+from typing import Iterator, Optional
+import glob
+import gzip
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Seconds between flushes of the current file while traffic is light
+FLUSH_INTERVAL = 1.0
+
+
+class CaptureWriter:
+    """
+    Buffered, rotating JSONL writer fed from request handlers.
+
+    ``record`` is thread-safe and cheap: the fields are queued as they are
+    and turned into JSON on the writer thread.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 64 << 20, compress: bool = False,
+                 queue_size: int = 100_000):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._file = None
+        self._raw = None
+        self._written = 0
+        self.path = None
+        self.records = 0
+        self.dropped = 0
+        self.files = 0
+
+    def start(self):
+        """Start the writer thread"""
+        if self._thread is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="capture-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Write everything queued so far, close the file and stop the thread"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def record(self, endpoint: str, query: dict, request, response, status: int,
+               model_version: str, duration: float):
+        """Queue one exchange; ``request`` may be a pydantic model"""
+        try:
+            self._queue.put_nowait((time.time(), endpoint, query, request, response, status, model_version, duration))
+        except queue.Full:
+            self.dropped += 1
+
+    def stats(self) -> dict:
+        return {
+            "directory": self.directory,
+            "file": self.path,
+            "files": self.files,
+            "records": self.records,
+            "queued": self._queue.qsize(),
+            "dropped": self.dropped,
+        }
+
+    def _open(self):
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+        suffix = ".jsonl.gz" if self.compress else ".jsonl"
+        self.path = os.path.join(self.directory, f"capture-{stamp}-{os.getpid()}-{self.files:04d}{suffix}")
+        raw = open(self.path, "wb")
+        self._file = gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=5) if self.compress else raw
+        self._raw = raw
+        self._written = 0
+        self.files += 1
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            if self.compress:
+                self._raw.close()
+            self._file = None
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                entry = self._queue.get(timeout=FLUSH_INTERVAL)
+            except queue.Empty:
+                entry = ()
+            lines = []
+            # Drain whatever else is waiting and write it in one go
+            while entry is not None:
+                if entry:
+                    lines.append(self._line(entry))
+                try:
+                    entry = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if lines:
+                self._write(b"".join(lines))
+            now = time.monotonic()
+            if self._file is not None and (entry is None or now - last_flush >= FLUSH_INTERVAL):
+                self._file.flush()
+                last_flush = now
+            if entry is None:
+                self._close()
+                return
+
+    def _line(self, entry) -> bytes:
+        ts, endpoint, query, request, response, status, model_version, duration = entry
+        if hasattr(request, "model_dump"):
+            request = request.model_dump()
+        elif hasattr(request, "__dict__"):
+            request = dict(vars(request))
+        return (json.dumps({
+            "ts": round(ts, 6),
+            "endpoint": endpoint,
+            "query": query,
+            "request": request,
+            "response": response,
+            "status": status,
+            "model_version": model_version,
+            "duration_ms": round(duration * 1000, 3),
+        }, separators=(",", ":")) + "\n").encode()
+
+    def _write(self, data: bytes):
+        try:
+            if self._file is None or self._written >= self.max_bytes:
+                self._close()
+                self._open()
+            self._file.write(data)
+            # Uncompressed size; compressed files therefore stay below max_bytes
+            self._written += len(data)
+            self.records += data.count(b"\n")
+        except OSError:
+            logger.exception("Failed to write captured requests to %s", self.directory)
+
+
+def capture_files(paths) -> list:
+    """Capture files named by ``paths`` (files, directories or glob patterns), oldest first"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(glob.glob(os.path.join(path, "capture-*.jsonl*")))
+        else:
+            files.extend(glob.glob(path) or [path])
+    return sorted(set(files), key=lambda name: (os.path.basename(name), name))
+
+
+def read_records(paths, endpoint: Optional[str] = None) -> Iterator[dict]:
+    """Records of the capture files in ``paths``, optionally only those of ``endpoint``"""
+    for path in capture_files(paths):
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A file still being written (or cut off by a crash) may end mid-line
+                    continue
+                if endpoint is None or record.get("endpoint") == endpoint:
+                    yield record
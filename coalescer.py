@@ -0,0 +1,102 @@
+"""
+Micro-batching of concurrent single-item requests.
+
+Requests that arrive within ``window`` seconds of the first one in an empty
+group, or until ``max_batch`` are waiting, are handed to one ``run`` call
+together, and each caller gets its own result back. Only requests with the
+same key (e.g. model version and solver) are batched together. A failed
+batch fails every request in it with the same exception.
+
+All state is touched only from the event loop thread.
+"""
+from typing import Awaitable, Callable, Hashable, List, Optional
+import asyncio
+import time
+
+
+class _Group:
+    """Requests waiting for the same flush"""
+
+    def __init__(self):
+        self.items = []
+        self.futures = []
+        self.arrived = []
+        self.timer = None
+
+
+class Coalescer:
+    """
+    Collects concurrent requests into batches.
+
+    ``run(key, items)`` is awaited with the items of a batch and returns one
+    result per item, in order. ``on_batch`` (optional) receives the batch
+    size and the seconds each item waited for its batch to start.
+    """
+
+    def __init__(self, run: Callable[[Hashable, list], Awaitable[list]], window: float, max_batch: int = 256,
+                 on_batch: Optional[Callable[[int, List[float]], None]] = None):
+        self.run = run
+        self.window = window
+        self.max_batch = max(1, max_batch)
+        self.on_batch = on_batch
+        self._pending = {}
+        self._running = set()
+        self.batches = 0
+        self.items = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    async def submit(self, key: Hashable, item):
+        """Queue ``item`` and wait for its result"""
+        loop = asyncio.get_running_loop()
+        group = self._pending.get(key)
+        if group is None:
+            group = self._pending[key] = _Group()
+            group.timer = loop.call_later(self.window, self._flush, key)
+        future = loop.create_future()
+        group.items.append(item)
+        group.futures.append(future)
+        group.arrived.append(time.perf_counter())
+        if len(group.items) >= self.max_batch:
+            group.timer.cancel()
+            self._flush(key)
+        return await future
+
+    def stats(self) -> dict:
+        return {
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch": round(self.items / self.batches, 2) if self.batches else None,
+            "waiting": sum(len(group.items) for group in self._pending.values()),
+        }
+
+    def _flush(self, key: Hashable):
+        group = self._pending.pop(key, None)
+        if group is None:
+            return
+        self.batches += 1
+        self.items += len(group.items)
+        if self.on_batch is not None:
+            now = time.perf_counter()
+            self.on_batch(len(group.items), [now - arrived for arrived in group.arrived])
+        task = asyncio.get_running_loop().create_task(self._run(key, group))
+        # Keep a reference until the batch is done
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _run(self, key: Hashable, group: _Group):
+        try:
+            results = await self.run(key, group.items)
+        except Exception as e:
+            for future in group.futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future, result in zip(group.futures, results):
+            # Callers that went away have cancelled their future
+            if not future.done():
+                future.set_result(result)
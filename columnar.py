@@ -0,0 +1,260 @@
+"""
+Binary columnar payloads for the bulk pricing endpoints.
+
+Two encodings are understood, chosen by Content-Type / Accept:
+
+- ``application/x-fpo-columns``: the magic ``FPO1``, a little-endian
+  uint32 header length, a JSON header and the raw column buffers, each
+  starting on an 8-byte boundary. The header lists ``count``, optional
+  ``meta`` and per column its ``name``, NumPy ``dtype`` (e.g. ``"<f8"``)
+  and, for text columns, a ``dictionary``: the column then holds int32
+  codes into it, with -1 for null. NaN marks a missing number.
+- ``application/vnd.apache.arrow.stream``: an Arrow IPC stream holding one
+  record batch table (needs the optional ``pyarrow`` package).
+
+Decoding maps buffers straight into NumPy arrays (no per-row Python
+objects) and validation is vectorized, reporting invalid rows by index.
+"""
+from typing import NamedTuple, Optional
+import json
+import struct
+
+import numpy as np
+
+from engine import NUMERIC_FIELDS, ItemBatch
+
+try:
+    import pyarrow as pa
+except ImportError:  # Arrow support is optional
+    pa = None
+
+MAGIC = b"FPO1"
+CONTENT_TYPE = "application/x-fpo-columns"
+ARROW_CONTENT_TYPE = "application/vnd.apache.arrow.stream"
+BINARY_CONTENT_TYPES = (CONTENT_TYPE, ARROW_CONTENT_TYPE)
+ALIGNMENT = 8
+
+# Numeric dtypes a column may use (bool counts as 0/1 like in JSON input)
+NUMERIC_KINDS = "biuf"
+
+
+class Payload(NamedTuple):
+    """Decoded columns (NumPy arrays, ``Dictionary`` for text) and header meta"""
+    count: int
+    columns: dict
+    meta: dict
+
+
+class Dictionary(NamedTuple):
+    """Dictionary-encoded text column; code -1 is null"""
+    codes: np.ndarray
+    values: list
+
+    def __len__(self):
+        return len(self.codes)
+
+
+def _pad(size: int) -> int:
+    return -size % ALIGNMENT
+
+
+def encode(columns: dict, meta: Optional[dict] = None) -> bytes:
+    """
+    Serialize ``{name: array}`` as an ``FPO1`` payload.
+
+    Text columns may be passed as ``Dictionary`` or as arrays of strings
+    (dictionary-encoded here); other arrays keep their dtype.
+    """
+    count = None
+    specs, buffers = [], []
+    for name, values in columns.items():
+        spec = {"name": name}
+        if not isinstance(values, Dictionary):
+            values = np.asarray(values)
+            if values.dtype.kind in "OU":
+                dictionary, codes = np.unique(values.astype(str), return_inverse=True)
+                values = Dictionary(codes.astype("<i4"), dictionary.tolist())
+        if isinstance(values, Dictionary):
+            spec["dictionary"] = list(values.values)
+            values = np.asarray(values.codes, dtype="<i4")
+        values = np.ascontiguousarray(values.astype(values.dtype.newbyteorder("<")))
+        if count is None:
+            count = len(values)
+        elif len(values) != count:
+            raise ValueError("All columns must have the same length.")
+        spec["dtype"] = values.dtype.str
+        specs.append(spec)
+        buffers.append(values.tobytes())
+
+    header = json.dumps({"count": count or 0, "meta": meta or {}, "columns": specs}).encode()
+    header += b" " * _pad(len(MAGIC) + 4 + len(header))
+    parts = [MAGIC, struct.pack("<I", len(header)), header]
+    for buffer in buffers:
+        parts.append(buffer)
+        parts.append(b"\0" * _pad(len(buffer)))
+    return b"".join(parts)
+
+
+def decode(payload: bytes) -> Payload:
+    """
+    Parse an ``FPO1`` payload; column arrays are views of ``payload``.
+
+    ``payload`` may be any buffer, e.g. a ``np.memmap`` of a file.
+    """
+    if len(payload) < 8 or bytes(payload[:4]) != MAGIC:
+        raise ValueError("Not an FPO1 payload.")
+    (header_size,) = struct.unpack_from("<I", payload, 4)
+    offset = 8 + header_size
+    try:
+        header = json.loads(bytes(payload[8:offset]))
+        count = int(header["count"])
+        specs = header["columns"]
+        meta = header.get("meta") or {}
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise ValueError("Invalid FPO1 header.")
+    if count < 0 or not isinstance(specs, list) or not isinstance(meta, dict):
+        raise ValueError("Invalid FPO1 header.")
+
+    columns = {}
+    for k, spec in enumerate(specs):
+        if not isinstance(spec, dict) or not isinstance(spec.get("name"), str):
+            raise ValueError(f"Column {k}: expected an object with a string name.")
+        name = spec["name"]
+        if not isinstance(spec.get("dtype"), str):
+            raise ValueError(f"{name}: expected a string dtype.")
+        try:
+            dtype = np.dtype(spec["dtype"])
+        except (TypeError, ValueError):
+            raise ValueError(f"{name}: unsupported dtype {spec['dtype']!r}.")
+        if dtype.hasobject:
+            raise ValueError(f"{name}: object columns are not supported.")
+        if "dictionary" in spec:
+            if not isinstance(spec["dictionary"], list):
+                raise ValueError(f"{name}: dictionary must be a list.")
+            if dtype.kind not in "iu":
+                raise ValueError(f"{name}: dictionary codes need an integer dtype, not {spec['dtype']!r}.")
+        size = count * dtype.itemsize
+        if offset + size > len(payload):
+            raise ValueError(f"{name}: column extends past the end of the payload.")
+        values = np.frombuffer(payload, dtype=dtype, count=count, offset=offset)
+        offset += size + _pad(size)
+        if "dictionary" in spec:
+            values = Dictionary(values, spec["dictionary"])
+        columns[name] = values
+    return Payload(count, columns, meta)
+
+
+def decode_arrow(payload: bytes) -> Payload:
+    """Read an Arrow IPC stream; text columns become ``Dictionary`` columns"""
+    if pa is None:
+        raise ValueError("Arrow payloads need the pyarrow package.")
+    try:
+        table = pa.ipc.open_stream(payload).read_all()
+    except pa.ArrowInvalid as e:
+        raise ValueError(f"Invalid Arrow stream: {e}")
+    columns = {}
+    for name in table.column_names:
+        column = table.column(name).combine_chunks()
+        if pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+            column = column.dictionary_encode()
+        if pa.types.is_dictionary(column.type):
+            codes = column.indices.fill_null(-1).to_numpy(zero_copy_only=False).astype(np.int32)
+            columns[name] = Dictionary(codes, column.dictionary.to_pylist())
+        elif pa.types.is_boolean(column.type):
+            columns[name] = column.to_numpy(zero_copy_only=False).astype(bool)
+        else:
+            columns[name] = column.to_numpy(zero_copy_only=False)
+    try:
+        meta = json.loads((table.schema.metadata or {}).get(b"fpo", b"{}"))
+    except ValueError:
+        meta = None
+    if not isinstance(meta, dict):
+        raise ValueError("Invalid Arrow stream: fpo metadata must be a JSON object.")
+    return Payload(table.num_rows, columns, meta)
+
+
+def encode_arrow(columns: dict, meta: Optional[dict] = None) -> bytes:
+    """Write ``{name: array}`` as an Arrow IPC stream (``meta`` in the schema metadata)"""
+    if pa is None:
+        raise ValueError("Arrow payloads need the pyarrow package.")
+    arrays = {}
+    for name, values in columns.items():
+        if isinstance(values, Dictionary):
+            arrays[name] = pa.DictionaryArray.from_arrays(
+                pa.array(values.codes, mask=values.codes < 0), pa.array(values.values, pa.string())
+            )
+        else:
+            values = np.asarray(values)
+            arrays[name] = pa.array(values, from_pandas=values.dtype.kind == "f")
+    table = pa.table(arrays).replace_schema_metadata({"fpo": json.dumps(meta or {})})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def read(payload: bytes, content_type: str) -> Payload:
+    """Decode a request body of either binary content type"""
+    if content_type == ARROW_CONTENT_TYPE:
+        return decode_arrow(payload)
+    return decode(payload)
+
+
+def write(columns: dict, meta: dict, content_type: str) -> bytes:
+    """Encode a response body of either binary content type"""
+    if content_type == ARROW_CONTENT_TYPE:
+        return encode_arrow(columns, meta)
+    return encode(columns, meta)
+
+
+def negotiate(accept: Optional[str]) -> Optional[str]:
+    """The binary content type requested in an Accept header, if any"""
+    for part in (accept or "").split(","):
+        media_type = part.split(";")[0].strip().lower()
+        if media_type in BINARY_CONTENT_TYPES:
+            return media_type
+    return None
+
+
+def numeric_column(name: str, values, errors: dict, required: bool = True) -> np.ndarray:
+    """
+    Vectorized check of one numeric column.
+
+    Returns float64 values; NaN rows are recorded as missing (when
+    ``required``). Infinite values pass like in JSON input and leave the
+    item without a valid price point.
+    """
+    if values is None or isinstance(values, Dictionary) or values.dtype.kind not in NUMERIC_KINDS:
+        raise ValueError(f"{name}: expected a numeric column.")
+    values = values.astype(np.float64)
+    if required:
+        for i in np.flatnonzero(np.isnan(values)):
+            errors.setdefault(int(i), f"{name}: Field required")
+    return values
+
+
+def batch_from_payload(payload: Payload) -> tuple:
+    """
+    Build an ``ItemBatch`` from decoded columns.
+
+    Returns ``(batch, errors)`` like ``engine.batch_from_columns``: rows
+    with a null category or a missing number are listed by
+    index with the message of their first invalid field. A missing column
+    or one of the wrong type fails the whole payload with ``ValueError``.
+    """
+    missing = [field for field in ItemBatch._fields if field not in payload.columns]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+    errors = {}
+    category = payload.columns["category"]
+    if not isinstance(category, Dictionary):
+        raise ValueError("category: expected a text column.")
+    codes = np.asarray(category.codes)
+    valid_code = (codes >= 0) & (codes < len(category.values))
+    for i in np.flatnonzero(~valid_code):
+        errors[int(i)] = "category: Field required"
+    dictionary = np.array([str(value) for value in category.values] + [""], dtype=object)
+    categories = dictionary[np.where(valid_code, codes, len(category.values))]
+
+    numeric = [numeric_column(field, payload.columns[field], errors) for field in NUMERIC_FIELDS]
+    return ItemBatch(categories, *numeric), errors
@@ -0,0 +1,74 @@
+"""
+Bounded thread pool for CPU-bound optimization work.
+
+Running the NumPy engine in worker threads keeps the asyncio event loop free
+for health checks and cheap endpoints. Admission is bounded: once the
+running plus queued jobs reach the limit, new work is rejected immediately
+with ``Overloaded`` so the API can answer 503 instead of piling up latency.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+
+
+class Overloaded(Exception):
+    """Raised when the pool has no room for another job"""
+
+
+class ComputePool:
+    """Thread pool with a concurrency limit and a bounded wait queue"""
+
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="optimize")
+        # Only touched from the event loop thread, so no lock is needed
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    @property
+    def running(self) -> int:
+        return min(self.pending, self.workers)
+
+    @property
+    def queued(self) -> int:
+        return max(0, self.pending - self.workers)
+
+    async def run(self, fn, *args, **kwargs):
+        """Run ``fn(*args, **kwargs)`` in the pool or raise ``Overloaded``"""
+        if self.pending >= self.workers + self.queue_size:
+            self.rejected += 1
+            raise Overloaded()
+
+        loop = asyncio.get_running_loop()
+        future = self._executor.submit(functools.partial(fn, *args, **kwargs))
+        self.pending += 1
+        # A job keeps its slot until it finishes, even if the caller stops
+        # waiting (e.g. the client disconnected); the count is updated on
+        # the event loop thread
+        future.add_done_callback(lambda _: self._call_soon(loop, self._finished))
+        return await asyncio.wrap_future(future, loop=loop)
+
+    def _finished(self):
+        self.pending -= 1
+        self.completed += 1
+
+    @staticmethod
+    def _call_soon(loop, callback):
+        try:
+            loop.call_soon_threadsafe(callback)
+        except RuntimeError:
+            # The loop is already closed (shutdown)
+            pass
+
+    def stats(self) -> dict:
+        """Load figures for the API"""
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "running": self.running,
+            "queued": self.queued,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
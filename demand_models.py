@@ -0,0 +1,234 @@
+"""
+Pluggable demand models.
+
+Every model answers one question: the demand of many items at many
+candidate prices, ``predict(batch, prices)`` with an ``(items, k)`` price
+array, in a single call. The price searches in engine.py only need that,
+so non-linear models get the same vectorized grid search and the
+coarse-to-fine search (cent-level precision in about 85 evaluations per
+item instead of hundreds of grid points), with one ``predict`` call per
+round instead of one per price.
+
+``RidgeDemand`` wraps the served Ridge artifact. ``FeatureDemand`` holds a
+scikit-learn regressor trained on the same notebook features (the serving
+FEATURE_NAMES plus category dummies):
+
+- ``tree``: gradient-boosted trees (HistGradientBoostingRegressor);
+- ``spline``: cubic splines of every feature plus the dummies, with Ridge.
+
+    python demand_models.py --kind tree --output models/demand_tree.joblib
+"""
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Optional
+import argparse
+import logging
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from engine import (
+    FEATURE_NAMES, SEARCH_BUDGET, SEARCH_TOLERANCE, CompiledModel, ItemBatch, PriceResult, feature_terms,
+    linear_demand, optimize, optimize_grid, search_prices,
+)
+from train import CATEGORY_COLUMN, DEFAULT_DATA_PATH, TARGET, add_features, month_index, read_chunks
+
+logger = logging.getLogger(__name__)
+
+KINDS = ('tree', 'spline')
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+
+
+class DemandModel(ABC):
+    """Demand of many items at many candidate prices in one call"""
+    name = ''
+    version = ''
+
+    @abstractmethod
+    def predict(self, batch: ItemBatch, prices: np.ndarray) -> np.ndarray:
+        """Unclamped demand of item ``i`` at ``prices[i]``, shaped like ``prices``"""
+
+    def optimize(self, batch: ItemBatch, solver: str = 'search', tolerance: float = SEARCH_TOLERANCE,
+                 budget: int = SEARCH_BUDGET) -> PriceResult:
+        """Profit-maximizing price of every item with the "grid" or "search" solver"""
+        def predict(rows, prices):
+            return self.predict(ItemBatch(*(values[rows] for values in batch)), prices)
+
+        if solver == 'grid':
+            return optimize_grid(None, batch, predict=predict)
+        if solver == 'search':
+            return search_prices(predict, batch, tolerance, budget)
+        raise ValueError(f"The {self.name} demand model supports the grid and search solvers")
+
+
+class RidgeDemand(DemandModel):
+    """The served Ridge model (every solver, including the closed form)"""
+    name = 'ridge'
+
+    def __init__(self, compiled: CompiledModel):
+        self.compiled = compiled
+        self.version = compiled.version
+
+    def predict(self, batch: ItemBatch, prices: np.ndarray) -> np.ndarray:
+        intercept, slope = linear_demand(self.compiled, batch)
+        return intercept[:, None] + slope[:, None] * prices
+
+    def optimize(self, batch: ItemBatch, solver: str = 'search', tolerance: float = SEARCH_TOLERANCE,
+                 budget: int = SEARCH_BUDGET) -> PriceResult:
+        options = {'tolerance': tolerance, 'budget': budget} if solver == 'search' else {}
+        return optimize(self.compiled, batch, solver, **options)
+
+
+class FeatureDemand(DemandModel):
+    """scikit-learn regressor over FEATURE_NAMES plus category dummies (first category dropped)"""
+
+    def __init__(self, kind: str, estimator, categories: list, metrics: Optional[dict] = None,
+                 version: Optional[str] = None):
+        self.name = kind
+        self.estimator = estimator
+        self.categories = list(categories)
+        self.metrics = dict(metrics or {})
+        self.version = version or f"{kind}-{datetime.now(timezone.utc):%Y%m%d%H%M%S}"
+
+    def predict(self, batch: ItemBatch, prices: np.ndarray) -> np.ndarray:
+        items, k = prices.shape
+        x0, x1 = feature_terms(batch)
+        features = x0.T[:, None, :] + prices[:, :, None] * x1.T[:, None, :]
+        lookup = {name.lower(): index for index, name in enumerate(self.categories)}
+        names, inverse = np.unique(batch.category.astype(str), return_inverse=True)
+        # Unknown categories count as the baseline, like in the Ridge model
+        codes = np.array([lookup.get(name.lower(), 0) for name in names], dtype=np.intp)[inverse.reshape(-1)]
+        dummies = (codes[:, None] == np.arange(1, len(self.categories))).astype(np.float64)
+        matrix = np.concatenate([features, np.broadcast_to(dummies[:, None, :], (items, k, dummies.shape[1]))], axis=2)
+        return self.estimator.predict(matrix.reshape(items * k, -1)).reshape(items, k)
+
+
+def training_rows(path: str, sample_size: int = 200_000, chunksize: int = 100_000, seed: int = 0) -> tuple:
+    """
+    ``(features, target, month, categories)`` of a uniform sample of complete rows.
+
+    Every row gets a random key and the ``sample_size`` smallest keys are
+    kept chunk by chunk, so memory is bounded by the sample. ``features``
+    holds FEATURE_NAMES followed by the category dummies.
+    """
+    rng = np.random.default_rng(seed)
+    needed = {TARGET, 'unit_price', 'product_score', 'customers', 'comp_1', 'comp_2', 'comp_3', 'freight_price',
+              'product_weight_g'}
+    columns = [CATEGORY_COLUMN, 'month_year', *needed]
+    keep = [CATEGORY_COLUMN, 'month', TARGET, *FEATURE_NAMES]
+    sample = None
+    for chunk in read_chunks(path, chunksize, columns):
+        chunk = add_features(chunk).assign(month=month_index)
+        chunk = chunk[keep].dropna()
+        chunk = chunk.assign(key=rng.random(len(chunk)), **{CATEGORY_COLUMN: chunk[CATEGORY_COLUMN].astype(str)})
+        if sample is not None:
+            chunk = pd.concat([sample, chunk], ignore_index=True)
+        sample = chunk.nsmallest(sample_size, 'key') if len(chunk) > sample_size else chunk
+    if sample is None or not len(sample):
+        raise ValueError(f"No complete rows in {path}")
+    categories = sorted(sample[CATEGORY_COLUMN].unique())
+    codes = pd.Categorical(sample[CATEGORY_COLUMN], categories=categories).codes
+    dummies = (codes[:, None] == np.arange(1, len(categories))).astype(np.float64)
+    features = np.hstack([sample[list(FEATURE_NAMES)].to_numpy(np.float64), dummies])
+    return features, sample[TARGET].to_numpy(np.float64), sample['month'].to_numpy(), categories
+
+
+def make_estimator(kind: str, n_dummies: int, alpha: float = 20.0, seed: int = 0):
+    """Unfitted scikit-learn estimator of a model kind"""
+    if kind == 'tree':
+        from sklearn.ensemble import HistGradientBoostingRegressor
+
+        return HistGradientBoostingRegressor(
+            max_iter=300, learning_rate=0.05, max_leaf_nodes=15, min_samples_leaf=10, random_state=seed
+        )
+    if kind == 'spline':
+        from sklearn.compose import ColumnTransformer
+        from sklearn.linear_model import Ridge
+        from sklearn.pipeline import make_pipeline
+        from sklearn.preprocessing import SplineTransformer, StandardScaler
+
+        numeric = list(range(len(FEATURE_NAMES)))
+        splines = make_pipeline(StandardScaler(), SplineTransformer(n_knots=5, degree=3, extrapolation='linear'))
+        columns = ColumnTransformer([
+            ('splines', splines, numeric),
+            ('categories', 'passthrough', list(range(len(numeric), len(numeric) + n_dummies))),
+        ])
+        return make_pipeline(columns, Ridge(alpha=alpha))
+    raise ValueError(f"Unknown demand model kind {kind!r}; expected one of {', '.join(KINDS)}")
+
+
+def fit(kind: str, path: str = DEFAULT_DATA_PATH, test_start: str = '2018-05-01', alpha: float = 20.0,
+        sample_size: int = 200_000, seed: int = 0) -> FeatureDemand:
+    """Train a model kind on the months before ``test_start`` and score R^2 on the rest"""
+    features, target, month, categories = training_rows(path, sample_size, seed=seed)
+    train_rows = month < np.datetime64(test_start, 'M')
+    if not train_rows.any():
+        raise ValueError(f"No training rows before {test_start}")
+    estimator = make_estimator(kind, len(categories) - 1, alpha, seed)
+    estimator.fit(features[train_rows], target[train_rows])
+    metrics = {'test_start': str(np.datetime64(test_start, 'D')), 'train_rows': int(train_rows.sum()),
+               'test_rows': int((~train_rows).sum()), 'r_squared': None}
+    if (~train_rows).sum() > 1:
+        metrics['r_squared'] = round(float(estimator.score(features[~train_rows], target[~train_rows])), 4)
+    return FeatureDemand(kind, estimator, categories, metrics)
+
+
+def save(model: FeatureDemand, path: str):
+    """Write a model file atomically"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = os.path.join(directory, f".{os.path.basename(path)}.{os.getpid()}.tmp")
+    joblib.dump(model, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load(path: str) -> FeatureDemand:
+    """Read a model file written by ``save`` (pickle: only load trusted files)"""
+    model = joblib.load(path)
+    if not isinstance(model, FeatureDemand):
+        raise ValueError(f"{path} is not a demand model file")
+    return model
+
+
+def load_all(paths) -> dict:
+    """``{name: model}`` of every readable model file; failures are logged and skipped"""
+    models = {}
+    for path in paths:
+        try:
+            model = load(path)
+        except Exception:
+            logger.exception("Failed to load demand model %s", path)
+            continue
+        models[model.name] = model
+        logger.info("Loaded %s demand model %s from %s", model.name, model.version, path)
+    return models
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train a non-linear demand model on the notebook features")
+    parser.add_argument("--kind", choices=KINDS, required=True)
+    parser.add_argument("--data", default=DEFAULT_DATA_PATH)
+    parser.add_argument("--output", help="model file to write (default models/demand_<kind>.joblib)")
+    parser.add_argument("--test-start", default="2018-05-01", help="first month of the test period")
+    parser.add_argument("--alpha", type=float, default=20.0, help="Ridge alpha of the spline model")
+    parser.add_argument("--sample-size", type=int, default=200_000, help="rows sampled for training")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # Through the module, so the pickled class is importable as demand_models.FeatureDemand
+    import demand_models
+
+    start = time.perf_counter()
+    model = demand_models.fit(args.kind, args.data, args.test_start, args.alpha, args.sample_size, args.seed)
+    print(f"Trained {args.kind} on {model.metrics['train_rows']} rows, R^2 on months from "
+          f"{model.metrics['test_start']}: {model.metrics['r_squared']} ({time.perf_counter() - start:.2f}s)")
+    output = args.output or os.path.join(MODELS_DIR, f"demand_{args.kind}.joblib")
+    demand_models.save(model, output)
+    print(f"Wrote {args.kind} demand model {model.version} to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Multi-period pricing with limited inventory.
+
+A product with ``inventory`` units on hand is priced over a horizon of
+periods, each with its own inputs (competitor price forecasts and, if they
+change, score, customers or freight), one ItemBatch row per period. Demand
+in period ``t`` at price ``p`` is the model's ``max(MIN_QTY, q_t(p))`` and
+sales are ``min(stock, demand)``; unsold units are worth ``salvage`` each
+at the end. Selling a unit now therefore costs the profit it could have
+made later, which a dynamic program over (period, remaining inventory)
+prices in:
+
+    V_t(x) = max_p  (p - cost_t) * min(x, q_t(p)) + V_{t+1}(x - min(x, q_t(p)))
+
+Remaining inventory is discretized into ``levels + 1`` evenly spaced levels
+from 0 to ``inventory`` and ``V_{t+1}`` is linearly interpolated between
+them, so fractional demand needs no rounding. Candidate prices are each
+period's 0.50 grid from ``price_bounds``; the demand of every period at
+every candidate comes from one ``predict`` call, and each backward step
+takes a few vector operations over all levels per candidate price (see
+``best_values``), so memory stays at a few arrays of ``levels``.
+
+The path is then read forward from the starting inventory, along with the
+path of the single-period optimizer (``optimize_price`` every period,
+ignoring stock) run against the same inventory for comparison.
+"""
+from typing import Callable, NamedTuple
+
+import numpy as np
+
+from engine import MIN_QTY, PRICE_STEP, ItemBatch, price_bounds, price_grid
+
+# Stock below this many units counts as sold out
+SOLD_OUT = 1e-9
+
+
+class PricePath(NamedTuple):
+    """Prices, sales and profit per period of a path through the horizon"""
+    price: np.ndarray
+    demand: np.ndarray
+    sales: np.ndarray
+    inventory: np.ndarray   # on hand at the start of each period
+    profit: np.ndarray
+    total_profit: float
+    leftover: float
+
+
+class DynamicResult(NamedTuple):
+    """Optimal path, the single-period baseline and the value of stock"""
+    path: PricePath
+    myopic: PricePath
+    value: np.ndarray   # best total profit from each inventory level at the start
+    levels: np.ndarray  # the inventory levels
+
+
+def period_demand(predict: Callable[[ItemBatch, np.ndarray], np.ndarray], periods: ItemBatch,
+                  step: float = PRICE_STEP) -> tuple:
+    """
+    Candidate prices and clamped demand of every period.
+
+    Returns ``(prices, demand, usable)`` of shape ``(periods, width)``;
+    ``usable`` is False for grid padding and non-finite demand.
+    """
+    min_price, max_price = price_bounds(periods)
+    prices, usable = price_grid(min_price, max_price, step)
+    with np.errstate(invalid='ignore', over='ignore'):
+        demand = np.maximum(MIN_QTY, predict(periods, np.where(usable, prices, 0.0)))
+    usable &= np.isfinite(demand)
+    if not usable.any(axis=1).all():
+        missing = np.flatnonzero(~usable.any(axis=1))
+        raise ValueError(f"No valid price in period(s) {', '.join(str(t + 1) for t in missing)}")
+    return prices, np.where(usable, demand, 0.0), usable
+
+
+def _step_values(value_next: np.ndarray, slope_next: np.ndarray, stock: np.ndarray, spacing: float,
+                 demand: np.ndarray, margin: np.ndarray) -> tuple:
+    """
+    Sales and total value of every (stock, candidate price) pair of one period.
+
+    ``value_next`` is interpolated between levels with ``slope_next``, its
+    differences padded with a zero so the top level needs no clipping.
+    """
+    sales = np.minimum(stock[:, None], demand[None, :])
+    position = np.maximum((stock[:, None] - sales) / spacing, 0.0)
+    lower = position.astype(np.intp)
+    return sales, margin[None, :] * sales + value_next[lower] + (position - lower) * slope_next[lower]
+
+
+def best_values(value_next: np.ndarray, slope_next: np.ndarray, stock: np.ndarray, demand: np.ndarray,
+                margin: np.ndarray, usable: np.ndarray) -> np.ndarray:
+    """
+    Best total value from every inventory level of one period.
+
+    A price with demand ``q`` sells out the levels holding at most ``q``
+    and sells ``q`` from all the others, which all end between the same two
+    levels of the next period: their future value is one shifted slice of
+    ``value_next`` with a constant interpolation weight. So each candidate
+    price costs a few vector operations over the levels instead of a gather
+    per (level, price) cell.
+    """
+    spacing = stock[1]
+    best = np.full(len(stock), -np.inf)
+    total = np.empty(len(stock))
+    for k in np.flatnonzero(usable):
+        position = demand[k] / spacing
+        first = min(int(position) + 1, len(stock))
+        # Sold out: everything on hand goes at this price
+        np.multiply(stock[:first], margin[k], out=total[:first])
+        total[:first] += value_next[0]
+        # Demand met: the rest is worth value_next at (level - position)
+        rest = len(stock) - first
+        weight = first - position
+        total[first:] = margin[k] * demand[k] + value_next[:rest] + weight * slope_next[:rest]
+        np.maximum(best, total, out=best)
+    return best
+
+
+def solve(predict: Callable[[ItemBatch, np.ndarray], np.ndarray], periods: ItemBatch, inventory: float,
+          levels: int = 1000, salvage: float = 0.0, step: float = PRICE_STEP) -> DynamicResult:
+    """
+    Profit-maximizing price path over ``periods.size`` periods.
+
+    ``predict(batch, prices)`` returns unclamped demand of row ``i`` at
+    ``prices[i]`` (see demand_models.DemandModel.predict).
+    """
+    if inventory <= 0:
+        raise ValueError("Starting inventory must be positive")
+    if levels < 1:
+        raise ValueError("At least one inventory level is needed")
+    prices, demand, usable = period_demand(predict, periods, step)
+    cost = periods.cogs + periods.freight
+    margin = prices - cost[:, None]
+    horizon = periods.size
+
+    stock = np.linspace(0.0, inventory, levels + 1)
+    spacing = stock[1]
+    values = np.empty((horizon + 1, levels + 1))
+    values[horizon] = salvage * stock
+    slopes = np.zeros((horizon + 1, levels + 1))
+    for t in range(horizon - 1, -1, -1):
+        slopes[t + 1, :-1] = np.diff(values[t + 1])
+        values[t] = best_values(values[t + 1], slopes[t + 1], stock, demand[t], margin[t], usable[t])
+
+    def choose(t, on_hand):
+        sales, total = _step_values(values[t + 1], slopes[t + 1], np.array([on_hand]), spacing, demand[t], margin[t])
+        return int(np.argmax(np.where(usable[t], total[0], -np.inf))), sales[0]
+
+    path = walk(choose, prices, demand, margin, inventory, salvage)
+    myopic_choice = np.argmax(np.where(usable, margin * demand, -np.inf), axis=1)
+    myopic = walk(lambda t, on_hand: (myopic_choice[t], np.minimum(on_hand, demand[t])),
+                  prices, demand, margin, inventory, salvage)
+    return DynamicResult(path, myopic, values[0], stock)
+
+
+def walk(choose, prices: np.ndarray, demand: np.ndarray, margin: np.ndarray, inventory: float,
+         salvage: float) -> PricePath:
+    """Follow ``choose(t, on_hand) -> (price index, sales per price)`` forward from ``inventory``"""
+    horizon = len(prices)
+    path = {name: np.zeros(horizon) for name in ('price', 'demand', 'sales', 'inventory', 'profit')}
+    on_hand = inventory
+    for t in range(horizon):
+        path['inventory'][t] = on_hand
+        if on_hand <= SOLD_OUT:
+            # Nothing left to price
+            path['price'][t:] = np.nan
+            path['demand'][t:] = np.nan
+            path['inventory'][t:] = on_hand
+            break
+        k, sales = choose(t, on_hand)
+        sold = min(on_hand, float(sales[k]))
+        path['price'][t] = prices[t, k]
+        path['demand'][t] = demand[t, k]
+        path['sales'][t] = sold
+        path['profit'][t] = margin[t, k] * sold
+        on_hand = max(0.0, on_hand - sold)
+    total = float(path['profit'].sum()) + salvage * on_hand
+    return PricePath(**path, total_profit=total, leftover=on_hand)
@@ -0,0 +1,601 @@
+"""
+Vectorized pricing engine for the Ridge demand model.
+
+The Ridge model is linear in its (scaled) features, and every feature is an
+affine function of the candidate price. Folding the scaler into the model
+coefficients once gives a plain weight vector, so demand for a whole price
+grid is a single ``intercept + slope * prices`` array expression.
+"""
+from typing import NamedTuple, Optional, Sequence
+import time
+
+import numpy as np
+
+# Search settings shared with the original scalar loop in api.py
+PRICE_STEP = 0.50
+MIN_MARGIN = 10.0
+MIN_QTY = 0.1
+
+# Longest price grid searched for one item; wider ranges (e.g. an absurd
+# competitor price) would allocate gigabytes, so they have no valid points
+MAX_GRID_POINTS = 100_000
+
+# Coarse-to-fine search: prices per item and round, default precision and
+# default cap on evaluations per item
+SEARCH_POINTS = 17
+SEARCH_TOLERANCE = 0.01
+SEARCH_BUDGET = 200
+
+# Order of the scaled features in the compiled weight vector
+FEATURE_NAMES = (
+    'unit_price',
+    'product_score',
+    'customers',
+    'comp_1',
+    'comp_2',
+    'comp_3',
+    'price_ratio_1',
+    'price_diff_1',
+    'price_ratio_2',
+    'price_diff_2',
+    'price_ratio_3',
+    'price_diff_3',
+)
+
+
+class CompiledEnsemble(NamedTuple):
+    """Bootstrap ensemble with the scaler folded in, one row per member"""
+    weights: np.ndarray
+    bias: np.ndarray
+    categories: tuple
+    category_weights: np.ndarray
+
+
+class CompiledModel(NamedTuple):
+    """Ridge model with the scaler folded into the weights"""
+    weights: np.ndarray
+    bias: float
+    category_weights: dict
+    version: str = ''
+    ensemble: Optional[CompiledEnsemble] = None
+
+
+class PriceResult(NamedTuple):
+    """
+    Per-item outcome of a price search, one array entry per item.
+
+    ``max_profit`` is -inf for items without any valid price point.
+    """
+    optimal_price: np.ndarray
+    max_profit: np.ndarray
+    predicted_qty: np.ndarray
+    points_evaluated: np.ndarray
+    points_skipped: np.ndarray
+
+
+def compile_model(coefficients: dict, scaler_params: dict, version: str = '') -> CompiledModel:
+    """
+    Fold the scaler into the Ridge coefficients.
+
+    ``coef * (x - mean) / std`` is rewritten as ``(coef / std) * x`` plus a
+    constant, so predictions no longer need per-feature normalization.
+    """
+    coef = np.array([coefficients[name] for name in FEATURE_NAMES])
+    mean = np.array([scaler_params[name]['mean'] for name in FEATURE_NAMES])
+    std = np.array([scaler_params[name]['std'] for name in FEATURE_NAMES])
+
+    weights = np.ascontiguousarray(coef / std)
+    bias = float(coefficients['intercept'] - np.dot(coef, mean / std))
+    category_weights = {
+        name[len('cat_'):]: float(value)
+        for name, value in coefficients.items()
+        if name.startswith('cat_')
+    }
+    return CompiledModel(weights, bias, category_weights, version)
+
+
+def compile_ensemble(intercepts, coefficients, means, stds, categories, category_coefficients) -> CompiledEnsemble:
+    """
+    Fold the scaler into every ensemble member.
+
+    ``coefficients`` has one row per member with columns in FEATURE_NAMES
+    order; ``category_coefficients`` one column per entry of ``categories``.
+    """
+    coef = np.asarray(coefficients, dtype=np.float64)
+    mean = np.asarray(means, dtype=np.float64)
+    std = np.asarray(stds, dtype=np.float64)
+    weights = np.ascontiguousarray(coef / std)
+    bias = np.asarray(intercepts, dtype=np.float64) - coef @ (mean / std)
+    return CompiledEnsemble(
+        weights, bias, tuple(name.lower() for name in categories),
+        np.asarray(category_coefficients, dtype=np.float64).reshape(len(bias), len(categories)),
+    )
+
+
+class ItemBatch(NamedTuple):
+    """Columnar view of many optimization inputs (one array per field)"""
+    category: np.ndarray
+    cogs: np.ndarray
+    freight: np.ndarray
+    comp1: np.ndarray
+    comp2: np.ndarray
+    comp3: np.ndarray
+    score: np.ndarray
+    customers: np.ndarray
+
+    @property
+    def size(self) -> int:
+        """Number of items"""
+        return self.cogs.shape[0]
+
+
+NUMERIC_FIELDS = ItemBatch._fields[1:]
+
+
+def make_batch(items) -> ItemBatch:
+    """Build an ``ItemBatch`` from objects exposing the input fields"""
+    items = list(items)
+    columns = [np.array([item.category for item in items], dtype=object)]
+    for field in NUMERIC_FIELDS:
+        columns.append(np.array([getattr(item, field) for item in items], dtype=float))
+    return ItemBatch(*columns)
+
+
+def category_offsets(model: CompiledModel, categories: np.ndarray) -> np.ndarray:
+    """Category weight of every item (unknown categories count as baseline)"""
+    names, inverse = np.unique(categories.astype(str), return_inverse=True)
+    lookup = np.array([model.category_weights.get(name.lower(), 0.0) for name in names])
+    return lookup[inverse.reshape(-1)] if names.size else np.zeros(0)
+
+
+def feature_terms(batch: ItemBatch) -> tuple:
+    """
+    Split the feature matrix of a batch into constant and price terms.
+
+    Returns ``(x0, x1)`` of shape ``(features, items)`` such that the raw
+    features at price ``p`` are ``x0 + p * x1``. A competitor price of zero
+    or less keeps the original fallback ratio of 1.0.
+    """
+    n = batch.size
+    x0 = np.zeros((len(FEATURE_NAMES), n))
+    x1 = np.zeros((len(FEATURE_NAMES), n))
+    x1[0] = 1.0
+    x0[1] = batch.score
+    x0[2] = batch.customers
+    for k, comp in enumerate((batch.comp1, batch.comp2, batch.comp3)):
+        positive = comp > 0
+        x0[3 + k] = comp
+        x0[6 + 2 * k] = np.where(positive, 0.0, 1.0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x1[6 + 2 * k] = np.where(positive, 1.0 / np.where(positive, comp, 1.0), 0.0)
+        x0[7 + 2 * k] = -comp
+        x1[7 + 2 * k] = 1.0
+    return x0, x1
+
+
+def linear_demand(model: CompiledModel, batch: ItemBatch) -> tuple:
+    """
+    Return ``(intercept, slope)`` arrays of the unclamped demand lines.
+
+    The weighted sum is accumulated feature by feature, so every item gets
+    bit-identical coefficients whatever the batch size.
+    """
+    x0, x1 = feature_terms(batch)
+    intercept = model.bias + category_offsets(model, batch.category)
+    slope = np.zeros(batch.size)
+    for weight, constant, price_term in zip(model.weights, x0, x1):
+        intercept = intercept + weight * constant
+        slope = slope + weight * price_term
+    return intercept, slope
+
+
+def linear_demand_by_category(batch: ItemBatch, models: Sequence[CompiledModel], names: np.ndarray,
+                              inverse: np.ndarray) -> tuple:
+    """
+    ``linear_demand`` with a model per category, in one pass.
+
+    Items of category ``names[j]`` (``inverse`` maps items to ``j``, as
+    returned by ``np.unique``) use ``models[j]``. The lines are identical
+    to ``linear_demand`` of each model over its own items.
+    """
+    x0, x1 = feature_terms(batch)
+    weights = np.array([model.weights for model in models]).reshape(len(models), -1)[inverse]
+    bias = np.array([model.bias for model in models], dtype=float)
+    offsets = np.array([model.category_weights.get(str(name).lower(), 0.0) for model, name in zip(models, names)])
+    intercept = (bias + offsets)[inverse]
+    slope = np.zeros(batch.size)
+    for weight, constant, price_term in zip(weights.T, x0, x1):
+        intercept = intercept + weight * constant
+        slope = slope + weight * price_term
+    return intercept, slope
+
+
+def price_bounds(batch: ItemBatch) -> tuple:
+    """Search range used by the optimizer: cost + margin to 2x top competitor"""
+    min_price = batch.cogs + batch.freight + MIN_MARGIN
+    max_price = np.maximum(np.maximum(batch.comp1, batch.comp2), batch.comp3) * 2
+    return min_price, max_price
+
+
+def price_grid(min_price: np.ndarray, max_price: np.ndarray, step: float = PRICE_STEP) -> tuple:
+    """
+    Padded candidate price grids for a batch of search ranges.
+
+    Returns ``(prices, in_range)`` of shape ``(items, width)``. Each row is
+    built with a running sum, so it reproduces the exact floating point
+    values of the ``price += step`` loop it replaces. Ranges needing more
+    than ``MAX_GRID_POINTS`` prices are treated as unusable.
+    """
+    usable = np.isfinite(min_price) & np.isfinite(max_price) & (max_price >= min_price)
+    with np.errstate(invalid='ignore', over='ignore'):
+        span = np.where(usable, max_price - min_price, 0.0)
+        usable &= span // step + 2 <= MAX_GRID_POINTS
+    counts = np.where(usable, span // step + 2, 0).astype(np.int64)
+    width = int(counts.max()) if counts.size else 0
+
+    steps = np.full((min_price.size, width), step)
+    if width:
+        steps[:, 0] = np.where(usable, min_price, 0.0)
+    prices = np.cumsum(steps, axis=1)
+    in_range = usable[:, None] & (prices <= max_price[:, None])
+    return prices, in_range
+
+
+def optimize_grid(model: Optional[CompiledModel], batch: ItemBatch, step: float = PRICE_STEP,
+                  max_cells: int = 1 << 20, demand: tuple = None, predict=None) -> PriceResult:
+    """
+    Grid search for the profit-maximizing price of every item in a batch.
+
+    Items are sorted by grid length and evaluated in chunks of at most
+    ``max_cells`` (items x prices) cells, which bounds memory and keeps
+    padding low; items whose range needs more than ``MAX_GRID_POINTS``
+    prices have no valid price point. ``demand`` may pass precomputed ``linear_demand`` output.
+    Any other demand model can be searched by passing ``predict(rows,
+    prices)``, returning the unclamped demand of items ``rows`` at the
+    ``(len(rows), k)`` candidate ``prices`` (``model`` is then unused).
+    """
+    n = batch.size
+    if predict is None:
+        intercept, slope = demand if demand is not None else linear_demand(model, batch)
+        predict = lambda rows, prices: intercept[rows, None] + slope[rows, None] * prices
+    min_price, max_price = price_bounds(batch)
+
+    optimal_price = min_price.astype(float)
+    max_profit = np.full(n, -np.inf)
+    predicted_qty = np.zeros(n)
+    evaluated = np.zeros(n, dtype=np.int64)
+    skipped = np.zeros(n, dtype=np.int64)
+
+    with np.errstate(invalid='ignore', over='ignore'):
+        span = np.where(max_price >= min_price, max_price - min_price, 0.0)
+        span = np.where(np.isfinite(span) & (span // step + 2 <= MAX_GRID_POINTS), span, 0.0)
+    # Widest grids first, so the first row of a chunk sets its width
+    order = np.argsort(-span, kind='stable')
+    start = 0
+    while start < n:
+        width = int(span[order[start]] // step) + 2
+        stop = min(n, start + max(1, max_cells // width))
+        rows = order[start:stop]
+        start = stop
+
+        prices, in_range = price_grid(min_price[rows], max_price[rows], step)
+        if not prices.shape[1]:
+            continue
+        cogs = batch.cogs[rows, None]
+        freight = batch.freight[rows, None]
+        with np.errstate(invalid='ignore', over='ignore'):
+            prediction = predict(rows, prices)
+            # Same semantics as max(0.1, prediction), including NaN -> 0.1
+            qty = np.where(prediction > MIN_QTY, prediction, MIN_QTY)
+            profit = (prices * qty) - (cogs * qty) - (freight * qty)
+
+        # Skip non-finite points (avoid JSON serialization errors)
+        valid = in_range & np.isfinite(qty) & np.isfinite(profit)
+        evaluated[rows] = in_range.sum(axis=1)
+        skipped[rows] = evaluated[rows] - valid.sum(axis=1)
+
+        # argmax keeps the first maximum, like the strict '>' in the loop
+        best = np.argmax(np.where(valid, profit, -np.inf), axis=1)
+        found = valid.any(axis=1)
+        pick = np.arange(rows.size)
+        hit = rows[found]
+        optimal_price[hit] = prices[pick, best][found]
+        max_profit[hit] = profit[pick, best][found]
+        predicted_qty[hit] = qty[pick, best][found]
+
+    return PriceResult(optimal_price, max_profit, predicted_qty, evaluated, skipped)
+
+
+def _float_column(name: str, values, errors: dict) -> np.ndarray:
+    """
+    Convert a column to float64, recording unparseable rows in ``errors``.
+
+    Values are accepted like a ``float`` field of POST /optimize_price:
+    numbers, booleans and numeric strings, including "nan" and "inf"
+    (such items then have no valid price point).
+    """
+    try:
+        if any(value is None for value in values):
+            raise TypeError(name)
+        return np.asarray(values, dtype=float)
+    except (TypeError, ValueError, OverflowError):
+        column = np.zeros(len(values))
+        for i, value in enumerate(values):
+            if value is None:
+                errors.setdefault(i, f"{name}: Field required")
+                continue
+            try:
+                column[i] = float(value)
+            except (TypeError, ValueError, OverflowError):
+                errors.setdefault(i, f"{name}: Input should be a valid number")
+        return column
+
+
+def batch_from_columns(columns: dict, size: int) -> tuple:
+    """
+    Validate columnar input of ``size`` rows and build an ``ItemBatch``.
+
+    Returns ``(batch, errors)`` where ``errors`` maps a row index to the
+    message of its first invalid field. Invalid rows keep placeholder values
+    so the batch stays aligned with the input.
+    """
+    errors = {}
+    categories = columns['category']
+    is_text = np.fromiter((isinstance(value, str) for value in categories), dtype=bool, count=size)
+    for i in np.flatnonzero(~is_text):
+        message = "Field required" if categories[i] is None else "Input should be a valid string"
+        errors.setdefault(int(i), f"category: {message}")
+    category = np.array([value if ok else '' for value, ok in zip(categories, is_text)], dtype=object)
+
+    numeric = [_float_column(field, columns[field], errors) for field in NUMERIC_FIELDS]
+    return ItemBatch(category, *numeric), errors
+
+
+def vertex_cents(intercept: np.ndarray, slope: np.ndarray, batch: ItemBatch, min_price: np.ndarray,
+                 max_price: np.ndarray) -> tuple:
+    """The cents either side of each demand line's profit vertex, clipped to the bounds"""
+    cost = batch.cogs + batch.freight
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        vertex = (slope * cost - intercept) / (2 * slope)
+        return (np.clip(np.floor(vertex * 100) / 100, min_price, max_price),
+                np.clip(np.ceil(vertex * 100) / 100, min_price, max_price))
+
+
+def optimize_exact(model: CompiledModel, batch: ItemBatch, demand: tuple = None) -> PriceResult:
+    """
+    Closed-form profit maximization for every item in a batch.
+
+    Demand is ``max(0.1, a + b * p)`` and profit is ``(p - cost) * qty``.
+    Where the line is above the clamp, profit is a quadratic with vertex
+    ``(b * cost - a) / (2 * b)``; inside the clamp region profit only grows
+    with price. So the optimum is either a search bound or the vertex, and
+    the vertex is resolved to the better of its two neighbouring cents.
+    Only these four candidates are evaluated per item.
+    """
+    intercept, slope = demand if demand is not None else linear_demand(model, batch)
+    min_price, max_price = price_bounds(batch)
+    low_cent, high_cent = vertex_cents(intercept, slope, batch, min_price, max_price)
+
+    with np.errstate(invalid='ignore', over='ignore'):
+        # Lower prices first, so ties resolve like the grid search
+        prices = np.stack([min_price, low_cent, high_cent, max_price], axis=1)
+        prediction = intercept[:, None] + slope[:, None] * prices
+        qty = np.where(prediction > MIN_QTY, prediction, MIN_QTY)
+        profit = (prices * qty) - (batch.cogs[:, None] * qty) - (batch.freight[:, None] * qty)
+
+    usable = np.isfinite(min_price) & np.isfinite(max_price) & (max_price >= min_price)
+    in_range = usable[:, None] & np.isfinite(prices)
+    valid = in_range & np.isfinite(qty) & np.isfinite(profit)
+    evaluated = in_range.sum(axis=1)
+
+    best = np.argmax(np.where(valid, profit, -np.inf), axis=1)
+    found = valid.any(axis=1)
+    pick = np.arange(batch.size)
+    return PriceResult(
+        np.where(found, prices[pick, best], min_price),
+        np.where(found, profit[pick, best], -np.inf),
+        np.where(found, qty[pick, best], 0.0),
+        evaluated,
+        evaluated - valid.sum(axis=1),
+    )
+
+
+def search_prices(predict, batch: ItemBatch, tolerance: float = SEARCH_TOLERANCE,
+                  budget: int = SEARCH_BUDGET, points: int = SEARCH_POINTS,
+                  candidates: np.ndarray = None) -> PriceResult:
+    """
+    Coarse-to-fine price search for any demand model.
+
+    ``predict(rows, prices)`` is called like in ``optimize_grid``, once
+    per round with every item. A round evaluates ``points`` evenly spaced
+    prices per item and narrows each range to one spacing either side of
+    the best price so far, so the spacing shrinks by ``(points - 1) / 2``
+    per round. The search stops when the spacing is at most ``tolerance``
+    or another round would exceed ``budget`` evaluations per item. This
+    finds the optimum of profit curves with one peak; where a curve has
+    several, it refines the best one seen in the coarse round.
+
+    ``points`` is reduced to fit ``budget`` (down to 3). ``candidates``
+    (one row per item, NaN for none) are also evaluated in the first round
+    if the budget leaves room for them, e.g. a known vertex.
+    """
+    n = batch.size
+    extra = 0 if candidates is None else candidates.shape[1]
+    points = max(3, min(int(points), int(budget) - extra))
+    if points + extra > budget:
+        candidates, extra = None, 0
+    rows = np.arange(n)
+    min_price, max_price = price_bounds(batch)
+    usable = np.isfinite(min_price) & np.isfinite(max_price) & (max_price >= min_price)
+    lowest, highest = np.where(usable, min_price, 0.0), np.where(usable, max_price, 0.0)
+    low, high = lowest, highest
+    fraction = np.linspace(0.0, 1.0, points)
+
+    optimal_price = min_price.astype(float)
+    max_profit = np.full(n, -np.inf)
+    predicted_qty = np.zeros(n)
+    evaluated = np.zeros(n, dtype=np.int64)
+    skipped = np.zeros(n, dtype=np.int64)
+    while n:
+        prices = low[:, None] + (high - low)[:, None] * fraction
+        if candidates is not None:
+            prices = np.concatenate([prices, candidates], axis=1)
+        with np.errstate(invalid='ignore', over='ignore'):
+            prediction = predict(rows, prices)
+            qty = np.where(prediction > MIN_QTY, prediction, MIN_QTY)
+            profit = (prices * qty) - (batch.cogs[:, None] * qty) - (batch.freight[:, None] * qty)
+        in_range = usable[:, None] & np.isfinite(prices)
+        valid = in_range & np.isfinite(qty) & np.isfinite(profit)
+        evaluated += in_range.sum(axis=1)
+        skipped += in_range.sum(axis=1) - valid.sum(axis=1)
+        candidates = None
+
+        best = np.argmax(np.where(valid, profit, -np.inf), axis=1)
+        better = valid.any(axis=1) & (profit[rows, best] > max_profit)
+        optimal_price = np.where(better, prices[rows, best], optimal_price)
+        max_profit = np.where(better, profit[rows, best], max_profit)
+        predicted_qty = np.where(better, qty[rows, best], predicted_qty)
+
+        spacing = (high - low) / (points - 1)
+        if spacing.max() <= tolerance or evaluated.max() + points > budget:
+            break
+        center = np.where(np.isfinite(max_profit), optimal_price, (low + high) / 2)
+        low = np.maximum(lowest, center - spacing)
+        high = np.minimum(highest, center + spacing)
+
+    return PriceResult(optimal_price, max_profit, predicted_qty, evaluated, skipped)
+
+
+def optimize_search(model: CompiledModel, batch: ItemBatch, demand: tuple = None,
+                    tolerance: float = SEARCH_TOLERANCE, budget: int = SEARCH_BUDGET) -> PriceResult:
+    """
+    ``search_prices`` over the Ridge demand lines.
+
+    The cents around each line's profit vertex join the first round, so an
+    interior peak narrower than the coarse spacing is not missed.
+    """
+    intercept, slope = demand if demand is not None else linear_demand(model, batch)
+    min_price, max_price = price_bounds(batch)
+    vertex = np.stack(vertex_cents(intercept, slope, batch, min_price, max_price), axis=1)
+    return search_prices(lambda rows, prices: intercept[rows, None] + slope[rows, None] * prices,
+                         batch, tolerance, budget, candidates=vertex)
+
+
+# Price search strategies selectable per request
+SOLVERS = {
+    'grid': optimize_grid,
+    'exact': optimize_exact,
+    'search': optimize_search,
+}
+
+
+def optimize(model: CompiledModel, batch: ItemBatch, solver: str = 'grid',
+             timings: dict = None, demand: tuple = None, **options) -> PriceResult:
+    """
+    Run the named price search over a batch.
+
+    If ``timings`` is given, the seconds spent building the demand lines
+    ('features') and searching prices ('search') are stored in it.
+    ``demand`` may pass precomputed lines (e.g. ``linear_demand_by_category``).
+    ``options`` go to the solver (``tolerance`` and ``budget`` for "search").
+    """
+    start = time.perf_counter()
+    if demand is None:
+        demand = linear_demand(model, batch)
+    searched = time.perf_counter()
+    result = SOLVERS[solver](model, batch, demand=demand, **options)
+    if timings is not None:
+        timings['features'] = searched - start
+        timings['search'] = time.perf_counter() - searched
+    return result
+
+
+def profit_curve(model: CompiledModel, batch: ItemBatch, points: int = 200,
+                 step: float = PRICE_STEP) -> tuple:
+    """
+    Sampled ``(prices, qty, profit)`` over the search grid of the first item.
+
+    At most ``points`` evenly spaced grid prices are kept (always including
+    both ends); non-finite points are dropped like in the search.
+    """
+    first = ItemBatch(*(values[:1] for values in batch))
+    intercept, slope = linear_demand(model, first)
+    min_price, max_price = price_bounds(first)
+    prices, in_range = price_grid(min_price[:1], max_price[:1], step)
+    prices = prices[0][in_range[0]]
+    if prices.size > points:
+        prices = prices[np.unique(np.linspace(0, prices.size - 1, max(points, 2)).round().astype(int))]
+
+    with np.errstate(invalid='ignore', over='ignore'):
+        prediction = intercept[0] + slope[0] * prices
+        qty = np.where(prediction > MIN_QTY, prediction, MIN_QTY)
+        profit = (prices * qty) - (batch.cogs[0] * qty) - (batch.freight[0] * qty)
+    valid = np.isfinite(qty) & np.isfinite(profit)
+    return prices[valid], qty[valid], profit[valid]
+
+
+class EnsembleSummary(NamedTuple):
+    """Spread of the ensemble's predictions for one item"""
+    members: int
+    qty_low: float
+    qty_high: float
+    profit_low: float
+    profit_high: float
+    risk_price: float
+    risk_profit: float
+
+
+def ensemble_demand(ensemble: CompiledEnsemble, batch: ItemBatch) -> tuple:
+    """
+    ``(intercept, slope)`` of every member's demand line, shape ``(members, items)``.
+
+    All members are evaluated with one matrix product per term.
+    """
+    x0, x1 = feature_terms(batch)
+    lookup = {name: index for index, name in enumerate(ensemble.categories)}
+    names, inverse = np.unique(batch.category.astype(str), return_inverse=True)
+    # Unknown categories read the extra zero column (baseline)
+    columns = np.array([lookup.get(name.lower(), len(lookup)) for name in names], dtype=np.intp)
+    category_weights = np.hstack([ensemble.category_weights, np.zeros((len(ensemble.bias), 1))])
+    intercept = ensemble.weights @ x0 + ensemble.bias[:, None] + category_weights[:, columns[inverse.reshape(-1)]]
+    return intercept, ensemble.weights @ x1
+
+
+def ensemble_summary(model: CompiledModel, batch: ItemBatch, price: float, level: float = 0.9,
+                     step: float = PRICE_STEP) -> EnsembleSummary:
+    """
+    Central ``level`` intervals of quantity and profit at ``price`` across
+    the ensemble members, for the first item of ``batch``.
+
+    The risk-adjusted price maximizes the lower end of the profit interval
+    over the search grid, i.e. the profit the item reaches in all but the
+    worst ``(1 - level) / 2`` of members (NaN when the grid is empty).
+    """
+    first = ItemBatch(*(values[:1] for values in batch))
+    intercept, slope = ensemble_demand(model.ensemble, first)
+    low, high = (1 - level) / 2, (1 + level) / 2
+    with np.errstate(invalid='ignore', over='ignore'):
+        prediction = intercept[:, 0] + slope[:, 0] * price
+        qty = np.where(prediction > MIN_QTY, prediction, MIN_QTY)
+        profit = (price * qty) - (first.cogs[0] * qty) - (first.freight[0] * qty)
+        qty_low, qty_high = np.quantile(qty, [low, high])
+        profit_low, profit_high = np.quantile(profit, [low, high])
+
+        min_price, max_price = price_bounds(first)
+        prices, in_range = price_grid(min_price, max_price, step)
+        prices = prices[0][in_range[0]]
+        grid_prediction = intercept[:, :1] + slope[:, :1] * prices
+        grid_qty = np.where(grid_prediction > MIN_QTY, grid_prediction, MIN_QTY)
+        grid_profit = (prices * grid_qty) - (first.cogs[0] * grid_qty) - (first.freight[0] * grid_qty)
+        floor = np.quantile(grid_profit, low, axis=0) if prices.size else np.zeros(0)
+
+    finite = np.isfinite(floor)
+    if finite.any():
+        best = int(np.argmax(np.where(finite, floor, -np.inf)))
+        risk_price, risk_profit = float(prices[best]), float(floor[best])
+    else:
+        risk_price = risk_profit = float('nan')
+    return EnsembleSummary(
+        len(intercept), float(qty_low), float(qty_high), float(profit_low), float(profit_high),
+        risk_price, risk_profit,
+    )
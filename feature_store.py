@@ -0,0 +1,261 @@
+"""
+Latest feature snapshot per product, served from arrays.
+
+The store reads a sales export shaped like retail_price.csv, keeps the most
+recent month of every ``product_id`` and holds the result as one array per
+optimization input plus a hash index from id to row, so a batch of ids is
+resolved in one vectorized lookup. The export has no cost column: ``cogs``
+is taken from a ``cogs`` column when the source has one and is otherwise
+left missing (NaN) for requests to supply.
+
+With a snapshot path the compiled features are also written there in the
+FPO1 format (see columnar.py) and served memory-mapped from it, so several
+processes share one copy and a restart skips the CSV. Refreshes build a
+complete new snapshot and swap it in with a single assignment; readers keep
+the snapshot they got from ``get()`` for the whole request.
+"""
+from datetime import datetime, timezone
+from typing import NamedTuple, Optional
+import hashlib
+import logging
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from columnar import Dictionary, decode, encode
+from engine import NUMERIC_FIELDS, ItemBatch
+
+logger = logging.getLogger(__name__)
+
+# Source columns of each stored field
+SOURCE_COLUMNS = {
+    'category': 'product_category_name',
+    'freight': 'freight_price',
+    'comp1': 'comp_1',
+    'comp2': 'comp_2',
+    'comp3': 'comp_3',
+    'score': 'product_score',
+    'customers': 'customers',
+    'price': 'unit_price',
+}
+ID_COLUMN = 'product_id'
+DATE_COLUMN = 'month_year'
+DATE_FORMAT = '%d/%m/%Y'
+COST_COLUMN = 'cogs'
+
+
+class FeatureSnapshot(NamedTuple):
+    """Features of every product as of its latest month"""
+    version: str
+    source: str
+    loaded_at: str
+    ids: np.ndarray
+    index: pd.Index
+    month: np.ndarray
+    price: np.ndarray
+    features: ItemBatch
+    memory_mapped: bool
+
+    def lookup(self, product_ids) -> np.ndarray:
+        """Row of every id (``-1`` for unknown ids)"""
+        return self.index.get_indexer(pd.Index(np.asarray(product_ids, dtype=object)))
+
+    def take(self, rows: np.ndarray) -> ItemBatch:
+        """Feature batch of ``rows`` (unknown ``-1`` rows get placeholder values)"""
+        if not len(self.ids):
+            return ItemBatch(np.full(len(rows), '', dtype=object), *(np.zeros(len(rows)) for _ in NUMERIC_FIELDS))
+        safe = np.where(rows >= 0, rows, 0)
+        return ItemBatch(*(values[safe] for values in self.features))
+
+
+def read_latest(path: str, chunksize: int = 200_000) -> pd.DataFrame:
+    """
+    Latest row of every product in the CSV at ``path``.
+
+    The file is streamed in chunks; only the most recent month seen for
+    each product survives a chunk, so memory follows the product count.
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    columns = [ID_COLUMN, DATE_COLUMN, *SOURCE_COLUMNS.values()]
+    if COST_COLUMN in header:
+        columns.append(COST_COLUMN)
+    dtypes = {name: 'float64' for name in columns}
+    dtypes.update({ID_COLUMN: 'str', DATE_COLUMN: 'category', SOURCE_COLUMNS['category']: 'category'})
+
+    latest = None
+    for chunk in pd.read_csv(path, usecols=columns, dtype=dtypes, chunksize=chunksize):
+        dates = chunk[DATE_COLUMN].cat
+        parsed = pd.to_datetime(dates.categories, format=DATE_FORMAT).values.astype('datetime64[M]')
+        chunk = chunk.assign(**{DATE_COLUMN: parsed[dates.codes.to_numpy()]})
+        chunk[SOURCE_COLUMNS['category']] = chunk[SOURCE_COLUMNS['category']].astype(str)
+        if latest is not None:
+            chunk = pd.concat([latest, chunk], ignore_index=True)
+        # Stable sort keeps the later row of two with the same month
+        chunk = chunk.sort_values(DATE_COLUMN, kind='stable')
+        latest = chunk.drop_duplicates(ID_COLUMN, keep='last')
+    if latest is None:
+        latest = pd.DataFrame(columns=columns)
+    return latest.sort_values(ID_COLUMN, kind='stable').reset_index(drop=True)
+
+
+def build_snapshot(frame: pd.DataFrame, source: str, version: Optional[str] = None) -> FeatureSnapshot:
+    """Array-backed snapshot of a frame from ``read_latest``"""
+    ids = frame[ID_COLUMN].to_numpy(dtype=object)
+    columns = {'category': frame[SOURCE_COLUMNS['category']].to_numpy(dtype=object)}
+    cost = frame[COST_COLUMN] if COST_COLUMN in frame else pd.Series(np.nan, index=frame.index)
+    columns['cogs'] = cost.to_numpy(dtype=float)
+    for field in NUMERIC_FIELDS:
+        if field != 'cogs':
+            columns[field] = frame[SOURCE_COLUMNS[field]].to_numpy(dtype=float)
+    month = frame[DATE_COLUMN].to_numpy().astype('datetime64[M]')
+    price = frame[SOURCE_COLUMNS['price']].to_numpy(dtype=float)
+    if version is None:
+        digest = hashlib.sha256(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes()).hexdigest()
+        version = digest[:12]
+    return FeatureSnapshot(
+        version, source, datetime.now(timezone.utc).isoformat(timespec='seconds'), ids, pd.Index(ids),
+        month, price, ItemBatch(*(columns[field] for field in ItemBatch._fields)), False,
+    )
+
+
+def write_snapshot(snapshot: FeatureSnapshot, path: str):
+    """Write ``snapshot`` as an FPO1 file, atomically"""
+    columns = {'product_id': snapshot.ids, **snapshot.features._asdict()}
+    columns['month'] = snapshot.month.astype('datetime64[M]').astype(np.int64)
+    columns['price'] = snapshot.price
+    meta = {'version': snapshot.version, 'source': snapshot.source}
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = os.path.join(directory, f".{os.path.basename(path)}.{os.getpid()}.tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(encode(columns, meta))
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(path: str) -> FeatureSnapshot:
+    """Memory-map an FPO1 snapshot file; numeric columns stay on disk until read"""
+    payload = decode(np.memmap(path, dtype=np.uint8, mode='r'))
+    columns = payload.columns
+
+    def text(column: Dictionary) -> np.ndarray:
+        return np.array(column.values, dtype=object)[np.asarray(column.codes)]
+
+    ids = text(columns['product_id'])
+    features = ItemBatch(text(columns['category']), *(columns[field] for field in NUMERIC_FIELDS))
+    return FeatureSnapshot(
+        payload.meta.get('version', ''), payload.meta.get('source', path),
+        datetime.now(timezone.utc).isoformat(timespec='seconds'), ids, pd.Index(ids),
+        np.asarray(columns['month']).astype('datetime64[M]'), columns['price'], features, True,
+    )
+
+
+class FeatureStore:
+    """
+    Holds the active feature snapshot and refreshes it when the source changes.
+
+    ``path`` is the CSV export; with ``snapshot_path`` every refresh also
+    rewrites that file and serves the memory-mapped copy. When only the
+    snapshot file exists (e.g. it was built by another process), it is
+    served as is.
+    """
+
+    def __init__(self, path: str, snapshot_path: Optional[str] = None):
+        self.path = path
+        self.snapshot_path = snapshot_path
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._file_state = None
+        self._active = None
+
+    @property
+    def enabled(self) -> bool:
+        return os.path.exists(self.path) or bool(self.snapshot_path and os.path.exists(self.snapshot_path))
+
+    def get(self) -> FeatureSnapshot:
+        """Return the active snapshot, loading it on first use"""
+        if self._active is None:
+            self.refresh()
+        return self._active
+
+    def refresh(self) -> bool:
+        """
+        Rebuild the snapshot from the source and swap it in.
+
+        Returns True if the version changed. A failed refresh raises and
+        leaves the current snapshot in place.
+        """
+        with self._lock:
+            self._file_state = self._stat()
+            if os.path.exists(self.path):
+                snapshot = build_snapshot(read_latest(self.path), self.path)
+                if self.snapshot_path:
+                    # Workers sharing the file only rewrite it when the features changed
+                    existing = load_snapshot(self.snapshot_path) if os.path.exists(self.snapshot_path) else None
+                    if existing is None or existing.version != snapshot.version:
+                        write_snapshot(snapshot, self.snapshot_path)
+                        existing = load_snapshot(self.snapshot_path)
+                    snapshot = existing
+            elif self.snapshot_path and os.path.exists(self.snapshot_path):
+                snapshot = load_snapshot(self.snapshot_path)
+            else:
+                raise FileNotFoundError(f"No feature source at {self.path}")
+            changed = self._active is None or snapshot.version != self._active.version
+            if changed:
+                self._active = snapshot
+        if changed:
+            logger.info("Activated feature snapshot %s (%d products)", snapshot.version, len(snapshot.ids))
+        return changed
+
+    def stats(self) -> dict:
+        snapshot = self._active
+        if snapshot is None:
+            return {"loaded": False, "source": self.path}
+        return {
+            "loaded": True,
+            "version": snapshot.version,
+            "source": snapshot.source,
+            "loaded_at": snapshot.loaded_at,
+            "products": len(snapshot.ids),
+            "latest_month": str(snapshot.month.max()) if len(snapshot.month) else None,
+            "memory_mapped": snapshot.memory_mapped,
+        }
+
+    def start_watching(self, interval: float):
+        """Poll the source every ``interval`` seconds in the background"""
+        if interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._watch, args=(interval,), name="feature-watcher", daemon=True
+        )
+        self._thread.start()
+
+    def stop_watching(self):
+        """Stop the background watcher"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _stat(self):
+        path = self.path if os.path.exists(self.path) else self.snapshot_path
+        try:
+            stat = os.stat(path)
+        except (FileNotFoundError, TypeError):
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _watch(self, interval: float):
+        while not self._stop.wait(interval):
+            state = self._stat()
+            if state is None or state == self._file_state:
+                continue
+            try:
+                self.refresh()
+            except Exception:
+                # Keep serving the current snapshot; retry on the next change
+                self._file_state = state
+                logger.exception("Failed to refresh features from %s", self.path)
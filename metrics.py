@@ -0,0 +1,197 @@
+"""
+Minimal Prometheus metrics for the API (text exposition format 0.0.4).
+
+Recording is a dict lookup plus a couple of integer additions under a lock,
+so it is cheap enough to run on every request. Values derived from other
+components (cache, compute pool, model) are read only when /metrics is
+scraped.
+"""
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Optional
+import threading
+import time
+
+# Latency buckets in seconds, from sub-millisecond engine stages to slow batches
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        names = self.labelnames + ("le",)
+        for labels, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield f"{self.name}_bucket", _format_labels(names, labels + (le,)), cumulative
+            yield f"{self.name}_sum", _format_labels(self.labelnames, labels), total
+            yield f"{self.name}_count", _format_labels(self.labelnames, labels), cumulative
+
+
+class Callback:
+    """Gauge or counter whose samples are computed at scrape time"""
+
+    def __init__(self, name: str, help: str, fn: Callable, labelnames=(), kind: str = "gauge"):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labelnames = tuple(labelnames)
+        self.kind = kind
+
+    def samples(self):
+        value = self.fn()
+        if not self.labelnames:
+            yield self.name, "", value
+            return
+        for labels, sample in value:
+            yield self.name, _format_labels(self.labelnames, labels), sample
+
+
+class Registry:
+    """Collection of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labelnames=()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def callback(self, name: str, help: str, fn: Callable, labelnames=(), kind: str = "gauge") -> Callback:
+        return self.register(Callback(name, help, fn, labelnames, kind))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {float(value)!r}")
+        return "\n".join(lines) + "\n"
+
+
+# Per-request timestamps shared between the middleware and the handlers
+_marks: ContextVar[Optional[dict]] = ContextVar("request_marks", default=None)
+
+
+def mark(name: str):
+    """Record a timestamp for the current request (no-op outside requests)"""
+    marks = _marks.get()
+    if marks is not None:
+        marks[name] = time.perf_counter()
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing every request per route.
+
+    Handlers call ``mark("handler_start")`` and ``mark("handler_end")``;
+    the time before the handler starts is reported as the ``validation``
+    stage (body parsing and Pydantic validation) and the time between the
+    handler returning and the response starting as ``serialization``.
+    """
+
+    def __init__(self, app, requests: Counter, latency: Histogram, stages: Histogram):
+        self.app = app
+        self.requests = requests
+        self.latency = latency
+        self.stages = stages
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        marks = {}
+        token = _marks.set(marks)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if "handler_end" in marks:
+                    self.stages.observe(time.perf_counter() - marks["handler_end"], "serialization")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _marks.reset(token)
+            elapsed = time.perf_counter() - start
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            self.requests.inc(1, method, path, str(status))
+            self.latency.observe(elapsed, method, path)
+            if "handler_start" in marks:
+                self.stages.observe(marks["handler_start"] - start, "validation")
@@ -0,0 +1,282 @@
+"""
+Per-category demand models, loaded on first use.
+
+A category can have its own Ridge artifact (the model_store.py format) in
+the registry directory, named after the category; ``python train.py
+--per-category models/categories`` writes them. Up front the registry only
+lists the directory. A category's artifact is read and compiled the first
+time a request needs it and then kept in an LRU bounded by an estimate of
+the memory the resident models take, so thousands of models can be
+available with only the hot ones loaded. Categories without a file are
+served by the global model.
+
+Loads run outside the lock, and concurrent misses for one category share a
+single load. A model handed out stays usable by the request holding it
+even if it is evicted meanwhile. The directory is re-listed when it
+changes (checked at most every ``refresh_interval`` seconds); resident
+models whose file was replaced are dropped and reloaded on next use.
+Artifacts are expected to be replaced atomically, as ``write_artifact``
+does.
+"""
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional
+import logging
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+from model_store import ActiveModel, activate, load_artifact
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_SUFFIX = ".json"
+
+
+def category_key(category: str) -> str:
+    """Registry key (and file name stem) of a category: lower case, file-name safe"""
+    return re.sub(r"[^a-z0-9_.-]+", "_", category.strip().lower())
+
+
+def category_path(directory: str, category: str) -> str:
+    """Artifact path of a category's model in a registry directory"""
+    return os.path.join(directory, category_key(category) + ARTIFACT_SUFFIX)
+
+
+def model_bytes(model: ActiveModel, file_size: int) -> int:
+    """
+    Estimated memory of a loaded model: its compiled arrays plus the parsed
+    artifact, taken as about four times the JSON it was read from.
+    """
+    arrays = [model.compiled.weights]
+    if model.compiled.ensemble is not None:
+        arrays.extend(value for value in model.compiled.ensemble if isinstance(value, np.ndarray))
+    return int(sum(array.nbytes for array in arrays) + 4 * file_size)
+
+
+class _Entry:
+    """A resident model and its bookkeeping"""
+
+    def __init__(self, model: ActiveModel, size: int, state: tuple, load_seconds: float):
+        self.model = model
+        self.size = size
+        self.state = state
+        self.load_seconds = load_seconds
+        self.hits = 0
+        self.used_at = time.monotonic()
+
+
+class ModelRegistry:
+    """
+    Lazily loaded per-category models in a memory-bounded LRU.
+
+    ``lookup`` answers from memory only; ``get`` and ``prefetch`` load
+    missing models (call them off the event loop). ``on_load(seconds)`` is
+    called with the duration of every cold load.
+    """
+
+    def __init__(self, directory: Optional[str], max_bytes: int = 256 << 20, refresh_interval: float = 5.0,
+                 on_load: Optional[Callable[[float], None]] = None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.refresh_interval = refresh_interval
+        self.on_load = on_load
+        self._lock = threading.Lock()
+        self._index = {}
+        self._resident = OrderedDict()
+        self._loading = {}
+        self._failed = {}
+        self._resident_bytes = 0
+        self._directory_state = None
+        self._checked_at = float("-inf")
+        self.hits = 0
+        self.misses = 0
+        self.fallbacks = 0
+        self.loads = 0
+        self.failures = 0
+        self.evictions = 0
+        self.load_seconds = 0.0
+        self.max_load_seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Re-list the directory if it changed (or ``force``); True if it did.
+
+        Resident models whose file disappeared or was replaced are dropped.
+        """
+        if not self.enabled:
+            return False
+        self._checked_at = time.monotonic()
+        state = _stat(self.directory)
+        if not force and state == self._directory_state:
+            return False
+        index = {}
+        if state is not None:
+            for name in os.listdir(self.directory):
+                if name.endswith(ARTIFACT_SUFFIX) and not name.startswith("."):
+                    path = os.path.join(self.directory, name)
+                    index[name[:-len(ARTIFACT_SUFFIX)]] = (path, _stat(path))
+        with self._lock:
+            self._directory_state = state
+            self._index = index
+            for key, entry in list(self._resident.items()):
+                if index.get(key, (None, None))[1] != entry.state:
+                    self._resident_bytes -= self._resident.pop(key).size
+            self._failed = {
+                key: failed for key, failed in self._failed.items() if index.get(key, (None, None))[1] == failed
+            }
+        return True
+
+    def lookup(self, category: str) -> tuple:
+        """
+        ``(available, model)`` without any I/O.
+
+        ``available`` tells whether the category has a model file; ``model``
+        is None unless that model is resident (then it counts as a hit).
+        """
+        self._maybe_refresh()
+        key = category_key(category)
+        with self._lock:
+            entry = self._resident.get(key)
+            if entry is not None:
+                self._touch(key, entry)
+                return True, entry.model
+            if key not in self._index or key in self._failed:
+                self.fallbacks += 1
+                return False, None
+        return True, None
+
+    def get(self, category: str) -> Optional[ActiveModel]:
+        """The category's model, loading it if needed; None if it has none"""
+        self._maybe_refresh()
+        return self._get(category_key(category))
+
+    def prefetch(self, categories: Iterable[str]) -> Dict[str, Optional[ActiveModel]]:
+        """
+        Models of every distinct category in ``categories`` (None where the
+        global model applies), loading all the missing ones up front.
+        """
+        self._maybe_refresh()
+        models = {}
+        for category in categories:
+            if category not in models:
+                models[category] = self._get(category_key(category))
+        return models
+
+    def stats(self, detail: bool = False) -> dict:
+        """Counters, cold-load latency and residency; ``detail`` lists the resident models"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                "enabled": self.enabled,
+                "directory": self.directory,
+                "available": len(self._index),
+                "resident": len(self._resident),
+                "resident_bytes": self._resident_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "fallbacks": self.fallbacks,
+                "loads": self.loads,
+                "failures": self.failures,
+                "evictions": self.evictions,
+                "cold_load_ms": {
+                    "mean": round(self.load_seconds / self.loads * 1000, 3) if self.loads else None,
+                    "max": round(self.max_load_seconds * 1000, 3) if self.loads else None,
+                },
+            }
+            if detail:
+                now = time.monotonic()
+                # Most recently used first
+                stats["models"] = [
+                    {
+                        "category": key,
+                        "version": entry.model.version,
+                        "bytes": entry.size,
+                        "hits": entry.hits,
+                        "load_ms": round(entry.load_seconds * 1000, 3),
+                        "idle_seconds": round(now - entry.used_at, 3),
+                    }
+                    for key, entry in reversed(self._resident.items())
+                ]
+        return stats
+
+    def _maybe_refresh(self):
+        if self.enabled and time.monotonic() - self._checked_at >= self.refresh_interval:
+            try:
+                self.refresh()
+            except OSError:
+                logger.exception("Failed to list category models in %s", self.directory)
+
+    def _touch(self, key: str, entry: _Entry):
+        self._resident.move_to_end(key)
+        entry.hits += 1
+        entry.used_at = time.monotonic()
+        self.hits += 1
+
+    def _get(self, key: str) -> Optional[ActiveModel]:
+        while True:
+            with self._lock:
+                entry = self._resident.get(key)
+                if entry is not None:
+                    self._touch(key, entry)
+                    return entry.model
+                if key not in self._index or key in self._failed:
+                    self.fallbacks += 1
+                    return None
+                loading = self._loading.get(key)
+                if loading is None:
+                    loading = self._loading[key] = threading.Event()
+                    path, state = self._index[key]
+                    self.misses += 1
+                    break
+            # Another thread is loading this category; use its result
+            loading.wait()
+
+        started = time.perf_counter()
+        try:
+            model = activate(load_artifact(path))
+            size = model_bytes(model, state[2] if state else 0)
+        except Exception:
+            logger.exception("Failed to load category model %s", path)
+            with self._lock:
+                self.failures += 1
+                self._failed[key] = state
+                del self._loading[key]
+            loading.set()
+            return None
+        seconds = time.perf_counter() - started
+
+        with self._lock:
+            entry = _Entry(model, size, state, seconds)
+            entry.hits = 1
+            self._resident[key] = entry
+            self._resident_bytes += size
+            self.loads += 1
+            self.load_seconds += seconds
+            self.max_load_seconds = max(self.max_load_seconds, seconds)
+            # The newest model stays even if it alone exceeds the budget
+            while self._resident_bytes > self.max_bytes and len(self._resident) > 1:
+                _, evicted = self._resident.popitem(last=False)
+                self._resident_bytes -= evicted.size
+                self.evictions += 1
+            del self._loading[key]
+        loading.set()
+        if self.on_load is not None:
+            self.on_load(seconds)
+        return model
+
+
+def _stat(path: str) -> Optional[tuple]:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
@@ -0,0 +1,215 @@
+"""
+Versioned demand model artifacts and hot reloading for the API.
+
+Training writes a compact JSON artifact (feature order, coefficients,
+scaler statistics, categories and metrics). The API compiles it once into
+the engine's array form and swaps it in atomically when a new version is
+written, without pausing requests that are already being served.
+"""
+from datetime import datetime, timezone
+from typing import Callable, NamedTuple, Optional
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+from engine import FEATURE_NAMES, CompiledModel, compile_ensemble, compile_model
+
+ARTIFACT_FORMAT = 1
+
+logger = logging.getLogger(__name__)
+
+
+class ActiveModel(NamedTuple):
+    """A loaded artifact together with its compiled form"""
+    version: str
+    artifact: dict
+    compiled: CompiledModel
+    coefficients: dict
+    scaler_params: dict
+
+
+def write_artifact(path: str, intercept: float, coefficients, means, scales,
+                   categories, category_coefficients, metrics: Optional[dict] = None,
+                   features=FEATURE_NAMES, version: Optional[str] = None,
+                   ensemble: Optional[dict] = None) -> dict:
+    """
+    Write a model artifact atomically and return it.
+
+    ``categories`` lists every category with the baseline (dropped dummy)
+    first. ``ensemble`` optionally holds bootstrap members in the same
+    scaled space: ``intercepts`` (one per member), ``coefficients`` and
+    ``category_coefficients`` (one row per member).
+
+    The version defaults to a UTC timestamp plus a content hash, so
+    retraining on the same data twice still yields distinct versions. The
+    file is written next to ``path`` and renamed into place, so readers
+    never observe a partial artifact.
+    """
+    artifact = {
+        "format": ARTIFACT_FORMAT,
+        "model": "ridge",
+        "features": list(features),
+        "intercept": float(intercept),
+        "coefficients": [float(value) for value in coefficients],
+        "means": [float(value) for value in means],
+        "scales": [float(value) for value in scales],
+        "categories": list(categories),
+        "category_coefficients": [float(value) for value in category_coefficients],
+        "metrics": dict(metrics or {}),
+    }
+    if ensemble is not None:
+        artifact["ensemble"] = {
+            key: np.asarray(ensemble[key], dtype=float).tolist()
+            for key in ("intercepts", "coefficients", "category_coefficients")
+        }
+    digest = hashlib.sha256(json.dumps(artifact, sort_keys=True).encode()).hexdigest()[:8]
+    now = datetime.now(timezone.utc)
+    artifact["version"] = version or f"{now:%Y%m%d%H%M%S}-{digest}"
+    artifact["created_at"] = now.isoformat(timespec="seconds")
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = os.path.join(directory, f".{os.path.basename(path)}.{os.getpid()}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(artifact, f, indent=2)
+    os.replace(tmp_path, path)
+    return artifact
+
+
+def load_artifact(path: str) -> dict:
+    """Read and validate a model artifact"""
+    with open(path) as f:
+        artifact = json.load(f)
+
+    if artifact.get("format") != ARTIFACT_FORMAT:
+        raise ValueError(f"Unsupported model artifact format: {artifact.get('format')!r}")
+    missing = set(FEATURE_NAMES) - set(artifact["features"])
+    if missing:
+        raise ValueError(f"Model artifact is missing features: {', '.join(sorted(missing))}")
+    for key in ("coefficients", "means", "scales"):
+        if len(artifact[key]) != len(artifact["features"]):
+            raise ValueError(f"Model artifact field '{key}' does not match the feature list")
+    if len(artifact["categories"]) != len(artifact["category_coefficients"]):
+        raise ValueError("Model artifact category coefficients do not match the categories")
+    ensemble = artifact.get("ensemble")
+    if ensemble is not None:
+        members = len(ensemble["intercepts"])
+        shapes = {
+            "coefficients": (members, len(artifact["features"])),
+            "category_coefficients": (members, len(artifact["categories"])),
+        }
+        for key, shape in shapes.items():
+            if np.shape(ensemble[key]) != shape:
+                raise ValueError(f"Model artifact ensemble field '{key}' should have shape {shape}")
+    return artifact
+
+
+def activate(artifact: dict) -> ActiveModel:
+    """Compile an artifact into the form served by the API"""
+    coefficients = {"intercept": artifact["intercept"]}
+    scaler_params = {}
+    for name, coef, mean, scale in zip(artifact["features"], artifact["coefficients"],
+                                       artifact["means"], artifact["scales"]):
+        coefficients[name] = coef
+        scaler_params[name] = {"mean": mean, "std": scale}
+    for name, coef in zip(artifact["categories"], artifact["category_coefficients"]):
+        coefficients[f"cat_{name}"] = coef
+
+    compiled = compile_model(coefficients, scaler_params, artifact["version"])
+    ensemble = artifact.get("ensemble")
+    if ensemble is not None:
+        order = [artifact["features"].index(name) for name in FEATURE_NAMES]
+        compiled = compiled._replace(ensemble=compile_ensemble(
+            ensemble["intercepts"],
+            np.asarray(ensemble["coefficients"])[:, order],
+            np.asarray(artifact["means"])[order],
+            np.asarray(artifact["scales"])[order],
+            artifact["categories"],
+            ensemble["category_coefficients"],
+        ))
+    return ActiveModel(artifact["version"], artifact, compiled, coefficients, scaler_params)
+
+
+class ModelStore:
+    """
+    Holds the active model and hot-swaps it when the artifact file changes.
+
+    Readers call ``get()`` once per request and keep using that snapshot,
+    so a swap never mixes two model versions within one computation.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._stop = threading.Event()
+        self._thread = None
+        self._file_state = self._stat()
+        self._active = activate(load_artifact(path))
+
+    def get(self) -> ActiveModel:
+        """Return the active model"""
+        return self._active
+
+    def add_listener(self, callback: Callable[[ActiveModel], None]):
+        """Call ``callback(new_model)`` after every model swap"""
+        self._listeners.append(callback)
+
+    def reload(self) -> bool:
+        """
+        Load the artifact from disk and swap it in if its version changed.
+
+        Returns True if a new version became active. A broken artifact
+        raises and leaves the current model in place.
+        """
+        with self._lock:
+            self._file_state = self._stat()
+            model = activate(load_artifact(self.path))
+            if model.version == self._active.version:
+                return False
+            self._active = model
+
+        logger.info("Activated demand model version %s", model.version)
+        for callback in self._listeners:
+            callback(model)
+        return True
+
+    def start_watching(self, interval: float):
+        """Poll the artifact file every ``interval`` seconds in the background"""
+        if interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._watch, args=(interval,), name="model-watcher", daemon=True
+        )
+        self._thread.start()
+
+    def stop_watching(self):
+        """Stop the background watcher"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _watch(self, interval: float):
+        while not self._stop.wait(interval):
+            state = self._stat()
+            if state is None or state == self._file_state:
+                continue
+            try:
+                self.reload()
+            except Exception:
+                # Keep serving the current model; retry on the next change
+                self._file_state = state
+                logger.exception("Failed to reload model artifact %s", self.path)
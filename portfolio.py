@@ -0,0 +1,245 @@
+"""
+Joint pricing of many items under catalog-wide business rules.
+
+Supported constraints:
+
+- per-category price index bounds, where an item's index is the mean of its
+  ``price / comp`` ratios (the model's price_ratio features) and a
+  category's index is the mean over its items;
+- a maximum number of price changes against the current prices;
+- price floors and ceilings per item, and a maximum relative change.
+
+The index constraints are handled by Lagrangian relaxation: with one
+multiplier per category, every item is solved on its own in closed form
+for ``profit - mu * price``, and the multipliers are found by bisection
+for all categories at once. Each evaluation is a handful of vectorized
+array passes, so 100k items solve in well under a second per pass.
+The change limit keeps the items whose re-pricing gains the most.
+"""
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from engine import MIN_QTY, CompiledModel, ItemBatch, linear_demand, price_bounds
+
+# Limit on bracketing and bisection steps per multiplier
+BISECTION_STEPS = 60
+# Bisection stops once every bracket is this narrow relative to its multiplier
+BISECTION_TOLERANCE = 1e-6
+# Rounds of re-selecting the changed items when max_changes is set
+SELECTION_ROUNDS = 3
+# Price differences below half a cent do not count as a change
+CHANGE_TOLERANCE = 0.005
+
+
+class PortfolioConstraints(NamedTuple):
+    """
+    Catalog-wide rules.
+
+    ``index_bounds`` maps lower-case category names (or ``"*"`` for every
+    other category) to ``(min_index, max_index)``, either side None.
+    """
+    index_bounds: dict = {}
+    max_changes: Optional[int] = None
+    max_price_change: Optional[float] = None
+
+
+class PortfolioResult(NamedTuple):
+    """Chosen price of every item plus per-category and total figures"""
+    price: np.ndarray
+    profit: np.ndarray
+    qty: np.ndarray
+    changed: np.ndarray
+    categories: list
+    category_index: np.ndarray
+    multipliers: np.ndarray
+    feasible: np.ndarray
+    unconstrained_profit: float
+
+
+def index_weights(batch: ItemBatch) -> np.ndarray:
+    """
+    Per-item factor ``r`` with index ``= r * price``.
+
+    ``r`` is the mean of ``1 / comp`` over positive competitor prices;
+    items without any have ``r = 0`` and are left out of the index.
+    """
+    comps = np.stack([batch.comp1, batch.comp2, batch.comp3])
+    positive = comps > 0
+    with np.errstate(divide='ignore'):
+        inverse = np.where(positive, 1.0 / np.where(positive, comps, 1.0), 0.0)
+    counts = positive.sum(axis=0)
+    return np.where(counts > 0, inverse.sum(axis=0) / np.maximum(counts, 1), 0.0)
+
+
+def item_bounds(batch: ItemBatch, floor=None, ceiling=None, current=None,
+                max_price_change: Optional[float] = None) -> tuple:
+    """Search range of every item: the engine's bounds narrowed by the rules"""
+    low, high = price_bounds(batch)
+    if floor is not None:
+        low = np.fmax(low, floor)
+    if ceiling is not None:
+        high = np.fmin(high, ceiling)
+    if max_price_change is not None and current is not None:
+        low = np.fmax(low, current * (1 - max_price_change))
+        high = np.fmin(high, current * (1 + max_price_change))
+    return low, high
+
+
+def _profit(price, intercept, slope, batch):
+    prediction = intercept + slope * price
+    qty = np.where(prediction > MIN_QTY, prediction, MIN_QTY)
+    return (price * qty) - (batch.cogs * qty) - (batch.freight * qty), qty
+
+
+def solve_items(intercept, slope, batch: ItemBatch, low, high, mu) -> tuple:
+    """
+    Maximize ``profit - mu * price`` for every item on ``[low, high]``.
+
+    On the unclamped part of the demand line the objective is quadratic,
+    on the clamped part linear, so the optimum is a bound, the shifted
+    vertex ``(mu + b * cost - a) / (2b)`` or the clamp kink; vertex and kink
+    are resolved to their neighbouring cents like the exact solver.
+    Returns ``(price, profit, qty)`` (price NaN where nothing is valid).
+    """
+    cost = batch.cogs + batch.freight
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        vertex = (mu + slope * cost - intercept) / (2 * slope)
+        kink = (MIN_QTY - intercept) / slope
+        candidates = [low, high]
+        for point in (vertex, kink):
+            candidates.append(np.clip(np.floor(point * 100) / 100, low, high))
+            candidates.append(np.clip(np.ceil(point * 100) / 100, low, high))
+        prices = np.stack(candidates)
+        profit, qty = _profit(prices, intercept, slope, batch)
+        objective = profit - mu * prices
+
+    valid = np.isfinite(objective) & (low <= high)
+    best = np.argmax(np.where(valid, objective, -np.inf), axis=0)
+    pick = np.arange(prices.shape[1])
+    found = valid.any(axis=0)
+    return (
+        np.where(found, prices[best, pick], np.nan),
+        np.where(found, profit[best, pick], -np.inf),
+        np.where(found, qty[best, pick], 0.0),
+    )
+
+
+def solve(model: CompiledModel, batch: ItemBatch, constraints: PortfolioConstraints,
+          current=None, floor=None, ceiling=None) -> PortfolioResult:
+    """
+    Profit-maximizing prices for all items subject to ``constraints``.
+
+    Category index bounds are met exactly whenever the item bounds allow
+    it (``feasible`` reports per category); because item profit is not
+    concave everywhere, the multiplier is taken on the feasible side of
+    the bisection, so the index may end slightly inside its bound.
+    ``max_changes`` requires ``current`` prices; items not selected keep
+    them. Items whose current price is missing or outside their bounds
+    must change and count against the limit; ValueError if they alone
+    exceed it.
+    """
+    n = batch.size
+    intercept, slope = linear_demand(model, batch)
+    low, high = item_bounds(batch, floor, ceiling, current, constraints.max_price_change)
+    # Items without a valid price range are left out of the index
+    weights = np.where(low <= high, index_weights(batch), 0.0)
+
+    names, codes = np.unique(np.char.lower(batch.category.astype(str)), return_inverse=True)
+    codes = codes.reshape(-1)
+    categories = names.tolist()
+    default = constraints.index_bounds.get('*', (None, None))
+    bounds = [constraints.index_bounds.get(name, default) for name in categories]
+    min_index = np.array([-np.inf if lo is None else lo for lo, _ in bounds])
+    max_index = np.array([np.inf if hi is None else hi for _, hi in bounds])
+    members = np.bincount(codes, weights=(weights > 0).astype(float), minlength=len(categories))
+    scale = np.where(weights > 0, weights / np.maximum(members[codes], 1), 0.0)
+    mean_scale = np.bincount(codes, weights=scale, minlength=len(categories)) / np.maximum(members, 1)
+
+    def evaluate(multipliers, item_low, item_high):
+        price, profit, qty = solve_items(intercept, slope, batch, item_low, item_high, multipliers[codes] * scale)
+        index = np.bincount(codes, weights=np.nan_to_num(price) * scale, minlength=len(categories))
+        return price, profit, qty, index
+
+    def meets(index):
+        return (index <= max_index + 1e-9) & (index >= min_index - 1e-9)
+
+    def fit_multipliers(item_low, item_high):
+        """Multipliers plus item bounds, pinned to the nearest end where a category cannot comply"""
+        zero = np.zeros(len(categories))
+        index = evaluate(zero, item_low, item_high)[3]
+        # Positive multipliers push prices down, negative ones up
+        direction = np.where(index > max_index, 1.0, np.where(index < min_index, -1.0, 0.0))
+        lowest = np.bincount(codes, weights=np.nan_to_num(item_low) * scale, minlength=len(categories))
+        highest = np.bincount(codes, weights=np.nan_to_num(item_high) * scale, minlength=len(categories))
+        pinned = ((direction > 0) & (lowest > max_index)) | ((direction < 0) & (highest < min_index))
+        if pinned.any():
+            down, up = (pinned & (direction > 0))[codes], (pinned & (direction < 0))[codes]
+            item_low, item_high = np.where(up, item_high, item_low), np.where(down, item_low, item_high)
+            direction = np.where(pinned, 0.0, direction)
+        if not direction.any():
+            return zero, item_low, item_high
+
+        # First guess: a multiplier worth one unit of profit per unit of price
+        infeasible, feasible = zero, direction / np.maximum(mean_scale, 1e-12)
+        for _ in range(BISECTION_STEPS):
+            pending = (direction != 0) & ~meets(evaluate(feasible, item_low, item_high)[3])
+            if not pending.any():
+                break
+            infeasible = np.where(pending, feasible, infeasible)
+            feasible = np.where(pending, feasible * 2, feasible)
+        for _ in range(BISECTION_STEPS):
+            if np.all(np.abs(feasible - infeasible) <= BISECTION_TOLERANCE * np.abs(feasible)):
+                break
+            middle = (feasible + infeasible) / 2
+            ok = meets(evaluate(middle, item_low, item_high)[3])
+            feasible = np.where(ok, middle, feasible)
+            infeasible = np.where(ok, infeasible, middle)
+        return np.where(direction != 0, feasible, 0.0), item_low, item_high
+
+    unconstrained_profit = evaluate(np.zeros(len(categories)), low, high)[1]
+    multipliers, item_low, item_high = fit_multipliers(low, high)
+    if constraints.max_changes is not None and constraints.max_changes < n:
+        if current is None:
+            raise ValueError("max_changes needs the current price of every item")
+        keep = np.isfinite(current) & (current >= low) & (current <= high)
+        # Items that cannot keep their current price must move and count against the limit
+        forced = ~keep & (low <= high)
+        limit = constraints.max_changes - int(forced.sum())
+        if limit < 0:
+            raise ValueError(
+                f"max_changes is {constraints.max_changes} but {int(forced.sum())} items must change "
+                "because their current price is missing or outside their bounds"
+            )
+        selected = None
+        for _ in range(SELECTION_ROUNDS):
+            mu = multipliers[codes] * scale
+            price = solve_items(intercept, slope, batch, low, high, mu)[0]
+            new_profit = _profit(price, intercept, slope, batch)[0] - mu * price
+            old_profit = _profit(current, intercept, slope, batch)[0] - mu * current
+            with np.errstate(invalid='ignore'):
+                gain = np.where(keep, new_profit - old_profit, -np.inf)
+            gain = np.where(np.isnan(gain), -np.inf, gain)
+            changed = forced.copy()
+            if limit:
+                top = np.argpartition(-gain, limit - 1)[:limit]
+                changed[top] |= gain[top] > 0
+            if selected is not None and np.array_equal(changed, selected):
+                break
+            selected = changed
+            multipliers, item_low, item_high = fit_multipliers(
+                np.where(changed, low, current), np.where(changed, high, current)
+            )
+
+    price, profit, qty, index = evaluate(multipliers, item_low, item_high)
+    if current is not None:
+        # An item without a current price changes once it gets one
+        with np.errstate(invalid='ignore'):
+            changed = ~(np.abs(price - current) < CHANGE_TOLERANCE)
+    else:
+        changed = np.ones(n, dtype=bool)
+    return PortfolioResult(
+        price, profit, qty, changed & np.isfinite(price), categories,
+        np.where(members > 0, index, np.nan), multipliers, meets(index),
+        float(unconstrained_profit[np.isfinite(unconstrained_profit)].sum()),
+    )
@@ -0,0 +1,162 @@
+"""
+Replay captured traffic and diff the responses.
+
+Reads capture files written by the API's capture mode (see capture.py) and
+sends every ``POST /optimize_price`` request again, keeping the original
+spacing between requests divided by ``--speed`` (``0`` sends them as fast
+as ``--concurrency`` allows). Each new response is compared with the
+captured one field by field; identical prices from a faster engine are the
+proof that it is a drop-in replacement.
+
+    python replay.py captures/                          # in-process app, original pace
+    python replay.py captures/ --speed 10 --target http://127.0.0.1:8001
+    python replay.py 'captures/*.jsonl.gz' --speed 0 --diff-out diffs.jsonl
+"""
+from typing import Optional
+import argparse
+import asyncio
+import contextlib
+import json
+import sys
+import time
+
+import numpy as np
+
+from capture import read_records
+
+ENDPOINT = "/optimize_price"
+
+
+def diff(expected: dict, actual: dict, tolerance: float = 0.0) -> dict:
+    """``{field: [expected, actual]}`` of every field that differs (numbers within ``tolerance`` match)"""
+    changes = {}
+    for field in sorted(set(expected) | set(actual)):
+        old, new = expected.get(field), actual.get(field)
+        if isinstance(old, (int, float)) and isinstance(new, (int, float)) and not isinstance(old, bool):
+            if abs(old - new) <= tolerance:
+                continue
+        elif old == new:
+            continue
+        changes[field] = [old, new]
+    return changes
+
+
+async def replay(records: list, target: str, speed: float = 1.0, concurrency: int = 16,
+                 tolerance: float = 0.0, on_diff=None) -> dict:
+    """
+    Send ``records`` to ``target`` ('asgi' for the in-process app, or a base URL).
+
+    ``on_diff(record, status, response, changes)`` is called for every
+    request whose status or response differs from the capture.
+    """
+    import httpx
+
+    if target == "asgi":
+        import api
+
+        # Don't capture the replay itself; the lifespan loads the demand models
+        api.capture = None
+        lifespan = api.app.router.lifespan_context(api.app)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=api.app), base_url="http://replay", timeout=120)
+    else:
+        client = httpx.AsyncClient(base_url=target, timeout=120,
+                                   limits=httpx.Limits(max_connections=concurrency))
+
+    counts = {"requests": len(records), "identical": 0, "different": 0, "failed": 0, "other_model": 0}
+    latencies = []
+    gate = asyncio.Semaphore(concurrency)
+    origin = records[0]["ts"] if records else 0.0
+
+    async def send(record: dict):
+        if speed > 0:
+            delay = start + (record["ts"] - origin) / speed - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        async with gate:
+            sent = time.perf_counter()
+            try:
+                response = await client.post(record["endpoint"], params=record.get("query") or {},
+                                             json=record["request"])
+            except httpx.HTTPError as e:
+                counts["failed"] += 1
+                if on_diff is not None:
+                    on_diff(record, None, None, {"transport": [None, str(e)]})
+                return
+            latencies.append(time.perf_counter() - sent)
+        body = response.json() if response.headers.get("content-type", "").startswith("application/json") else None
+        changes = diff(record["response"], body, tolerance) if isinstance(body, dict) else {"body": [None, body]}
+        if response.status_code != record.get("status", 200):
+            changes["status"] = [record.get("status", 200), response.status_code]
+        if changes:
+            counts["different"] += 1
+            if on_diff is not None:
+                on_diff(record, response.status_code, body, changes)
+        else:
+            counts["identical"] += 1
+
+    async with contextlib.AsyncExitStack() as stack:
+        if target == "asgi":
+            await stack.enter_async_context(lifespan)
+        await stack.enter_async_context(client)
+        current = (await client.get("/model")).json().get("version")
+        start = time.perf_counter()
+        await asyncio.gather(*(send(record) for record in records))
+    elapsed = time.perf_counter() - start
+
+    counts["other_model"] = sum(1 for record in records if record.get("model_version") != current)
+    counts["model_version"] = current
+    counts["elapsed_s"] = round(elapsed, 3)
+    counts["requests_per_sec"] = round(len(records) / elapsed, 1) if elapsed else None
+    if latencies:
+        values = np.asarray(latencies) * 1000
+        counts.update({f"p{q}_ms": round(float(np.percentile(values, q)), 3) for q in (50, 95, 99)})
+    captured = [record["duration_ms"] for record in records if "duration_ms" in record]
+    if captured:
+        counts["captured_p50_ms"] = round(float(np.percentile(captured, 50)), 3)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured /optimize_price traffic and diff the responses")
+    parser.add_argument("paths", nargs="+", help="capture files, directories or glob patterns")
+    parser.add_argument("--target", default="asgi", help="'asgi' (in-process app) or a base URL")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="replay speed relative to the capture (0 = as fast as possible)")
+    parser.add_argument("--concurrency", type=int, default=16, help="requests in flight at most")
+    parser.add_argument("--limit", type=int, help="replay only the first N requests")
+    parser.add_argument("--tolerance", type=float, default=0.0,
+                        help="numeric differences up to this much still count as identical")
+    parser.add_argument("--diff-out", help="write every differing exchange to this JSONL file")
+    parser.add_argument("--show", type=int, default=5, help="differences printed to the console")
+    args = parser.parse_args()
+
+    records = sorted(read_records(args.paths, ENDPOINT), key=lambda record: record["ts"])
+    if args.limit is not None:
+        records = records[:args.limit]
+    if not records:
+        parser.error("No captured /optimize_price requests found")
+
+    out = open(args.diff_out, "w") if args.diff_out else None
+    shown = 0
+
+    def report(record: dict, status: Optional[int], body, changes: dict):
+        nonlocal shown
+        if shown < args.show:
+            print(f"  {json.dumps(record['request'])} {json.dumps(record.get('query'))}\n    -> {json.dumps(changes)}")
+            shown += 1
+        if out is not None:
+            out.write(json.dumps({**record, "replay_status": status, "replay_response": body,
+                                  "changes": changes}) + "\n")
+
+    try:
+        counts = asyncio.run(replay(records, args.target, args.speed, args.concurrency, args.tolerance, report))
+    finally:
+        if out is not None:
+            out.close()
+    print(json.dumps(counts, indent=2))
+    if counts["different"] or counts["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Incremental catalog repricing.
+
+Reads a product snapshot (the latest month of every product in an export
+like retail_price.csv, see feature_store.py), fingerprints each product's
+optimization inputs together with the model version and solver, and
+re-optimizes only the products whose fingerprint differs from the previous
+run. Results for those products are appended to a CSV in chunks; after
+every chunk a checkpoint records how far the run got, so an interrupted run
+resumes where it stopped. When a run completes, the fingerprints of every
+product become the state that the next run compares against.
+
+Reading and hashing the snapshot is one vectorized pass over the catalog;
+optimization and output scale with the number of changed products.
+
+    python reprice.py --cogs-ratio 0.6                 # prices every product the first time
+    python reprice.py --cogs-ratio 0.6                 # then only what changed
+"""
+from typing import NamedTuple, Optional
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from columnar import decode, encode
+from engine import ItemBatch, optimize
+from feature_store import build_snapshot, read_latest
+from model_store import activate, load_artifact
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATA_PATH = os.path.join(BASE_DIR, "retail_price.csv")
+DEFAULT_MODEL_PATH = os.path.join(BASE_DIR, "models", "demand_model.json")
+DEFAULT_STATE_PATH = os.path.join(BASE_DIR, ".reprice", "state.fpo")
+DEFAULT_OUTPUT_PATH = "reprice_results.csv"
+
+OUTPUT_COLUMNS = ("product_id", "optimal_price", "max_profit", "predicted_qty", "fingerprint", "error")
+NO_VALID_PRICE_ERROR = "no valid price points"
+
+
+class Plan(NamedTuple):
+    """Products of the snapshot and which of them need re-optimizing"""
+    run_id: str
+    ids: np.ndarray
+    fingerprints: np.ndarray
+    batch: ItemBatch
+    changed: np.ndarray
+    removed: int
+
+
+def load_products(path: str, cogs_ratio: Optional[float] = None) -> tuple:
+    """
+    ``(ids, batch)`` of the latest snapshot in ``path``.
+
+    Exports without a ``cogs`` column need ``cogs_ratio``: cost is then
+    assumed to be that share of the latest unit price.
+    """
+    snapshot = build_snapshot(read_latest(path), path)
+    batch = snapshot.features
+    if np.isnan(batch.cogs).any():
+        if cogs_ratio is None:
+            raise ValueError(f"{path} has no cogs for some products; pass --cogs-ratio to derive it from unit_price")
+        cogs = np.where(np.isnan(batch.cogs), snapshot.price * cogs_ratio, batch.cogs)
+        batch = ItemBatch(batch.category, cogs, *batch[2:])
+    return snapshot.ids, batch
+
+
+def fingerprint(batch: ItemBatch, model_version: str, solver: str) -> np.ndarray:
+    """
+    64-bit hash of every item's inputs, keyed on the model version and solver.
+
+    A new model or solver therefore changes every fingerprint.
+    """
+    frame = pd.DataFrame({field: values for field, values in zip(ItemBatch._fields, batch)})
+    key = hashlib.sha256(f"{model_version}:{solver}".encode()).hexdigest()[:16]
+    return pd.util.hash_pandas_object(frame, index=False, hash_key=key).to_numpy()
+
+
+def load_state(path: str) -> pd.Series:
+    """Fingerprint of every product as of the last completed run (empty if none)"""
+    if not os.path.exists(path):
+        return pd.Series(np.array([], dtype=np.uint64), index=pd.Index([], dtype=object))
+    with open(path, "rb") as f:
+        payload = decode(f.read())
+    ids = payload.columns["product_id"]
+    ids = np.array(ids.values, dtype=object)[np.asarray(ids.codes)]
+    return pd.Series(np.array(payload.columns["fingerprint"]), index=pd.Index(ids))
+
+
+def save_state(path: str, state: pd.Series, meta: dict):
+    """Write the state file atomically"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = os.path.join(directory, f".{os.path.basename(path)}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(encode({"product_id": state.index.to_numpy(dtype=object), "fingerprint": state.to_numpy()}, meta))
+    os.replace(tmp_path, path)
+
+
+def plan(ids: np.ndarray, batch: ItemBatch, state: pd.Series, model_version: str, solver: str) -> Plan:
+    """Compare fingerprints with the state; ``run_id`` identifies this exact set of work"""
+    fingerprints = fingerprint(batch, model_version, solver)
+    positions = state.index.get_indexer(pd.Index(ids))
+    previous = state.to_numpy()[np.where(positions >= 0, positions, 0)] if len(state) else fingerprints
+    changed = np.flatnonzero((positions < 0) | (previous != fingerprints))
+    removed = int((~state.index.isin(ids)).sum())
+    digest = hashlib.sha256(model_version.encode())
+    digest.update(np.ascontiguousarray(fingerprints[changed]).tobytes())
+    return Plan(digest.hexdigest()[:16], ids, fingerprints, batch, changed, removed)
+
+
+def _write_json(path: str, data: dict):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def run(work: Plan, model, output: str, solver: str = "exact", chunk_size: int = 10_000) -> dict:
+    """
+    Optimize the changed products of ``work`` in chunks, appending to ``output``.
+
+    Progress is checkpointed in ``<output>.checkpoint`` after each chunk.
+    A checkpoint from an interrupted run with the same ``run_id`` resumes
+    after its last completed chunk (anything written after that is cut off);
+    otherwise the output starts over.
+    """
+    checkpoint_path = f"{output}.checkpoint"
+    checkpoint = None
+    if os.path.exists(checkpoint_path) and os.path.exists(output):
+        with open(checkpoint_path) as f:
+            checkpoint = json.load(f)
+        if checkpoint.get("run") != work.run_id:
+            checkpoint = None
+
+    if checkpoint is None:
+        checkpoint = {"run": work.run_id, "offset": 0, "rows": 0}
+        with open(output, "w") as f:
+            f.write(",".join(OUTPUT_COLUMNS) + "\n")
+            checkpoint["offset"] = f.tell()
+        _write_json(checkpoint_path, checkpoint)
+    resumed_rows = checkpoint["rows"]
+
+    chunks = range(checkpoint["rows"], len(work.changed), chunk_size)
+    with open(output, "r+") as f:
+        f.seek(checkpoint["offset"])
+        f.truncate()
+        for start in chunks:
+            rows = work.changed[start:start + chunk_size]
+            batch = ItemBatch(*(values[rows] for values in work.batch))
+            result = optimize(model.compiled, batch, solver)
+            found = np.isfinite(result.max_profit)
+            frame = pd.DataFrame({
+                "product_id": work.ids[rows],
+                "optimal_price": np.where(found, np.round(result.optimal_price, 2), np.nan),
+                "max_profit": np.where(found, np.round(result.max_profit, 2), np.nan),
+                "predicted_qty": np.where(found, np.round(result.predicted_qty, 2), np.nan),
+                "fingerprint": work.fingerprints[rows],
+                "error": np.where(found, "", NO_VALID_PRICE_ERROR),
+            })
+            frame.to_csv(f, header=False, index=False)
+            f.flush()
+            os.fsync(f.fileno())
+            checkpoint.update(offset=f.tell(), rows=checkpoint["rows"] + len(rows))
+            _write_json(checkpoint_path, checkpoint)
+    return {"rows": checkpoint["rows"], "resumed_rows": resumed_rows, "checkpoint": checkpoint_path}
+
+
+def finish(work: Plan, state_path: str, checkpoint_path: str, model_version: str, solver: str):
+    """Record the completed run: every product's fingerprint becomes the new state"""
+    save_state(state_path, pd.Series(work.fingerprints, index=pd.Index(work.ids)),
+               {"model_version": model_version, "solver": solver, "run": work.run_id})
+    os.remove(checkpoint_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-optimize the products whose inputs changed since the last run")
+    parser.add_argument("--data", default=DEFAULT_DATA_PATH, help="product snapshot CSV")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH, help="model artifact")
+    parser.add_argument("--state", default=DEFAULT_STATE_PATH, help="fingerprints of the last completed run")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT_PATH, help="CSV receiving this run's results")
+    parser.add_argument("--solver", choices=("grid", "exact"), default="exact")
+    parser.add_argument("--chunk-size", type=int, default=10_000, help="products per output chunk")
+    parser.add_argument("--cogs-ratio", type=float,
+                        help="cost as a share of the latest unit price, for exports without a cogs column")
+    parser.add_argument("--full", action="store_true", help="ignore the state and re-optimize every product")
+    parser.add_argument("--dry-run", action="store_true", help="report what would be re-optimized")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    model = activate(load_artifact(args.model))
+    try:
+        ids, batch = load_products(args.data, args.cogs_ratio)
+    except ValueError as e:
+        parser.error(str(e))
+    state = load_state(args.state)
+    if args.full:
+        state = state.iloc[:0]
+    work = plan(ids, batch, state, model.version, args.solver)
+    planned = time.perf_counter()
+    print(f"{len(ids)} products: {len(work.changed)} changed, {len(ids) - len(work.changed)} unchanged, "
+          f"{work.removed} removed since the last run ({planned - start:.2f}s)")
+    if args.dry_run:
+        return
+
+    progress = run(work, model, args.output, args.solver, args.chunk_size)
+    finish(work, args.state, progress["checkpoint"], model.version, args.solver)
+    resumed = f", {progress['resumed_rows']} from an earlier attempt" if progress["resumed_rows"] else ""
+    print(f"Wrote {progress['rows']} results to {args.output}{resumed} ({time.perf_counter() - planned:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Bounded in-process cache of optimization results.
+
+Keys are the normalized request inputs plus the model version and solver.
+Float inputs can be snapped to a configurable quantum so requests that only
+differ by tiny jitter share one entry; the snapped inputs are also what gets
+optimized, so a cached answer never depends on which request came first.
+"""
+from collections import OrderedDict
+from typing import Optional
+import threading
+import time
+
+# Input fields snapped to the quantum (category is matched case-insensitively)
+QUANTIZED_FIELDS = ('cogs', 'freight', 'comp1', 'comp2', 'comp3', 'score', 'customers')
+
+
+class ResultCache:
+    """LRU cache with optional TTL expiry and hit/miss/eviction counters"""
+
+    def __init__(self, max_size: int = 10000, ttl: float = 0.0, quantum: float = 0.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.quantum = quantum
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def quantize(self, value: float) -> float:
+        """Snap a float input to the cache quantum"""
+        if self.quantum <= 0:
+            return value
+        return round(value / self.quantum) * self.quantum
+
+    def normalize(self, input_data) -> dict:
+        """Inputs as optimized and cached: quantized floats, original category"""
+        values = {field: self.quantize(getattr(input_data, field)) for field in QUANTIZED_FIELDS}
+        values['category'] = input_data.category
+        return values
+
+    def key(self, model_version: str, solver: str, values: dict, *options) -> tuple:
+        """
+        Cache key for normalized inputs under a model version and solver.
+
+        ``options`` are any request options that change the response.
+        """
+        return (
+            model_version,
+            solver,
+            values['category'].lower(),
+            *(values[field] for field in QUANTIZED_FIELDS),
+            *options,
+        )
+
+    def get(self, key: tuple) -> Optional[dict]:
+        """Return the cached result for ``key`` or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, value = entry
+            if self.ttl > 0 and time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: tuple, value: dict):
+        """Store a result, evicting the least recently used entries if full"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every entry (counted as an invalidation)"""
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        """Counters and settings for the API"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "quantum": self.quantum,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,131 @@
+"""
+What-if sweeps over competitor prices, product score and customers.
+
+Scenarios are built as one ItemBatch around a base input, either as the
+Cartesian product of evenly spaced ranges or as Monte Carlo draws, and
+solved in a single broadcasted engine call. Profit elasticities with
+respect to each competitor price come from central differences solved in
+the same call.
+"""
+from typing import Dict, NamedTuple, Optional
+
+import numpy as np
+
+from engine import NUMERIC_FIELDS, CompiledModel, ItemBatch, PriceResult, optimize
+
+# Inputs a scenario may vary
+SCENARIO_FIELDS = ('comp1', 'comp2', 'comp3', 'score', 'customers')
+COMPETITOR_FIELDS = ('comp1', 'comp2', 'comp3')
+
+DISTRIBUTIONS = ('uniform', 'normal', 'triangular')
+
+# Relative change of a competitor price for the elasticity differences
+ELASTICITY_STEP = 0.01
+
+
+class SweepResult(NamedTuple):
+    """Optimum of every scenario plus profit elasticities per competitor"""
+    result: PriceResult
+    profit_elasticity: Dict[str, np.ndarray]
+    price_elasticity: Dict[str, np.ndarray]
+
+
+def grid_values(ranges: dict) -> tuple:
+    """
+    Axes and flattened Cartesian product of ``{field: (min, max, steps)}``.
+
+    Returns ``(axes, values)``: the evenly spaced points of each range and
+    one array per field with the first field varying slowest.
+    """
+    axes = {field: np.linspace(low, high, steps) for field, (low, high, steps) in ranges.items()}
+    mesh = np.meshgrid(*axes.values(), indexing='ij')
+    return axes, {field: points.ravel() for field, points in zip(axes, mesh)}
+
+
+def sample_values(distributions: dict, samples: int, seed: Optional[int] = None) -> dict:
+    """
+    Monte Carlo draws for each field.
+
+    ``distributions`` maps fields to ``("uniform", low, high)``,
+    ``("normal", mean, std)`` or ``("triangular", low, mode, high)``.
+    """
+    rng = np.random.default_rng(seed)
+    values = {}
+    for field, (kind, *params) in distributions.items():
+        if kind == 'uniform':
+            values[field] = rng.uniform(params[0], params[1], samples)
+        elif kind == 'normal':
+            values[field] = rng.normal(params[0], params[1], samples)
+        elif kind == 'triangular':
+            values[field] = rng.triangular(params[0], params[1], params[2], samples)
+        else:
+            raise ValueError(f"Unknown distribution for {field}: {kind!r}")
+    return values
+
+
+def scenario_batch(base, values: dict, count: int) -> ItemBatch:
+    """``count`` copies of ``base`` with the fields in ``values`` replaced"""
+    columns = [np.full(count, base.category, dtype=object)]
+    for field in NUMERIC_FIELDS:
+        column = values.get(field)
+        columns.append(np.full(count, float(getattr(base, field))) if column is None else np.asarray(column, float))
+    return ItemBatch(*columns)
+
+
+def _concat(batches) -> ItemBatch:
+    return ItemBatch(*(np.concatenate(columns) for columns in zip(*batches)))
+
+
+def sweep(model: CompiledModel, batch: ItemBatch, solver: str = 'exact',
+          step: float = ELASTICITY_STEP, timings: dict = None) -> SweepResult:
+    """
+    Optimize every scenario and its competitor-price sensitivities.
+
+    Each competitor price is moved by ``+-step`` (relative) and re-solved
+    with the exact solver, which is continuous in its inputs; the grid
+    search would round the optimum to its price step. The elasticity of
+    profit is ``d ln(max_profit) / d ln(comp)`` (NaN where the profit is
+    not positive), and likewise for the optimal price. ``timings`` gets the
+    seconds of both passes when ``solver`` is not "exact".
+    """
+    n = batch.size
+    perturbed = [batch]
+    for field in COMPETITOR_FIELDS:
+        column = getattr(batch, field)
+        for factor in (1 + step, 1 - step):
+            perturbed.append(batch._replace(**{field: column * factor}))
+    exact = optimize(model, _concat(perturbed), 'exact', timings)
+    if solver == 'exact':
+        result = PriceResult(*(values[:n] for values in exact))
+    else:
+        passes = {}
+        result = optimize(model, batch, solver, passes)
+        if timings is not None:
+            for stage, seconds in passes.items():
+                timings[stage] += seconds
+
+    profit_elasticity, price_elasticity = {}, {}
+    base_profit = exact.max_profit[:n]
+    base_price = exact.optimal_price[:n]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for k, field in enumerate(COMPETITOR_FIELDS):
+            up = slice((1 + 2 * k) * n, (2 + 2 * k) * n)
+            down = slice((2 + 2 * k) * n, (3 + 2 * k) * n)
+            profit_change = (exact.max_profit[up] - exact.max_profit[down]) / (2 * step)
+            price_change = (exact.optimal_price[up] - exact.optimal_price[down]) / (2 * step)
+            profit_elasticity[field] = np.where(base_profit > 0, profit_change / base_profit, np.nan)
+            price_elasticity[field] = np.where(base_price > 0, price_change / base_price, np.nan)
+    return SweepResult(result, profit_elasticity, price_elasticity)
+
+
+def summarize(values: np.ndarray, digits: int = 2) -> dict:
+    """Mean, spread and percentiles of the finite values (None where a statistic overflows)"""
+    finite = values[np.isfinite(values)]
+    names = ("mean", "std", "min", "p5", "p50", "p95", "max")
+    if not finite.size:
+        return dict.fromkeys(names)
+    with np.errstate(over='ignore', invalid='ignore'):
+        stats = (finite.mean(), finite.std(), finite.min(), *np.percentile(finite, [5, 50, 95]), finite.max())
+    return {
+        name: round(float(value), digits) if np.isfinite(value) else None for name, value in zip(names, stats)
+    }
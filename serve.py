@@ -0,0 +1,145 @@
+"""
+Production entry point: N uvicorn worker processes behind one port.
+
+The parent process loads the model artifact once, publishes it to shared
+memory and watches the artifact file; workers map the published model (see
+shared_model.py), so a reload reaches every worker at the same generation.
+
+    python serve.py --workers 4 --port 8001
+
+Measure how throughput scales with the number of workers:
+
+    python serve.py --measure-scaling 1,2,4 --duration 10
+"""
+from multiprocessing import Pool
+import argparse
+import os
+import random
+import subprocess
+import sys
+import time
+
+import requests
+import uvicorn
+
+from model_store import ModelStore
+from shared_model import SHARED_MODEL_ENV, SharedModelPublisher
+
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "demand_model.json")
+
+CATEGORIES = [
+    "bed_bath_table", "computers_accessories", "consoles_games", "cool_stuff", "furniture_decor",
+    "garden_tools", "health_beauty", "perfumery", "watches_gifts",
+]
+
+
+def serve(host: str, port: int, workers: int, model_path: str, reload_interval: float):
+    """Publish the model to shared memory and run the worker processes"""
+    store = ModelStore(model_path)
+    publisher = SharedModelPublisher()
+    publisher.publish(store.get())
+    store.add_listener(publisher.publish)
+    store.start_watching(reload_interval)
+
+    os.environ[SHARED_MODEL_ENV] = publisher.name
+    # Workers follow the shared model instead of watching the file themselves
+    os.environ["MODEL_RELOAD_INTERVAL"] = "0"
+    try:
+        uvicorn.run("api:app", host=host, port=port, workers=workers)
+    finally:
+        store.stop_watching()
+        publisher.close()
+
+
+def _random_payload(rng: random.Random) -> dict:
+    comps = [rng.uniform(20, 300) for _ in range(3)]
+    return {
+        "category": rng.choice(CATEGORIES),
+        "cogs": rng.uniform(10, 80),
+        "freight": rng.uniform(5, 30),
+        "comp1": comps[0],
+        "comp2": comps[1],
+        "comp3": comps[2],
+        "score": rng.uniform(3, 5),
+        "customers": rng.uniform(10, 200),
+    }
+
+
+def _client_loop(args) -> int:
+    """Closed-loop client: POST /optimize_price, counting after the warm-up"""
+    url, start, deadline, seed = args
+    rng = random.Random(seed)
+    session = requests.Session()
+    done = 0
+    while time.time() < deadline:
+        response = session.post(url, json=_random_payload(rng), timeout=30)
+        if response.status_code == 200 and time.time() >= start:
+            done += 1
+    return done
+
+
+def measure_scaling(worker_counts, duration: float, clients: int, port: int, warmup: float):
+    """
+    Start the server with each worker count and report requests/sec.
+
+    The warm-up period lets every worker finish starting before requests
+    are counted. The result cache is disabled so every request computes.
+    """
+    print(f"{'workers':>8} {'req/s':>10} {'speedup':>8}")
+    baseline = None
+    for workers in worker_counts:
+        env = dict(os.environ, RESULT_CACHE_SIZE="0")
+        server = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--workers", str(workers), "--port", str(port)],
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            for _ in range(100):
+                try:
+                    requests.get(base_url + "/", timeout=1)
+                    break
+                except requests.ConnectionError:
+                    time.sleep(0.2)
+            start = time.time() + warmup
+            deadline = start + duration
+            with Pool(clients) as pool:
+                done = sum(pool.map(
+                    _client_loop,
+                    [(base_url + "/optimize_price", start, deadline, seed) for seed in range(clients)],
+                ))
+        finally:
+            server.terminate()
+            server.wait()
+
+        rate = done / duration
+        baseline = baseline or rate
+        print(f"{workers:>8} {rate:>10.1f} {rate / baseline:>7.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Fashionista API with multiple worker processes")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)))
+    parser.add_argument("--model", default=os.getenv("MODEL_PATH", DEFAULT_MODEL_PATH))
+    parser.add_argument("--reload-interval", type=float, default=float(os.getenv("MODEL_RELOAD_INTERVAL", "5")))
+    parser.add_argument("--measure-scaling", metavar="COUNTS",
+                        help="comma-separated worker counts to benchmark, e.g. 1,2,4")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per measurement")
+    parser.add_argument("--warmup", type=float, default=3.0, help="seconds of uncounted load first")
+    parser.add_argument("--clients", type=int, default=2 * (os.cpu_count() or 1),
+                        help="concurrent client processes for --measure-scaling")
+    args = parser.parse_args()
+
+    if args.measure_scaling:
+        counts = [int(value) for value in args.measure_scaling.split(",")]
+        measure_scaling(counts, args.duration, args.clients, args.port, args.warmup)
+    else:
+        serve(args.host, args.port, args.workers, args.model, args.reload_interval)
+
+
+if __name__ == "__main__":
+    main()
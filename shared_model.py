@@ -0,0 +1,201 @@
+"""
+Demand model shared between worker processes through shared memory.
+
+The serving parent process compiles each model version once and writes it
+into its own shared memory segment. A small control segment names the
+current segment under a generation counter, updated seqlock-style (odd
+while it is being written). Workers map the weights straight from shared
+memory instead of loading their own copy, and pick up a new version on the
+first request after the generation changes, so every worker switches to
+the same version.
+"""
+from collections import deque
+from multiprocessing import shared_memory
+from typing import Callable
+import json
+import os
+import struct
+import threading
+
+import numpy as np
+
+from engine import CompiledEnsemble, CompiledModel
+from model_store import ActiveModel, activate
+
+# Environment variable that tells api.py workers where the model lives
+SHARED_MODEL_ENV = "FASHIONISTA_SHARED_MODEL"
+
+_CONTROL_SIZE = 256
+_HEADER = struct.Struct("<QQ")  # generation, length of the segment name
+_META = struct.Struct("<QQ")  # metadata length, number of float64 values
+
+# Old segments each worker keeps mapped while requests may still use them
+_RETAINED_SEGMENTS = 4
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Attach to an existing segment without taking ownership of it"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 has no 'track'; the creating process still unlinks it
+        return shared_memory.SharedMemory(name=name)
+
+
+class SharedModelPublisher:
+    """Owner side: writes model versions and unlinks retired segments"""
+
+    def __init__(self, name: str = None):
+        self.name = name or f"fpo_ctl_{os.getpid()}"
+        self._control = shared_memory.SharedMemory(name=self.name, create=True, size=_CONTROL_SIZE)
+        _HEADER.pack_into(self._control.buf, 0, 0, 0)
+        self._segments = deque()
+        self.generation = 0
+
+    def publish(self, model: ActiveModel):
+        """Write ``model`` into a new segment and make it current"""
+        compiled = model.compiled
+        categories = list(compiled.category_weights)
+        parts = [
+            compiled.weights,
+            [compiled.bias],
+            [compiled.category_weights[name] for name in categories],
+        ]
+        ensemble = compiled.ensemble
+        if ensemble is not None:
+            parts += [ensemble.weights.ravel(), ensemble.bias, ensemble.category_weights.ravel()]
+        values = np.concatenate(parts).astype(np.float64)
+        meta = json.dumps({
+            "artifact": {key: value for key, value in model.artifact.items() if key != "ensemble"},
+            "categories": categories,
+            "n_weights": int(compiled.weights.size),
+            "ensemble_members": 0 if ensemble is None else len(ensemble.bias),
+            "ensemble_categories": [] if ensemble is None else list(ensemble.categories),
+        }).encode()
+        offset = _META.size + (len(meta) + 7) // 8 * 8
+
+        segment_name = f"fpo_model_{os.getpid()}_{self.generation // 2 + 1}"
+        segment = shared_memory.SharedMemory(
+            name=segment_name, create=True, size=offset + values.nbytes
+        )
+        _META.pack_into(segment.buf, 0, len(meta), values.size)
+        segment.buf[_META.size:_META.size + len(meta)] = meta
+        np.ndarray(values.shape, dtype=np.float64, buffer=segment.buf, offset=offset)[:] = values
+
+        encoded = segment_name.encode()
+        buf = self._control.buf
+        _HEADER.pack_into(buf, 0, self.generation + 1, 0)
+        buf[_HEADER.size:_HEADER.size + len(encoded)] = encoded
+        _HEADER.pack_into(buf, 0, self.generation + 2, len(encoded))
+        self.generation += 2
+
+        self._segments.append(segment)
+        while len(self._segments) > _RETAINED_SEGMENTS:
+            retired = self._segments.popleft()
+            retired.close()
+            retired.unlink()
+
+    def close(self):
+        """Unlink every segment owned by this publisher"""
+        for segment in self._segments:
+            segment.close()
+            segment.unlink()
+        self._segments.clear()
+        self._control.close()
+        self._control.unlink()
+
+
+class SharedModelStore:
+    """
+    Worker side: a ModelStore look-alike backed by the shared segment.
+
+    ``get()`` costs one header read while the generation is unchanged.
+    """
+
+    def __init__(self, name: str):
+        self.path = f"shm://{name}"
+        self._control = _attach(name)
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._segments = deque(maxlen=_RETAINED_SEGMENTS)
+        self._generation = None
+        self._active = None
+        self.reload()
+        if self._active is None:
+            raise RuntimeError(f"No model has been published to shared memory segment {name}")
+
+    def get(self) -> ActiveModel:
+        """Return the current model, switching versions if one was published"""
+        generation, _ = _HEADER.unpack_from(self._control.buf, 0)
+        if generation != self._generation:
+            self.reload()
+        return self._active
+
+    def add_listener(self, callback: Callable[[ActiveModel], None]):
+        """Call ``callback(new_model)`` after every model swap"""
+        self._listeners.append(callback)
+
+    def reload(self) -> bool:
+        """Attach to the published segment if the generation changed"""
+        with self._lock:
+            return self._reload()
+
+    def _reload(self) -> bool:
+        while True:
+            generation, length = _HEADER.unpack_from(self._control.buf, 0)
+            if generation == self._generation or generation == 0:
+                return False
+            if generation % 2:
+                if self._active is not None:
+                    return False  # a publish is in progress; keep serving
+                continue
+            name = bytes(self._control.buf[_HEADER.size:_HEADER.size + length]).decode()
+            if _HEADER.unpack_from(self._control.buf, 0)[0] == generation:
+                break
+
+        segment = _attach(name)
+        meta_length, count = _META.unpack_from(segment.buf, 0)
+        meta = json.loads(bytes(segment.buf[_META.size:_META.size + meta_length]))
+        offset = _META.size + (meta_length + 7) // 8 * 8
+        values = np.ndarray((count,), dtype=np.float64, buffer=segment.buf, offset=offset)
+        values.flags.writeable = False
+
+        n_weights = meta["n_weights"]
+        n_categories = len(meta["categories"])
+        offset = n_weights + 1 + n_categories
+        ensemble = None
+        members = meta["ensemble_members"]
+        if members:
+            ensemble_categories = meta["ensemble_categories"]
+            bias_start = offset + members * n_weights
+            categories_start = bias_start + members
+            ensemble = CompiledEnsemble(
+                weights=values[offset:bias_start].reshape(members, n_weights),
+                bias=values[bias_start:categories_start],
+                categories=tuple(ensemble_categories),
+                category_weights=values[categories_start:categories_start + members * len(ensemble_categories)]
+                .reshape(members, len(ensemble_categories)),
+            )
+        compiled = CompiledModel(
+            weights=values[:n_weights],
+            bias=float(values[n_weights]),
+            category_weights=dict(zip(meta["categories"], values[n_weights + 1:offset].tolist())),
+            version=meta["artifact"]["version"],
+            ensemble=ensemble,
+        )
+        model = activate(meta["artifact"])._replace(compiled=compiled)
+
+        changed = self._active is None or model.version != self._active.version
+        self._segments.append(segment)
+        self._generation = generation
+        self._active = model
+        if changed:
+            for callback in self._listeners:
+                callback(model)
+        return changed
+
+    def start_watching(self, interval: float):
+        """Workers follow the publisher on every ``get()``; nothing to start"""
+
+    def stop_watching(self):
+        """Nothing to stop; see ``start_watching``"""
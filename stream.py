@@ -0,0 +1,234 @@
+"""
+Live re-optimization on competitor price ticks.
+
+Clients subscribe to SKUs and push competitor price updates; the hub keeps
+the latest inputs of every subscribed SKU, and a single flush loop
+recomputes the optimum of every SKU that received ticks since the last
+flush in one batched engine call. A burst of ticks for one SKU therefore
+costs one recomputation: ticks arriving during the coalescing window, or
+while a flush is computing, are folded into the next flush. New optima are
+queued per subscriber, again keeping only the latest price per SKU, so a
+slow client receives fewer, fresher updates instead of a growing backlog.
+
+All hub state is touched only from the event loop thread.
+"""
+from typing import Awaitable, Callable, Dict, Optional
+import asyncio
+import logging
+import math
+import time
+
+import numpy as np
+
+from engine import ItemBatch
+
+logger = logging.getLogger(__name__)
+
+# Fields a tick may update
+TICK_FIELDS = ('comp1', 'comp2', 'comp3')
+
+# Seconds to wait after the first tick of a burst before recomputing
+DEFAULT_WINDOW = 0.005
+
+
+class Subscriber:
+    """
+    One client connection: the latest unsent price per SKU.
+
+    ``send`` is awaited with ``{"type": "prices", "prices": [...]}``
+    whenever updates are pending.
+    """
+
+    def __init__(self, send: Callable[[dict], Awaitable[None]]):
+        self.send = send
+        self.skus = set()
+        self._pending: Dict[str, dict] = {}
+        # Created in pump(), so it belongs to the loop that waits on it
+        self._ready = None
+
+    def offer(self, sku: str, message: dict):
+        self._pending[sku] = message
+        if self._ready is not None:
+            self._ready.set()
+
+    async def pump(self):
+        """Send pending updates until cancelled"""
+        self._ready = asyncio.Event()
+        if self._pending:
+            self._ready.set()
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            pending, self._pending = self._pending, {}
+            await self.send({"type": "prices", "prices": list(pending.values())})
+
+
+class PriceHub:
+    """
+    Latest inputs and optimum of every subscribed SKU.
+
+    ``solve`` is awaited with an ``ItemBatch`` and returns a ``PriceResult``;
+    ``on_latency`` (optional) receives the seconds from the first coalesced
+    tick of a SKU to its push.
+    """
+
+    def __init__(self, solve: Callable[[ItemBatch], Awaitable], window: float = DEFAULT_WINDOW,
+                 on_latency: Optional[Callable[[float], None]] = None):
+        self.solve = solve
+        self.window = window
+        self.on_latency = on_latency
+        self._items: Dict[str, list] = {}
+        self._subscribers: Dict[str, set] = {}
+        self._last: Dict[str, tuple] = {}
+        # SKU -> (time of the first pending tick, id of the latest tick)
+        self._dirty: Dict[str, tuple] = {}
+        # Created in start(): on Python < 3.10 an Event binds to the loop
+        # current when it is made, which at import time is not the server's
+        self._wake = None
+        self._loop = None
+        self._task = None
+        self.ticks = 0
+        self.flushes = 0
+        self.recomputed = 0
+        self.pushes = 0
+
+    def start(self):
+        """Start the flush loop on the running event loop"""
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        if self._dirty:
+            self._wake.set()
+        self._task = self._loop.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def subscribe(self, subscriber: Subscriber, items: Dict[str, list]):
+        """
+        Subscribe to SKUs with their inputs (category first, then the
+        engine's numeric fields). Inputs replace those of an already
+        tracked SKU; the current optimum is pushed right away.
+        """
+        now = time.perf_counter()
+        for sku, values in items.items():
+            self._items[sku] = list(values)
+            self._subscribers.setdefault(sku, set()).add(subscriber)
+            subscriber.skus.add(sku)
+            self._last.pop(sku, None)
+            self._mark(sku, now, None)
+
+    def unsubscribe(self, subscriber: Subscriber, skus=None):
+        """Drop ``skus`` (all by default); SKUs nobody follows are forgotten"""
+        for sku in list(subscriber.skus if skus is None else skus):
+            subscriber.skus.discard(sku)
+            followers = self._subscribers.get(sku)
+            if followers is None:
+                continue
+            followers.discard(subscriber)
+            if not followers:
+                for state in (self._subscribers, self._items, self._last, self._dirty):
+                    state.pop(sku, None)
+
+    def tick(self, sku: str, fields: dict, tick_id=None) -> bool:
+        """Apply competitor prices to a tracked SKU; False if nobody follows it"""
+        values = self._items.get(sku)
+        if values is None:
+            return False
+        for field, value in fields.items():
+            values[ItemBatch._fields.index(field)] = value
+        self.ticks += 1
+        self._mark(sku, time.perf_counter(), tick_id)
+        return True
+
+    def refresh_all(self):
+        """Recompute every tracked SKU (e.g. after a model swap); thread-safe"""
+        def mark_all():
+            now = time.perf_counter()
+            for sku in self._items:
+                self._last.pop(sku, None)
+                self._mark(sku, now, None)
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(mark_all)
+
+    def stats(self) -> dict:
+        return {
+            "skus": len(self._items),
+            "pending": len(self._dirty),
+            "ticks": self.ticks,
+            "flushes": self.flushes,
+            "recomputed": self.recomputed,
+            "pushes": self.pushes,
+            "window_ms": self.window * 1000,
+        }
+
+    def _mark(self, sku: str, now: float, tick_id):
+        first, _ = self._dirty.get(sku, (now, None))
+        self._dirty[sku] = (first, tick_id)
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _run(self):
+        while True:
+            await self._wake.wait()
+            if self.window:
+                await asyncio.sleep(self.window)
+            self._wake.clear()
+            dirty, self._dirty = self._dirty, {}
+            skus = [sku for sku in dirty if sku in self._items]
+            if not skus:
+                continue
+            # Copies, since ticks may update the live rows while the batch is solved
+            rows = [list(self._items[sku]) for sku in skus]
+            numeric = np.array([row[1:] for row in rows], dtype=float)
+            batch = ItemBatch(np.array([row[0] for row in rows], dtype=object), *numeric.T)
+            try:
+                result = await self.solve(batch)
+            except Exception:
+                logger.exception("Re-optimizing %d SKUs failed; retrying", len(skus))
+                for sku in skus:
+                    self._dirty.setdefault(sku, dirty[sku])
+                self._wake.set()
+                await asyncio.sleep(max(self.window, 0.05))
+                continue
+            self.flushes += 1
+            self.recomputed += len(skus)
+            self._publish(skus, rows, dirty, result)
+
+    def _publish(self, skus, rows, dirty, result):
+        now = time.perf_counter()
+        prices = result.optimal_price.tolist()
+        profits = result.max_profit.tolist()
+        quantities = result.predicted_qty.tolist()
+        for k, sku in enumerate(skus):
+            followers = self._subscribers.get(sku)
+            if not followers:
+                continue
+            if math.isfinite(profits[k]):
+                outcome = (round(prices[k], 2), round(profits[k], 2), round(quantities[k], 2))
+            else:
+                outcome = (None, None, None)
+            if self._last.get(sku) == outcome:
+                continue
+            self._last[sku] = outcome
+            first, tick_id = dirty[sku]
+            message = {
+                "sku": sku,
+                "optimal_price": outcome[0],
+                "max_profit": outcome[1],
+                "predicted_qty": outcome[2],
+                **{field: rows[k][ItemBatch._fields.index(field)] for field in TICK_FIELDS},
+                "tick_id": tick_id,
+            }
+            if outcome[0] is None:
+                message["error"] = "Unable to compute optimal price (no valid price points)."
+            for subscriber in followers:
+                subscriber.offer(sku, message)
+            self.pushes += 1
+            if self.on_latency is not None:
+                self.on_latency(now - first)
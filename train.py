@@ -0,0 +1,619 @@
+"""
+Streaming training pipeline for the demand model.
+
+Runs the price_opt.ipynb training steps without loading the whole CSV. The
+file is read in chunks with compact dtypes, and the model is fitted from
+per-month sufficient statistics (row count, means and centered
+cross-products), so memory is bounded by the chunk size, the outlier sample
+and the number of months rather than by the number of rows:
+
+1. Scan: categories, column means for filling gaps and a bounded uniform
+   sample (reservoir) of the outlier-detection columns.
+2. Fit IsolationForest on the sample. When every row fits in the sample
+   this is exactly the notebook's fit on the whole file.
+3. Accumulate: drop outliers chunk by chunk and add the model features of
+   the remaining rows to the statistics of their month.
+4. Solve Ridge on the scaled features from the training months' statistics
+   and score R^2 on the test months from theirs.
+
+With ``--bootstrap N`` the second pass also accumulates N Poisson-weighted
+copies of the training statistics (the streaming form of the bootstrap),
+and one Ridge fit per copy is stored in the artifact as an ensemble.
+
+    python train.py --data retail_price.csv --output models/demand_model.json
+"""
+from typing import Dict, NamedTuple, Optional, Sequence
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import IsolationForest
+
+from engine import FEATURE_NAMES
+from model_registry import category_path
+from model_store import write_artifact
+
+TARGET = 'qty'
+DATE_COLUMN = 'month_year'
+DATE_FORMAT = '%d/%m/%Y'
+CATEGORY_COLUMN = 'product_category_name'
+
+DEFAULT_DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'retail_price.csv')
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'demand_model.json')
+
+# Compact dtypes for the raw CSV columns. Counts are exact in float32 and,
+# unlike int columns, still load when values are missing; prices stay
+# float64 so the derived features match the notebook bit for bit.
+RAW_DTYPES = {
+    CATEGORY_COLUMN: 'category',
+    DATE_COLUMN: 'category',
+    'qty': 'float32',
+    'freight_price': 'float64',
+    'unit_price': 'float64',
+    'product_name_lenght': 'float32',
+    'product_description_lenght': 'float32',
+    'product_photos_qty': 'float32',
+    'product_weight_g': 'float32',
+    'product_score': 'float64',
+    'customers': 'float32',
+    'weekday': 'float32',
+    'weekend': 'float32',
+    'holiday': 'float32',
+    'month': 'float32',
+    'year': 'float32',
+    's': 'float64',
+    'volume': 'float32',
+    'comp_1': 'float64',
+    'ps1': 'float64',
+    'fp1': 'float64',
+    'comp_2': 'float64',
+    'ps2': 'float64',
+    'fp2': 'float64',
+    'comp_3': 'float64',
+    'ps3': 'float64',
+    'fp3': 'float64',
+    'lag_price': 'float64',
+}
+
+# Columns IsolationForest sees, in the notebook's order (every numeric column
+# except the calendar ones, after feature engineering)
+OUTLIER_COLUMNS = (
+    'qty', 'freight_price', 'unit_price', 'product_name_lenght', 'product_description_lenght',
+    'product_photos_qty', 'product_weight_g', 'product_score', 'customers', 's', 'volume',
+    'comp_1', 'ps1', 'fp1', 'comp_2', 'ps2', 'fp2', 'comp_3', 'ps3', 'fp3', 'lag_price',
+    'revenue', 'profit', 'margin',
+    'price_ratio_1', 'price_ratio_2', 'price_ratio_3', 'price_diff_1', 'price_diff_2', 'price_diff_3',
+)
+
+# Feature set of the notebook's own model (cell 1), which also scales the
+# category dummies. The API serves FEATURE_NAMES with unscaled dummies.
+NOTEBOOK_FEATURES = (
+    'freight_price', 'unit_price', 'product_name_lenght', 'product_description_lenght',
+    'product_photos_qty', 'product_weight_g', 'product_score', 'customers',
+    'weekday', 'weekend', 'holiday', 'month', 'year', 's', 'volume',
+    'comp_1', 'ps1', 'fp1', 'comp_2', 'ps2', 'fp2', 'comp_3', 'ps3', 'fp3', 'lag_price',
+    'price_ratio_1', 'price_ratio_2', 'price_ratio_3', 'price_diff_1', 'price_diff_2', 'price_diff_3',
+)
+
+
+class Moments:
+    """Row count, column means and centered cross-product matrix of a set of rows"""
+
+    def __init__(self, size: int):
+        self.n = 0
+        self.mean = np.zeros(size)
+        self.m2 = np.zeros((size, size))
+
+    def add(self, values: np.ndarray):
+        """Add the rows of a 2-D array"""
+        if len(values):
+            mean = values.mean(axis=0)
+            centered = values - mean
+            self._merge(len(values), mean, centered.T @ centered)
+
+    def add_weighted(self, values: np.ndarray, weights: np.ndarray):
+        """Add rows with integer frequency weights (e.g. bootstrap counts)"""
+        total = weights.sum()
+        if total:
+            mean = weights @ values / total
+            centered = values - mean
+            self._merge(total, mean, centered.T @ (centered * weights[:, None]))
+
+    def merge(self, other: 'Moments'):
+        """Add the rows summarized by another Moments"""
+        if other.n:
+            self._merge(other.n, other.mean, other.m2)
+
+    def _merge(self, n: int, mean: np.ndarray, m2: np.ndarray):
+        # Chan et al.'s pairwise update, stable for large means
+        total = self.n + n
+        delta = mean - self.mean
+        self.m2 = self.m2 + m2 + np.outer(delta, delta) * (self.n * n / total)
+        self.mean = self.mean + delta * (n / total)
+        self.n = total
+
+    @classmethod
+    def combine(cls, parts: Sequence['Moments'], size: int) -> 'Moments':
+        """Moments of the union of ``parts``"""
+        result = cls(size)
+        for part in parts:
+            result.merge(part)
+        return result
+
+
+class Scan(NamedTuple):
+    """What the first pass over the CSV learns"""
+    rows: int
+    categories: list
+    fill_values: np.ndarray
+    sample: np.ndarray
+
+
+class TrainingStats(NamedTuple):
+    """Per-month sufficient statistics of the cleaned model matrix"""
+    columns: tuple
+    scaled: np.ndarray
+    categories: list
+    months: Dict[np.datetime64, Moments]
+    counts: dict
+    bootstrap: tuple = ()
+
+
+class RidgeFit(NamedTuple):
+    """Ridge solution on scaled features, like sklearn's on scaled inputs"""
+    intercept: float
+    coefficients: np.ndarray
+    means: np.ndarray
+    scales: np.ndarray
+
+
+class TrainingResult(NamedTuple):
+    fit: RidgeFit
+    stats: TrainingStats
+    metrics: dict
+    ensemble: Optional[tuple] = None
+
+
+def read_chunks(path: str, chunksize: int, columns=None):
+    """Iterate over the CSV in chunks, reading only ``columns`` with compact dtypes"""
+    usecols = list(RAW_DTYPES) if columns is None else list(columns)
+    return pd.read_csv(
+        path, usecols=usecols, dtype={name: RAW_DTYPES[name] for name in usecols}, chunksize=chunksize
+    )
+
+
+def add_features(chunk: pd.DataFrame) -> pd.DataFrame:
+    """The notebook's feature engineering (financial metrics, competitor ratios and differences)"""
+    unit_price = chunk['unit_price']
+    derived = {'revenue': chunk['qty'] * unit_price}
+    derived['profit'] = derived['revenue'] - (chunk['freight_price'] + chunk['product_weight_g'] / 1000)
+    derived['margin'] = derived['profit'] / derived['revenue']
+    for k in (1, 2, 3):
+        derived[f'price_ratio_{k}'] = unit_price / chunk[f'comp_{k}']
+    for k in (1, 2, 3):
+        derived[f'price_diff_{k}'] = unit_price - chunk[f'comp_{k}']
+    return chunk.assign(**derived)
+
+
+def month_index(chunk: pd.DataFrame) -> np.ndarray:
+    """Month of every row as datetime64[M], parsing each distinct value once"""
+    dates = chunk[DATE_COLUMN].cat
+    parsed = pd.to_datetime(dates.categories, format=DATE_FORMAT).values.astype('datetime64[M]')
+    codes = dates.codes.to_numpy()
+    if (codes < 0).any():
+        raise ValueError(f"Missing {DATE_COLUMN} values in the training data")
+    return parsed[codes]
+
+
+def _raw_columns(features) -> list:
+    needed = set(OUTLIER_COLUMNS) | set(features) | {TARGET, 'unit_price', 'comp_1', 'comp_2', 'comp_3'}
+    return [CATEGORY_COLUMN, DATE_COLUMN] + [name for name in RAW_DTYPES if name in needed]
+
+
+def _fill_missing(values: np.ndarray, fill_values: np.ndarray) -> np.ndarray:
+    missing = np.isnan(values)
+    if missing.any():
+        values = np.where(missing, fill_values, values)
+    return values
+
+
+def scan(path: str, chunksize: int, sample_size: int, features=FEATURE_NAMES, seed: int = 0) -> Scan:
+    """
+    First pass: categories, column means and a reservoir sample.
+
+    The sample holds ``sample_size`` uniformly chosen rows of the outlier
+    columns as float32 (what IsolationForest works in); when the file has
+    fewer rows it holds all of them in file order.
+    """
+    rng = np.random.default_rng(seed)
+    width = len(OUTLIER_COLUMNS)
+    sample = np.empty((sample_size, width), dtype=np.float32)
+    sums = np.zeros(width)
+    counts = np.zeros(width)
+    categories = set()
+    seen = 0
+
+    for chunk in read_chunks(path, chunksize, _raw_columns(features)):
+        chunk = add_features(chunk)
+        values = chunk[list(OUTLIER_COLUMNS)].to_numpy(np.float64)
+        present = ~np.isnan(values)
+        sums += np.where(present, values, 0.0).sum(axis=0)
+        counts += present.sum(axis=0)
+        categories.update(chunk[CATEGORY_COLUMN].dropna().unique())
+
+        # Algorithm R, vectorized: fill the reservoir, then row t replaces a
+        # random slot with probability sample_size / (t + 1)
+        fill = min(max(sample_size - seen, 0), len(values))
+        sample[seen:seen + fill] = values[:fill]
+        rest = values[fill:]
+        if len(rest):
+            positions = np.arange(seen + fill, seen + len(values))
+            slots = rng.integers(0, positions + 1)
+            chosen = slots < sample_size
+            slots, rest = slots[chosen][::-1], rest[chosen][::-1]
+            # When several rows land in one slot the last one wins
+            _, last = np.unique(slots, return_index=True)
+            sample[slots[last]] = rest[last]
+        seen += len(values)
+
+    if not seen:
+        raise ValueError(f"No rows in {path}")
+    fill_values = sums / np.maximum(counts, 1)
+    sample = _fill_missing(sample[:min(seen, sample_size)], fill_values.astype(np.float32))
+    return Scan(seen, sorted(categories), fill_values, sample)
+
+
+def fit_outlier_detector(scanned: Scan, contamination: float = 0.05, random_state: int = 42) -> IsolationForest:
+    """The notebook's IsolationForest, fitted on the scan sample"""
+    detector = IsolationForest(contamination=contamination, random_state=random_state)
+    return detector.fit(scanned.sample)
+
+
+def _clean_rows(path: str, chunksize: int, scanned: Scan, detector: IsolationForest, features: list,
+                counts: dict):
+    """
+    Chunks of ``(month, category codes, matrix)`` with outliers and incomplete rows removed.
+
+    The matrix holds [features, category dummies, target]; ``counts`` is
+    updated with the rows read, outliers and incomplete rows.
+    """
+    for chunk in read_chunks(path, chunksize, _raw_columns(features)):
+        chunk = add_features(chunk)
+        counts['rows'] += len(chunk)
+        values = _fill_missing(chunk[list(OUTLIER_COLUMNS)].to_numpy(np.float64), scanned.fill_values)
+        inliers = detector.predict(values) == 1
+        counts['outliers'] += int((~inliers).sum())
+
+        codes = pd.Categorical(chunk[CATEGORY_COLUMN], categories=scanned.categories).codes
+        one_hot = (codes[:, None] == np.arange(1, len(scanned.categories))).astype(np.float64)
+        matrix = np.hstack([chunk[features].to_numpy(np.float64), one_hot, chunk[[TARGET]].to_numpy(np.float64)])
+        complete = inliers & ~np.isnan(matrix).any(axis=1) & (codes >= 0)
+        counts['missing'] += int((inliers & ~complete).sum())
+        yield month_index(chunk)[complete], codes[complete], matrix[complete]
+
+
+def _add_months(months: dict, month: np.ndarray, matrix: np.ndarray, size: int):
+    """Add rows to the Moments of their month"""
+    order = np.argsort(month, kind='stable')
+    month, matrix = month[order], matrix[order]
+    keys, starts = np.unique(month, return_index=True)
+    for key, rows in zip(keys, np.split(matrix, starts[1:])):
+        months.setdefault(key, Moments(size)).add(rows)
+
+
+def accumulate(path: str, chunksize: int, scanned: Scan, detector: IsolationForest,
+               features=FEATURE_NAMES, scale_categories: bool = False,
+               bootstrap: int = 0, bootstrap_end=None, seed: int = 0) -> TrainingStats:
+    """
+    Second pass: per-month statistics of [features, category dummies, target].
+
+    Outliers are dropped like in the notebook; rows missing a model input
+    are skipped and counted. Dummies follow ``get_dummies(drop_first=True)``.
+    With ``bootstrap`` members, every row before ``bootstrap_end`` is also
+    added to each member's statistics with a Poisson(1) weight.
+    """
+    features = list(features)
+    dummies = [f'cat_{name}' for name in scanned.categories[1:]]
+    columns = tuple(features + dummies + [TARGET])
+    scaled = np.array([True] * len(features) + [scale_categories] * len(dummies))
+    months = {}
+    counts = {'rows': 0, 'outliers': 0, 'missing': 0}
+    rng = np.random.default_rng(seed)
+    members = [Moments(len(columns)) for _ in range(bootstrap)]
+    end = None if bootstrap_end is None else np.datetime64(bootstrap_end, 'M')
+
+    for month, _, matrix in _clean_rows(path, chunksize, scanned, detector, features, counts):
+        if members:
+            sampled = matrix if end is None else matrix[month < end]
+            weights = rng.poisson(1.0, size=(len(sampled), len(members))).astype(np.float64)
+            for member, member_weights in zip(members, weights.T):
+                member.add_weighted(sampled, member_weights)
+        _add_months(months, month, matrix, len(columns))
+
+    return TrainingStats(columns, scaled, scanned.categories, dict(sorted(months.items())), counts, tuple(members))
+
+
+def accumulate_categories(path: str, chunksize: int, scanned: Scan, detector: IsolationForest,
+                          features=FEATURE_NAMES) -> Dict[str, TrainingStats]:
+    """
+    Like ``accumulate`` in one pass, but with separate statistics per category.
+
+    Each category's statistics cover [features, target] of its own rows
+    only (no dummies), ready for a model of that category alone.
+    """
+    features = list(features)
+    n_features = len(features)
+    columns = tuple(features + [TARGET])
+    scaled = np.ones(n_features, dtype=bool)
+    months = [{} for _ in scanned.categories]
+    counts = {'rows': 0, 'outliers': 0, 'missing': 0}
+
+    for month, codes, matrix in _clean_rows(path, chunksize, scanned, detector, features, counts):
+        matrix = np.hstack([matrix[:, :n_features], matrix[:, -1:]])
+        for code in np.unique(codes):
+            rows = codes == code
+            _add_months(months[code], month[rows], matrix[rows], len(columns))
+
+    return {
+        name: TrainingStats(columns, scaled, [name], dict(sorted(category_months.items())), counts)
+        for name, category_months in zip(scanned.categories, months) if category_months
+    }
+
+
+def split_moments(stats: TrainingStats, start, end=None) -> Moments:
+    """Moments of the months in ``[start, end)`` (open-ended when None)"""
+    start = None if start is None else np.datetime64(start, 'M')
+    end = None if end is None else np.datetime64(end, 'M')
+    return Moments.combine(
+        [moments for month, moments in stats.months.items()
+         if (start is None or month >= start) and (end is None or month < end)],
+        len(stats.columns),
+    )
+
+
+def _scaler(moments: Moments, scaled: np.ndarray) -> tuple:
+    """StandardScaler means and scales (zero variance keeps scale 1)"""
+    k = len(scaled)
+    std = np.sqrt(np.diag(moments.m2)[:k] / moments.n)
+    std = np.where(std < 10 * np.finfo(np.float64).eps, 1.0, std)
+    return np.where(scaled, moments.mean[:k], 0.0), np.where(scaled, std, 1.0)
+
+
+def fit_ridge(moments: Moments, alpha: float, scaled: np.ndarray) -> RidgeFit:
+    """
+    Ridge with intercept on the scaled training rows, from their moments.
+
+    Equivalent to StandardScaler on the ``scaled`` columns followed by
+    sklearn's ``Ridge(alpha)``: centering is implicit in the moments.
+    """
+    if not moments.n:
+        raise ValueError("No training rows")
+    k = len(scaled)
+    means, scales = _scaler(moments, scaled)
+    gram = moments.m2[:k, :k] / np.outer(scales, scales) + alpha * np.eye(k)
+    coefficients = np.linalg.solve(gram, moments.m2[:k, k] / scales)
+    intercept = moments.mean[k] - coefficients @ ((moments.mean[:k] - means) / scales)
+    return RidgeFit(float(intercept), coefficients, means, scales)
+
+
+def fit_ridge_path(moments: Moments, alphas, scaled: np.ndarray) -> list:
+    """
+    ``fit_ridge`` for every alpha from one eigendecomposition.
+
+    With the scaled Gram matrix ``G = V diag(w) V'``, the solution for any
+    alpha is ``V diag(1 / (w + alpha)) V' b``.
+    """
+    if not moments.n:
+        raise ValueError("No training rows")
+    k = len(scaled)
+    means, scales = _scaler(moments, scaled)
+    eigenvalues, vectors = np.linalg.eigh(moments.m2[:k, :k] / np.outer(scales, scales))
+    projected = vectors.T @ (moments.m2[:k, k] / scales)
+    alphas = np.asarray(alphas, dtype=np.float64)
+    solutions = vectors @ (projected[:, None] / (eigenvalues[:, None] + alphas[None, :]))
+    centers = (moments.mean[:k] - means) / scales
+    return [
+        RidgeFit(float(moments.mean[k] - coefficients @ centers), coefficients, means, scales)
+        for coefficients in solutions.T
+    ]
+
+
+def fit_ensemble(stats: TrainingStats, alpha: float, reference: RidgeFit) -> tuple:
+    """
+    Ridge fit of every bootstrap member, as ``(intercepts, coefficients)``.
+
+    Each member is fitted with its own scaler, like a full refit on the
+    resampled rows, and then re-expressed in the scaled space of
+    ``reference`` so all members share the artifact's means and scales.
+    """
+    intercepts, coefficients = [], []
+    for moments in stats.bootstrap:
+        fit = fit_ridge(moments, alpha, stats.scaled)
+        weights = fit.coefficients / fit.scales
+        intercepts.append(fit.intercept - weights @ fit.means + weights @ reference.means)
+        coefficients.append(weights * reference.scales)
+    return np.array(intercepts), np.array(coefficients)
+
+
+def r_squared(fit: RidgeFit, moments: Moments) -> float:
+    """R^2 of ``fit`` on the rows summarized by ``moments``"""
+    k = len(fit.coefficients)
+    weights = fit.coefficients / fit.scales
+    bias = fit.intercept - weights @ fit.means
+    sxx, sxy, syy = moments.m2[:k, :k], moments.m2[:k, k], moments.m2[k, k]
+    offset = moments.mean[k] - bias - weights @ moments.mean[:k]
+    residual = syy - 2 * weights @ sxy + weights @ sxx @ weights + moments.n * offset ** 2
+    return float(1 - residual / syy)
+
+
+def save_stats(stats: TrainingStats, path: str):
+    """Store collected statistics so later runs can skip reading the CSV"""
+    months = list(stats.months)
+    np.savez(
+        path,
+        columns=np.array(stats.columns),
+        scaled=stats.scaled,
+        categories=np.array(stats.categories),
+        months=np.array(months, dtype='datetime64[M]'),
+        n=np.array([stats.months[month].n for month in months]),
+        mean=np.array([stats.months[month].mean for month in months]),
+        m2=np.array([stats.months[month].m2 for month in months]),
+        counts=np.array([stats.counts[name] for name in ('rows', 'outliers', 'missing')]),
+    )
+
+
+def load_stats(path: str) -> TrainingStats:
+    """Read statistics written by ``save_stats``"""
+    with np.load(path) as data:
+        size = len(data['columns'])
+        months = {}
+        for month, n, mean, m2 in zip(data['months'], data['n'], data['mean'], data['m2']):
+            moments = months[month] = Moments(size)
+            moments.n, moments.mean, moments.m2 = int(n), mean, m2
+        return TrainingStats(
+            tuple(data['columns'].tolist()),
+            data['scaled'],
+            data['categories'].tolist(),
+            months,
+            dict(zip(('rows', 'outliers', 'missing'), data['counts'].tolist())),
+        )
+
+
+def collect(path: str, features=FEATURE_NAMES, scale_categories: bool = False,
+            chunksize: int = 100_000, sample_size: int = 200_000,
+            contamination: float = 0.05, random_state: int = 42,
+            bootstrap: int = 0, bootstrap_end=None, seed: int = 0) -> TrainingStats:
+    """Both passes over the CSV: cleaned per-month statistics of the model matrix"""
+    scanned = scan(path, chunksize, sample_size, features)
+    detector = fit_outlier_detector(scanned, contamination, random_state)
+    return accumulate(path, chunksize, scanned, detector, features, scale_categories,
+                      bootstrap, bootstrap_end, seed)
+
+
+def train(path: str, alpha: float = 20.0, test_start: str = '2018-05-01',
+          features=FEATURE_NAMES, scale_categories: bool = False,
+          chunksize: int = 100_000, sample_size: int = 200_000,
+          stats: Optional[TrainingStats] = None, bootstrap: int = 0, seed: int = 0) -> TrainingResult:
+    """
+    Fit the demand model on months before ``test_start`` and score it on the rest.
+
+    The defaults reproduce the notebook's serving model; pass
+    ``features=NOTEBOOK_FEATURES, scale_categories=True`` for the notebook's
+    own model. Precomputed ``stats`` skip reading the CSV (and carry their
+    own bootstrap members, if any). ``bootstrap`` members are resampled
+    from the training months.
+    """
+    if stats is None:
+        stats = collect(path, features, scale_categories, chunksize, sample_size,
+                        bootstrap=bootstrap, bootstrap_end=test_start, seed=seed)
+    train_moments = split_moments(stats, None, test_start)
+    test_moments = split_moments(stats, test_start)
+    fit = fit_ridge(train_moments, alpha, stats.scaled)
+    metrics = {
+        'r_squared': round(r_squared(fit, test_moments), 4) if test_moments.n else None,
+        'alpha': alpha,
+        'test_start': str(np.datetime64(test_start, 'D')),
+        'train_rows': train_moments.n,
+        'test_rows': test_moments.n,
+    }
+    ensemble = None
+    if stats.bootstrap:
+        ensemble = fit_ensemble(stats, alpha, fit)
+        metrics['bootstrap_members'] = len(stats.bootstrap)
+    return TrainingResult(fit, stats, metrics, ensemble)
+
+
+def train_categories(path: str, alpha: float = 20.0, test_start: str = '2018-05-01',
+                     chunksize: int = 100_000, sample_size: int = 200_000,
+                     min_rows: int = 100) -> Dict[str, TrainingResult]:
+    """
+    One serving model per category with at least ``min_rows`` training rows.
+
+    Outliers are detected over the whole file like for the global model,
+    then every category is fitted on its own rows (no bootstrap ensemble).
+    """
+    scanned = scan(path, chunksize, sample_size)
+    detector = fit_outlier_detector(scanned)
+    results = {}
+    for name, stats in accumulate_categories(path, chunksize, scanned, detector).items():
+        if split_moments(stats, None, test_start).n < min_rows:
+            continue
+        results[name] = train(path, alpha, test_start, stats=stats)
+    return results
+
+
+def write_model(result: TrainingResult, path: str) -> dict:
+    """Write the serving artifact (FEATURE_NAMES with unscaled category dummies)"""
+    stats, fit = result.stats, result.fit
+    n_features = len(FEATURE_NAMES)
+    if stats.columns[:n_features] != tuple(FEATURE_NAMES) or stats.scaled[n_features:].any():
+        raise ValueError("Only the serving feature set with unscaled category dummies can be exported")
+    ensemble = None
+    if result.ensemble is not None:
+        intercepts, coefficients = result.ensemble
+        ensemble = {
+            "intercepts": intercepts,
+            "coefficients": coefficients[:, :n_features],
+            "category_coefficients": np.hstack([np.zeros((len(intercepts), 1)), coefficients[:, n_features:]]),
+        }
+    return write_artifact(
+        path,
+        intercept=fit.intercept,
+        coefficients=fit.coefficients[:n_features],
+        means=fit.means[:n_features],
+        scales=fit.scales[:n_features],
+        categories=stats.categories,
+        category_coefficients=[0.0, *fit.coefficients[n_features:]],
+        metrics=result.metrics,
+        ensemble=ensemble,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the demand model from the sales CSV")
+    parser.add_argument("--data", default=DEFAULT_DATA_PATH)
+    parser.add_argument("--output", default=DEFAULT_MODEL_PATH, help="model artifact to write")
+    parser.add_argument("--alpha", type=float, default=20.0)
+    parser.add_argument("--test-start", default="2018-05-01", help="first month of the test period")
+    parser.add_argument("--chunksize", type=int, default=100_000, help="CSV rows per chunk")
+    parser.add_argument("--sample-size", type=int, default=200_000,
+                        help="rows sampled for fitting the outlier detector")
+    parser.add_argument("--bootstrap", type=int, default=200,
+                        help="bootstrap ensemble members for confidence bands (0 disables)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for the bootstrap")
+    parser.add_argument("--dry-run", action="store_true", help="report metrics without writing the artifact")
+    parser.add_argument("--per-category", metavar="DIR",
+                        help="instead of the global model, write one artifact per category into DIR")
+    parser.add_argument("--min-category-rows", type=int, default=100,
+                        help="training rows a category needs for its own model")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.per_category:
+        results = train_categories(args.data, args.alpha, args.test_start, args.chunksize, args.sample_size,
+                                   args.min_category_rows)
+        print(f"Trained {len(results)} category models ({time.perf_counter() - start:.2f}s)")
+        for name, result in results.items():
+            print(f"  {name}: {result.metrics['train_rows']} train / {result.metrics['test_rows']} test rows, "
+                  f"R^2 {result.metrics['r_squared']}")
+            if not args.dry_run:
+                write_model(result, category_path(args.per_category, name))
+        if not args.dry_run:
+            print(f"Wrote category model artifacts to {args.per_category}")
+        return
+    result = train(args.data, args.alpha, args.test_start, chunksize=args.chunksize,
+                   sample_size=args.sample_size, bootstrap=args.bootstrap, seed=args.seed)
+    counts = result.stats.counts
+    print(f"Read {counts['rows']} rows: {counts['outliers']} outliers, {counts['missing']} incomplete, "
+          f"{result.metrics['train_rows']} train / {result.metrics['test_rows']} test "
+          f"({time.perf_counter() - start:.2f}s)")
+    print(f"R^2 on months from {result.metrics['test_start']}: {result.metrics['r_squared']}")
+    if not args.dry_run:
+        artifact = write_model(result, args.output)
+        print(f"Wrote model artifact version {artifact['version']} to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
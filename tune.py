@@ -0,0 +1,173 @@
+"""
+Rolling-origin cross-validation and alpha search for the demand model.
+
+The CSV is reduced once to per-month sufficient statistics (see train.py)
+and cached on disk, keyed on the file and the training options, so reruns
+do not read the CSV at all. Each fold trains on every month before its
+origin and validates on the next ``--horizon`` months; its training
+statistics are merged from the monthly ones, and all alphas are solved from
+one eigendecomposition of the fold's Gram matrix. Folds run in a process
+pool.
+
+    python tune.py --alphas 0.1,1,10,20,100 --min-train-months 6
+"""
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, NamedTuple
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from engine import FEATURE_NAMES
+from train import (
+    DEFAULT_DATA_PATH, DEFAULT_MODEL_PATH, Moments, TrainingStats, collect, fit_ridge_path, load_stats,
+    r_squared, save_stats, train, write_model,
+)
+
+DEFAULT_ALPHAS = (0.01, 0.1, 1.0, 3.0, 10.0, 20.0, 30.0, 100.0, 300.0, 1000.0)
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".train_cache")
+
+
+class Fold(NamedTuple):
+    """Training months before ``origin``; validation months from it"""
+    origin: np.datetime64
+    train: Moments
+    test: Moments
+
+
+def cached_stats(path: str, cache_dir: str = DEFAULT_CACHE_DIR, **options) -> TrainingStats:
+    """
+    ``train.collect(path, **options)``, cached until the CSV changes.
+
+    The cache key covers the file's size and modification time and the
+    collection options, so a new export or a different feature set misses.
+    """
+    info = os.stat(path)
+    key = json.dumps([os.path.abspath(path), info.st_size, info.st_mtime_ns, sorted(options.items())])
+    cache_path = os.path.join(cache_dir, f"stats-{hashlib.sha256(key.encode()).hexdigest()[:16]}.npz")
+    if os.path.exists(cache_path):
+        return load_stats(cache_path)
+
+    stats = collect(path, **options)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp.npz"
+    save_stats(stats, tmp_path)
+    os.replace(tmp_path, cache_path)
+    return stats
+
+
+def rolling_folds(stats: TrainingStats, min_train_months: int = 6, horizon: int = 1, step: int = 1) -> List[Fold]:
+    """
+    Expanding-window folds over the months in ``stats``.
+
+    Training moments are merged incrementally, so building every fold costs
+    one merge per month plus one per validation month.
+    """
+    months = list(stats.months)
+    size = len(stats.columns)
+    folds = []
+    running = Moments(size)
+    merged = 0
+    for start in range(min_train_months, len(months) - horizon + 1, step):
+        for month in months[merged:start]:
+            running.merge(stats.months[month])
+        merged = start
+        train_moments = Moments(size)
+        train_moments.merge(running)
+        test_moments = Moments.combine([stats.months[month] for month in months[start:start + horizon]], size)
+        folds.append(Fold(months[start], train_moments, test_moments))
+    return folds
+
+
+def score_fold(fold: Fold, alphas, scaled: np.ndarray) -> np.ndarray:
+    """Validation R^2 of the fold for every alpha"""
+    fits = fit_ridge_path(fold.train, alphas, scaled)
+    return np.array([r_squared(fit, fold.test) for fit in fits])
+
+
+def cross_validate(stats: TrainingStats, alphas=DEFAULT_ALPHAS, min_train_months: int = 6,
+                   horizon: int = 1, step: int = 1, jobs: int = 1) -> tuple:
+    """
+    R^2 for every fold and alpha.
+
+    Returns ``(folds, scores)`` with ``scores[fold, alpha]``. ``jobs > 1``
+    scores the folds in a process pool.
+    """
+    folds = rolling_folds(stats, min_train_months, horizon, step)
+    if not folds:
+        raise ValueError(
+            f"Not enough months for a fold: {len(stats.months)} months, "
+            f"{min_train_months} to train and {horizon} to validate"
+        )
+    args = (folds, [alphas] * len(folds), [stats.scaled] * len(folds))
+    if jobs > 1:
+        with ProcessPoolExecutor(jobs) as pool:
+            scores = list(pool.map(score_fold, *args, chunksize=max(1, len(folds) // (4 * jobs))))
+    else:
+        scores = list(map(score_fold, *args))
+    return folds, np.vstack(scores)
+
+
+def report(folds: List[Fold], alphas, scores: np.ndarray) -> str:
+    """Table of R^2 per fold and alpha, with the mean of each alpha"""
+    header = f"{'origin':>8} {'train':>7} {'test':>6} " + " ".join(f"{alpha:>8g}" for alpha in alphas)
+    lines = [header]
+    for fold, row in zip(folds, scores):
+        lines.append(
+            f"{str(fold.origin):>8} {fold.train.n:>7} {fold.test.n:>6} " + " ".join(f"{value:>8.4f}" for value in row)
+        )
+    lines.append(f"{'mean':>8} {'':>7} {'':>6} " + " ".join(f"{value:>8.4f}" for value in scores.mean(axis=0)))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cross-validate the demand model over alphas")
+    parser.add_argument("--data", default=DEFAULT_DATA_PATH)
+    parser.add_argument("--alphas", default=",".join(f"{alpha:g}" for alpha in DEFAULT_ALPHAS),
+                        help="comma-separated Ridge alphas")
+    parser.add_argument("--min-train-months", type=int, default=6, help="months in the first training window")
+    parser.add_argument("--horizon", type=int, default=1, help="validation months per fold")
+    parser.add_argument("--step", type=int, default=1, help="months between fold origins")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="worker processes for the folds")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="where collected statistics are cached")
+    parser.add_argument("--csv", help="also write the fold x alpha R^2 table to this CSV file")
+    parser.add_argument("--output", nargs="?", const=DEFAULT_MODEL_PATH,
+                        help="retrain with the best alpha and write the artifact (default path if no value)")
+    parser.add_argument("--test-start", default="2018-05-01", help="test split for the retrained artifact")
+    parser.add_argument("--bootstrap", type=int, default=200,
+                        help="bootstrap ensemble members of the retrained artifact (0 disables)")
+    args = parser.parse_args()
+
+    alphas = [float(value) for value in args.alphas.split(",")]
+    start = time.perf_counter()
+    stats = cached_stats(args.data, args.cache_dir, features=FEATURE_NAMES)
+    loaded = time.perf_counter()
+    folds, scores = cross_validate(stats, alphas, args.min_train_months, args.horizon, args.step, args.jobs)
+    done = time.perf_counter()
+
+    print(report(folds, alphas, scores))
+    best = alphas[int(np.argmax(scores.mean(axis=0)))]
+    print(f"\nBest alpha: {best:g} (mean R^2 {scores.mean(axis=0).max():.4f} over {len(folds)} folds)")
+    print(f"Statistics {loaded - start:.2f}s, cross-validation {done - loaded:.2f}s")
+
+    if args.csv:
+        with open(args.csv, "w") as f:
+            f.write("origin,train_rows,test_rows," + ",".join(f"{alpha:g}" for alpha in alphas) + "\n")
+            for fold, row in zip(folds, scores):
+                f.write(f"{fold.origin},{fold.train.n},{fold.test.n}," + ",".join(f"{value:.6f}" for value in row) + "\n")
+    if args.output:
+        # Bootstrap members are not part of the cached statistics
+        if args.bootstrap:
+            result = train(args.data, best, args.test_start, bootstrap=args.bootstrap)
+        else:
+            result = train(args.data, best, args.test_start, stats=stats)
+        result.metrics["cv_r_squared"] = round(float(scores.mean(axis=0).max()), 4)
+        artifact = write_model(result, args.output)
+        print(f"Wrote model artifact version {artifact['version']} (alpha {best:g}) to {args.output}")
+
+
+if __name__ == "__main__":
+    main()